@@ -0,0 +1,6 @@
+import sys
+from validate.manifest import main
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,12 @@
+#!/bin/bash
+
+# Nightly check that every published download url still serves the archive
+# declared in metadata. Keep $AUDIT_STATE between runs so unchanged urls are
+# confirmed with conditional requests instead of downloads.
+mkdir -p artifacts
+
+if [ -z "$AUDIT_STATE" ]; then
+    AUDIT_STATE="artifacts/audit-state.json"
+fi
+
+python3 ci/audit-repository.py --state "$AUDIT_STATE" $AUDIT_ARGS
@@ -0,0 +1,9 @@
+#!/bin/bash
+
+if [ ! -s artifacts/diff_files.txt ] || [ -z "$(cat artifacts/diff_files.txt)" ]; then
+    echo "No changed files"
+    exit 0
+fi
+
+# combine partial reports of parallel validation jobs into one result
+python3 "ci/validate-shard.py" merge artifacts/validation-shard-*.json --output artifacts/validation.json
@@ -0,0 +1,61 @@
+"""
+Parse time of packages.json versus the binary index at 10k packages.
+
+Run from the ci directory: python -m test.bench_binindex
+"""
+import io
+import json
+import timeit
+
+from validate import binindex
+
+
+PACKAGES = 10000
+REPEAT = 5
+
+
+def make_index(count: int) -> dict:
+    with io.open("test/data/metadata_valid.json", encoding="utf-8") as f:
+        template = json.load(f)
+
+    packages = []
+    for i in range(count):
+        package = json.loads(json.dumps(template))
+        package["identifier"] = f"com.example.package{i}"
+        package["name"] = f"Package {i}"
+        package["description_full"] = (
+            f"Package {i} long description. " + "Lorem ipsum dolor. " * 100)
+        for version in package["versions"]:
+            version["download_url"] += f"/{i}"
+        packages.append(package)
+
+    return {"packages": packages}
+
+
+def best(stmt) -> float:
+    return min(timeit.repeat(stmt, number=1, repeat=REPEAT))
+
+
+def main():
+    index = make_index(PACKAGES)
+    text = json.dumps(index, indent=4)
+    data = binindex.dumps(index)
+    last = f"com.example.package{PACKAGES - 1}"
+
+    print(f"{PACKAGES} packages, json {len(text)} bytes, "
+          f"binary {len(data)} bytes")
+
+    results = [
+        ("json.loads", best(lambda: json.loads(text))),
+        ("binary open", best(lambda: binindex.BinaryIndex(data))),
+        ("binary open + get", best(
+            lambda: binindex.BinaryIndex(data).get(last))),
+        ("binary full decode", best(lambda: binindex.loads(data))),
+    ]
+
+    for name, seconds in results:
+        print(f"{name:20} {seconds * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+import functools
+import hashlib
+import http.server
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+from unittest import TestCase
+from unittest.mock import patch
+from io import StringIO
+
+from validate import audit
+
+
+class QuietHandler(http.server.SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+class TestAudit(TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.mkdtemp()
+        self.www = os.path.join(self.tmp, "www")
+        self.packages = os.path.join(self.tmp, "packages")
+        os.makedirs(self.www)
+
+        self.data = b"archive" * 100
+        with io.open(os.path.join(self.www, "a.zip"), "wb") as f:
+            f.write(self.data)
+
+        handler = functools.partial(QuietHandler, directory=self.www)
+        self.server = http.server.ThreadingHTTPServer(
+            ("127.0.0.1", 0), handler)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.start()
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def tearDown(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+        shutil.rmtree(self.tmp)
+
+    def write_package(self, name, versions):
+        os.makedirs(os.path.join(self.packages, name))
+        with io.open(os.path.join(self.packages, name, "metadata.json"), "w",
+                     encoding="utf-8") as f:
+            json.dump({"identifier": name, "versions": versions}, f)
+
+    def version(self, version, file, sha=None, size=None):
+        return {
+            "version": version,
+            "download_url": f"{self.url}/{file}",
+            "download_sha256": sha or hashlib.sha256(self.data).hexdigest(),
+            "download_size": size or len(self.data),
+        }
+
+    def test_audit(self):
+        self.write_package("a", [
+            self.version("1", "a.zip"),
+            self.version("2", "gone.zip"),
+            self.version("3", "a.zip", size=100000),
+        ])
+        self.write_package("b", [self.version("1", "a.zip", sha="0" * 64)])
+
+        targets = audit.targets(self.packages)
+        self.assertEqual(len(targets), 4)
+
+        state = {}
+        cache = os.path.join(self.tmp, "cache")
+        results = audit.Auditor(state, cache).run(targets, 4)
+
+        self.assertEqual([r.status for r in results], [
+            "verified", "missing", "size_mismatch", "sha_mismatch"])
+        self.assertEqual(os.listdir(cache), [
+            f"{targets[0].sha256}.zip"])
+
+        # confirmed url is checked with a conditional request next time
+        checked = state[targets[0].url]["checked"]
+        with patch("time.time", return_value=checked + 60):
+            results = audit.Auditor(state).run(targets[:1], 1)
+        self.assertEqual(results[0].status, "unchanged")
+        self.assertFalse(results[0].downloaded)
+        self.assertEqual(results[0].http_status, 304)
+        self.assertEqual(state[targets[0].url]["checked"], checked + 60)
+
+        report = audit.make_report(results)
+        self.assertEqual(report["problems"], [])
+
+    def test_failed_fetch(self):
+        cache = os.path.join(self.tmp, "cache")
+        auditor = audit.Auditor({}, cache)
+        sha = hashlib.sha256(self.data).hexdigest()
+
+        self.assertRaises(
+            audit.RequestException, auditor.fetch_sha,
+            audit.Target("a", "1", f"{self.url}/gone.zip", sha))
+        with patch("validate.audit.MAX_DOWNLOAD_SIZE", new=10):
+            self.assertRaises(
+                RuntimeError, auditor.fetch_sha,
+                audit.Target("a", "1", f"{self.url}/a.zip", sha))
+
+        self.assertEqual(os.listdir(cache), [])
+
+    def test_main(self):
+        self.write_package("a", [self.version("1", "gone.zip")])
+        report = os.path.join(self.tmp, "audit.json")
+
+        with patch("sys.stdout", new=StringIO()):
+            self.assertRaises(SystemExit, audit.main, [
+                "--packages", self.packages, "--report", report,
+                "--state", os.path.join(self.tmp, "state.json")])
+
+        with io.open(report, encoding="utf-8") as f:
+            data = json.load(f)
+
+        self.assertEqual(data["counts"], {"missing": 1})
+        self.assertEqual(data["problems"][0]["package"], "a")
@@ -0,0 +1,101 @@
+import glob
+import io
+import json
+from unittest import TestCase
+
+from validate import binindex
+
+
+def load(file_name):
+    with io.open(file_name, encoding="utf-8") as f:
+        return json.load(f)
+
+
+class TestBinaryIndex(TestCase):
+    def setUp(self) -> None:
+        packaged = load("test/data/package/metadata.json")
+        packaged["identifier"] = "testpackage.packaged"
+        self.index = {
+            "packages": [
+                load("test/data/metadata_valid.json"),
+                packaged,
+            ] + [load(f) for f in sorted(glob.glob(
+                "../packages/*/metadata.json"))]
+        }
+
+    def test_roundtrip(self):
+        data = binindex.dumps(self.index)
+        self.assertEqual(binindex.loads(data), self.index)
+
+    def test_roundtrip_json_text(self):
+        data = binindex.dumps(self.index)
+        self.assertEqual(
+            json.dumps(binindex.loads(data), sort_keys=True),
+            json.dumps(self.index, sort_keys=True))
+
+    def test_roundtrip_values(self):
+        index = {
+            "packages": [{
+                "identifier": "values",
+                "none": None,
+                "bools": [True, False],
+                "ints": [0, -1, 2 ** 40],
+                "float": 1.5,
+                "unicode": "µ Ω \U0001f600",
+                "empty": {"list": [], "dict": {}, "str": ""},
+            }],
+            "extra": "field",
+        }
+
+        self.assertEqual(binindex.loads(binindex.dumps(index)), index)
+
+    def test_strings_interned(self):
+        package = self.index["packages"][0]
+        index = {"packages": [dict(package, identifier=str(i))
+                              for i in range(50)]}
+
+        data = binindex.dumps(index)
+
+        self.assertEqual(data.count(b"full test package description"), 1)
+        self.assertEqual(data.count(b"download_sha256"), 1)
+
+    def test_lazy_get(self):
+        reader = binindex.BinaryIndex(binindex.dumps(self.index))
+
+        self.assertEqual(len(reader), len(self.index["packages"]))
+        self.assertIn("testpackage", reader)
+        self.assertNotIn("nope", reader)
+        self.assertIsNone(reader.get("nope"))
+        self.assertEqual(reader.get("testpackage"), self.index["packages"][0])
+        self.assertEqual(
+            reader.identifiers(),
+            [p["identifier"] for p in self.index["packages"]])
+
+    def test_bad_magic(self):
+        self.assertRaises(
+            binindex.BinaryIndexError, binindex.loads, b"{\"packages\": []}")
+
+    def test_truncated(self):
+        data = binindex.dumps(self.index)
+        self.assertRaises(
+            binindex.BinaryIndexError, binindex.loads, data[:len(data) // 2])
+
+    def test_unsupported_type(self):
+        self.assertRaises(
+            TypeError, binindex.dumps,
+            {"packages": [{"identifier": "a", "b": object()}]})
+
+    def test_out_of_range(self):
+        for value in [2 ** 63, -2 ** 63 - 1]:
+            self.assertRaises(
+                binindex.BinaryIndexError, binindex.dumps,
+                {"packages": [{"identifier": "a", "b": value}]})
+
+        index = {"packages": [{"identifier": "a",
+                               "b": [2 ** 63 - 1, -2 ** 63]}]}
+        self.assertEqual(binindex.loads(binindex.dumps(index)), index)
+
+    def test_get_after_full_decode(self):
+        reader = binindex.BinaryIndex(binindex.dumps(self.index))
+        self.assertEqual(reader.to_dict(), self.index)
+        self.assertEqual(reader.get("testpackage"), self.index["packages"][0])
@@ -0,0 +1,176 @@
+import io
+import json
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+from unittest.mock import patch
+from io import StringIO
+
+from validate import consistency
+
+
+class TestConsistency(TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.mkdtemp()
+        self.packages = os.path.join(self.tmp, "packages")
+
+        with io.open("test/data/metadata_valid.json", encoding="utf-8") as f:
+            self.metadata = json.load(f)
+
+        self.write("a", self.package("a", "Package A", "a"))
+        self.write("b", self.package("b", "Package B", "b"))
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.tmp)
+
+    def package(self, identifier, name, tag):
+        metadata = json.loads(json.dumps(self.metadata))
+        metadata["identifier"] = identifier
+        metadata["name"] = name
+        for i, version in enumerate(metadata["versions"]):
+            version["download_url"] = f"https://example.org/{tag}/{i}"
+            version["download_sha256"] = f"{tag}{i}" * 32
+        return metadata
+
+    def write(self, package, metadata):
+        os.makedirs(os.path.join(self.packages, package), exist_ok=True)
+        with io.open(os.path.join(
+                self.packages, package, "metadata.json"), "w",
+                encoding="utf-8") as f:
+            json.dump(metadata, f)
+
+    def index(self):
+        index = consistency.RepositoryIndex(self.packages)
+        index.scan()
+        return index
+
+    def test_parse_diff(self):
+        self.assertEqual(consistency.parse_diff([
+            "A\tpackages/a/metadata.json",
+            "M       packages/b/metadata.json",
+            "M\tpackages/b/icon.png",
+            "D\tpackages/c/metadata.json",
+            "M\tREADME.md",
+            "R100\tpackages/d/metadata.json\tpackages/e/metadata.json",
+            "C90\tpackages/a/metadata.json\tpackages/f/metadata.json",
+            "M\tpackages/with space/metadata.json",
+        ]), {"a": "A", "b": "M", "c": "D", "d": "D", "e": "A", "f": "A",
+             "with space": "M"})
+
+    def test_normalize_name(self):
+        self.assertEqual(
+            consistency.normalize_name("My  Package-Name_2"),
+            consistency.normalize_name("mypackagename2"))
+
+    def test_no_conflicts(self):
+        index = self.index()
+        self.assertEqual(index.conflicts("a"), [])
+        self.assertEqual(index.conflicts("b"), [])
+
+    def test_conflicts(self):
+        other = self.package("a", "package-a", "c")
+        other["versions"][0]["download_url"] = "https://example.org/a/0"
+        other["versions"][1]["download_sha256"] = "b1" * 32
+        self.write("c", other)
+
+        index = self.index()
+
+        self.assertEqual(index.conflicts("c"), [
+            "Package identifier \"a\" is also used by a",
+            "Package name is the same as the name of a ignoring case, "
+            "spaces and punctuation",
+            "Download url https://example.org/a/0 is also used by a",
+            "Download sha256 " + "b1" * 32 + " is also used by b",
+        ])
+        self.assertEqual(len(index.conflicts("a")), 3)
+
+    def test_own_versions_may_share(self):
+        # versions of one package are allowed to reuse each others values
+        metadata = self.package("c", "Package C", "c")
+        for version in metadata["versions"]:
+            version["download_sha256"] = "c" * 64
+        self.write("c", metadata)
+
+        self.assertEqual(self.index().conflicts("c"), [])
+
+    def test_incremental_update(self):
+        index = self.index()
+        self.write("c", self.package("a", "Package C", "c"))
+
+        with patch("validate.consistency.RepositoryIndex.load_package",
+                   wraps=index.load_package) as load_package:
+            index.apply_changes({"c": "A"})
+            load_package.assert_called_once_with("c")
+
+        self.assertEqual(len(index.conflicts("c")), 1)
+
+        shutil.rmtree(os.path.join(self.packages, "c"))
+        index.apply_changes({"c": "D"})
+
+        self.assertEqual(index.conflicts("a"), [])
+        self.assertNotIn("c", index.entries)
+
+    def test_save_load(self):
+        index = self.index()
+        index.revision = "abc"
+        path = os.path.join(self.tmp, "index.json")
+        index.save(path)
+
+        loaded = consistency.RepositoryIndex.load(path, self.packages)
+
+        self.assertEqual(loaded.revision, "abc")
+        self.assertEqual(loaded.entries, index.entries)
+        self.assertEqual(loaded.maps, index.maps)
+
+    def test_open_index_same_revision(self):
+        index = self.index()
+        index.revision = "abc"
+        path = os.path.join(self.tmp, "index.json")
+        index.save(path)
+
+        with patch("validate.consistency.RepositoryIndex.scan") as scan, \
+                patch("validate.consistency.git_changes") as git_changes:
+            consistency.open_index(path, "abc", self.packages)
+            scan.assert_not_called()
+            git_changes.assert_not_called()
+
+    @patch("validate.consistency.git_changes")
+    def test_open_index_roll_forward(self, git_changes):
+        index = self.index()
+        index.revision = "abc"
+        path = os.path.join(self.tmp, "index.json")
+        index.save(path)
+
+        self.write("c", self.package("c", "Package C", "c"))
+        git_changes.return_value = {"c": "A"}
+
+        with patch("validate.consistency.RepositoryIndex.scan") as scan:
+            index = consistency.open_index(path, "def", self.packages)
+            scan.assert_not_called()
+
+        git_changes.assert_called_once_with("abc", "def")
+        self.assertIn("c", index.entries)
+        self.assertEqual(index.revision, "def")
+
+    @patch("validate.consistency.verify_exit")
+    def test_main(self, verify_exit):
+        self.write("c", self.package("a", "Package C", "c"))
+        diff = os.path.join(self.tmp, "diff.txt")
+        index = os.path.join(self.tmp, "index.json")
+        with io.open(diff, "w") as f:
+            f.write("A\tpackages/c/metadata.json\n")
+
+        with patch('sys.stdout', new=StringIO()) as fake_out, \
+                patch("validate.consistency.verify") as verify:
+            consistency.main([diff, "--packages", self.packages,
+                              "--index", index, "--head", "abc"])
+            self.assertIn("Validation passed", fake_out.getvalue())
+
+        verify.assert_called_once_with(
+            False, "Package c: Package identifier \"a\" is also used by a")
+
+        with io.open(index, encoding="utf-8") as f:
+            saved = json.load(f)
+        self.assertEqual(saved["revision"], "abc")
+        self.assertEqual(sorted(saved["packages"]), ["a", "b", "c"])
@@ -0,0 +1,174 @@
+import os
+import shutil
+import stat
+import subprocess
+import tempfile
+import threading
+from unittest import TestCase
+from unittest.mock import patch
+
+from validate import daemon
+from validate.util.git import get_object_reader
+from validate.util.verify import verify, verify_exit
+
+
+def passing_job(args):
+    print("checking", *args)
+
+
+def env_job(args):
+    print(os.environ.get("VALIDATE_LIMITS"), os.environ.get("VALIDATE_X"))
+
+
+def failing_job(args):
+    verify(False, "first problem")
+    verify_exit(False, "fatal problem")
+
+
+JOBS = {"pass": passing_job, "fail": failing_job, "env": env_job}
+
+
+@patch("validate.daemon.entry_points", new=lambda: JOBS)
+class TestDaemon(TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.tmp)
+
+    def test_parse_address(self):
+        self.assertEqual(daemon.parse_address("localhost:8765"),
+                         ("localhost", 8765))
+        self.assertEqual(daemon.parse_address(":8765"), ("127.0.0.1", 8765))
+        self.assertEqual(daemon.parse_address("/tmp/validate.sock"),
+                         "/tmp/validate.sock")
+
+    def test_loopback_only(self):
+        for address in ["0.0.0.0:0", "192.0.2.1:8765"]:
+            with self.subTest(address=address):
+                self.assertRaises(ValueError, daemon.make_server, address)
+
+        with patch("sys.stderr"), self.assertRaises(SystemExit):
+            daemon.main(["--address", "0.0.0.0:0"])
+
+        server = daemon.make_server("localhost:0")
+        server.server_close()
+
+    def test_job_environment(self):
+        self.assertEqual(daemon.job_environment(
+            {"VALIDATE_LIMITS": "version.time=3", "VALIDATE_DAEMON": "x",
+             "HOME": "/"}), {"VALIDATE_LIMITS": "version.time=3"})
+
+        sent = []
+        # the daemon's own settings must not leak into jobs
+        with patch.dict("os.environ", {"VALIDATE_X": "daemon"}):
+            os.environ.pop("VALIDATE_LIMITS", None)
+            daemon.run_job(
+                {"job": "env", "env": {"VALIDATE_LIMITS": "version.time=3"}},
+                sent.append)
+            self.assertEqual(os.environ["VALIDATE_X"], "daemon")
+            self.assertNotIn("VALIDATE_LIMITS", os.environ)
+
+        self.assertEqual("".join(m["text"] for m in sent),
+                         "version.time=3 None\n")
+
+    def test_run_job(self):
+        sent = []
+
+        result = daemon.run_job(
+            {"job": "pass", "args": ["a"], "cwd": self.tmp}, sent.append)
+
+        self.assertTrue(result["passed"])
+        self.assertEqual("".join(m["text"] for m in sent), "checking a\n")
+
+        sent.clear()
+        with patch("sys.stdout"):
+            result = daemon.run_job({"job": "fail"}, sent.append)
+
+        self.assertFalse(result["passed"])
+        self.assertEqual(result["exit_code"], 1)
+        self.assertEqual(result["failures"], 1)
+        self.assertEqual(result["messages"],
+                         ["first problem", "fatal problem"])
+
+        result = daemon.run_job({"job": "nope"}, sent.append)
+        self.assertEqual(result["exit_code"], 2)
+
+    def test_client_gone(self):
+        def send(message):
+            raise BrokenPipeError()
+
+        self.assertRaises(daemon.ClientGone, daemon.run_job,
+                          {"job": "pass"}, send)
+
+    def test_roundtrip(self):
+        address = os.path.join(self.tmp, "validate.sock")
+        server = daemon.make_server(address)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+
+        self.assertEqual(stat.S_IMODE(os.stat(address).st_mode), 0o600)
+
+        try:
+            output = []
+            for i in range(2):
+                result = daemon.run_remote(
+                    address, "pass", [str(i)],
+                    lambda stream, text: output.append((stream, text)))
+                self.assertTrue(result["passed"])
+
+            result = daemon.run_remote(address, "fail", [], lambda *a: None)
+            self.assertFalse(result["passed"])
+        finally:
+            server.shutdown()
+            server.server_close()
+            thread.join()
+
+        self.assertEqual("".join(t for _, t in output),
+                         "checking 0\nchecking 1\n")
+        self.assertFalse(os.path.exists(address))
+
+    def test_checkouts(self):
+        def checkout(name):
+            path = os.path.join(self.tmp, name)
+            os.makedirs(os.path.join(path, "packages"))
+            with open(os.path.join(path, "metadata.json"), "w") as f:
+                f.write(name)
+            for args in [["init", "-q"], ["add", "."],
+                         ["commit", "-q", "-m", name]]:
+                subprocess.run(["git", "-c", "user.name=test", "-c",
+                                "user.email=test@test", *args], cwd=path,
+                               check=True, capture_output=True)
+            return os.path.join(path, "packages")
+
+        def read_old(args):
+            data = get_object_reader().read("HEAD", "../metadata.json")
+            print(data.decode())
+
+        outputs = []
+        with patch.dict(JOBS, read=read_old):
+            for cwd in [checkout("a"), checkout("b")]:
+                sent = []
+                daemon.run_job({"job": "read", "cwd": cwd}, sent.append)
+                outputs.append("".join(m["text"] for m in sent))
+
+        self.assertEqual(outputs, ["a\n", "b\n"])
+
+    def test_client_main_fallback(self):
+        address = os.path.join(self.tmp, "missing.sock")
+
+        with patch("sys.stdout") as stdout, patch("sys.stderr"):
+            daemon.client_main("pass", ["x"], address)
+
+        self.assertTrue(stdout.write.called)
+
+    def test_prune_cache(self):
+        for i in range(4):
+            path = os.path.join(self.tmp, f"{i}.zip")
+            with open(path, "wb") as f:
+                f.write(b"x" * 100)
+            os.utime(path, (i, i))
+
+        daemon.prune_cache(self.tmp, 250)
+
+        self.assertEqual(sorted(os.listdir(self.tmp)), ["2.zip", "3.zip"])
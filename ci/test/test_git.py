@@ -0,0 +1,61 @@
+import os
+import shutil
+import subprocess
+import tempfile
+from unittest import TestCase
+
+from validate.util.git import GitError, ObjectReader
+
+
+class TestObjectReader(TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.mkdtemp()
+
+        def git(*args):
+            subprocess.run(
+                ["git", "-c", "user.name=test", "-c", "user.email=test@test",
+                 *args], cwd=self.tmp, check=True, capture_output=True)
+
+        git("init", "-q")
+        os.makedirs(os.path.join(self.tmp, "packages", "a"))
+        with open(os.path.join(
+                self.tmp, "packages", "a", "metadata.json"), "wb") as f:
+            f.write(b'{"name": "old"}\n')
+        git("add", ".")
+        git("commit", "-q", "-m", "first")
+
+        with open(os.path.join(
+                self.tmp, "packages", "a", "metadata.json"), "wb") as f:
+            f.write(b'{"name": "new"}\n')
+        git("commit", "-q", "-a", "-m", "second")
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.tmp)
+
+    def test_read(self):
+        with ObjectReader(self.tmp) as reader:
+            path = "packages/a/metadata.json"
+            self.assertEqual(reader.read("HEAD~1", path), b'{"name": "old"}\n')
+            self.assertEqual(reader.read("HEAD", path), b'{"name": "new"}\n')
+            self.assertIsNone(reader.read("HEAD", "packages/b/metadata.json"))
+            self.assertIsNone(reader.read("HEAD", "packages/a"))
+            # the process is still usable after misses
+            self.assertEqual(reader.read("HEAD~1", path), b'{"name": "old"}\n')
+
+    def test_revision(self):
+        with ObjectReader(self.tmp) as reader:
+            path = "packages/a/metadata.json"
+            # a missing revision is an error, not a missing file
+            for rev in ["0" * 40, "nonexistent", "HEAD~5"]:
+                self.assertRaises(GitError, reader.read, rev, path)
+            self.assertEqual(reader.read("HEAD", path), b'{"name": "new"}\n')
+
+    def test_paths(self):
+        with ObjectReader(os.path.join(self.tmp, "packages")) as reader:
+            absolute = os.path.join(self.tmp, "packages", "a", "metadata.json")
+            self.assertEqual(reader.read("HEAD", absolute),
+                             b'{"name": "new"}\n')
+            self.assertEqual(reader.read("HEAD", "a/metadata.json"),
+                             b'{"name": "new"}\n')
+            self.assertRaises(GitError, reader.read, "HEAD",
+                              os.path.dirname(self.tmp))
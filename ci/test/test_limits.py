@@ -0,0 +1,257 @@
+import gzip
+import http.server
+import io
+import json
+import os
+import threading
+import time
+import zipfile
+from unittest import TestCase
+from unittest.mock import MagicMock, patch
+from io import StringIO
+
+from munch import munchify
+
+from validate import image, package
+from validate.util import limits
+from validate.util.limits import LimitExceeded
+from validate.util.verify import get_messages, reset_failures
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class DripHandler(http.server.BaseHTTPRequestHandler):
+    """
+    Sends a byte at a time, slower than anyone would wait for.
+    """
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Length", "100")
+        self.end_headers()
+        try:
+            for _ in range(100):
+                self.wfile.write(b"x")
+                self.wfile.flush()
+                time.sleep(0.2)
+        except OSError:
+            pass
+
+
+class TestLimits(TestCase):
+    def tearDown(self) -> None:
+        reset_failures()
+
+    def test_parse_limits(self):
+        parsed, rss = limits.parse_limits([
+            "run.download=2G", "version.members=10", "version.time=0",
+            "rss=512m"])
+        self.assertEqual(parsed["run.download"], 2 * 1024 ** 3)
+        self.assertEqual(parsed["version.members"], 10)
+        self.assertEqual(parsed["version.inflated"],
+                         limits.DEFAULTS["version.inflated"])
+        self.assertNotIn("version.time", parsed)
+        self.assertEqual(rss, 512 * 1024 ** 2)
+
+        for spec in ["run.speed=1", "job.time=1", "run.time=soon"]:
+            self.assertRaises(ValueError, limits.parse_limits, [spec])
+
+    @patch("validate.util.limits.LIMITS",
+           new={"run.download": 100, "version.download": 60})
+    def test_scopes(self):
+        with limits.scope("run"):
+            for _ in range(2):
+                with limits.scope("version"):
+                    limits.charge("download", 40)
+                    self.assertEqual(limits.remaining("download"), 20)
+
+            with limits.scope("version"), \
+                    self.assertRaises(LimitExceeded) as e:
+                limits.charge("download", 40)
+
+        self.assertEqual(e.exception.scope, "run")
+        self.assertEqual(str(e.exception),
+                         "run budget exceeded: download 120 of 100")
+        # nothing is tracked outside of a scope
+        limits.charge("download", 1000)
+        self.assertIsNone(limits.remaining("download"))
+
+    @patch("validate.util.limits.LIMITS", new={"version.time": 10})
+    def test_time(self):
+        clock = Clock()
+        with patch("time.monotonic", new=clock), limits.scope("version"):
+            clock.now = 9
+            limits.check()
+            self.assertEqual(limits.remaining("time"), 1)
+            clock.now = 11
+            with self.assertRaises(LimitExceeded) as e:
+                limits.check()
+        self.assertEqual(str(e.exception),
+                         "version budget exceeded: time 11s of 10s")
+
+    @patch("validate.util.limits.RSS_LIMIT", new=1)
+    def test_rss(self):
+        limits.check()
+        with limits.scope("run"), self.assertRaises(LimitExceeded) as e:
+            limits.check()
+        self.assertEqual(e.exception.scope, "process")
+
+
+class TestStageLimits(TestCase):
+    def setUp(self) -> None:
+        with io.open("test/data/metadata_valid.json", encoding="utf-8") as f:
+            self.metadata = munchify(json.load(f))
+        self.version = self.metadata.versions[0]
+        self.args = munchify({"max_icon_width": 64, "max_icon_height": 64,
+                              "max_icon_size": 20480})
+
+    def tearDown(self) -> None:
+        reset_failures()
+        limits.configure([])
+
+    def download(self, url, path):
+        with zipfile.ZipFile(path, "w") as z:
+            for name in ["metadata.json", "plugins/__init__.py",
+                         "resources/icon.png"]:
+                z.write("test/data/package/" + name, name)
+        return True
+
+    def validate(self, version_limits, download=None):
+        with patch("validate.util.limits.LIMITS", new=version_limits), \
+                patch("validate.package.SCHEMA", new={}), \
+                patch("validate.package.validate_packaged_metadata"), \
+                patch("validate.package.download_file",
+                      side_effect=download or self.download), \
+                patch("sys.stdout", new=StringIO()):
+            package.validate_version(self.args, self.metadata, self.version)
+        return get_messages()
+
+    def test_members(self):
+        messages = self.validate({"version.members": 2})
+        self.assertIn("Version 2.0: version budget exceeded: members 3 of 2",
+                      messages)
+        self.assertFalse(os.path.exists(
+            package.archive_tmp_path(self.metadata, self.version)))
+
+    def test_inflated(self):
+        size = os.path.getsize("test/data/package/metadata.json")
+        messages = self.validate({"version.inflated": size})
+        self.assertTrue(any("version budget exceeded: inflated" in m
+                            for m in messages))
+
+    def test_nested_models(self):
+        model = gzip.compress(b"#VRML V2.0 utf8\n" + b" " * 100000)
+        self.metadata.type = "library"
+        del self.version.platforms
+
+        def download(url, path):
+            self.download(url, path)
+            with zipfile.ZipFile(path, "a") as z:
+                for i in range(4):
+                    z.writestr(f"3dmodels/a.3dshapes/{i}.wrz", model)
+            return True
+
+        # every model fits the budget, all of them together don't
+        for jobs in [1, 2]:
+            with self.subTest(jobs=jobs), \
+                    patch("validate.package.MEMBER_JOBS", new=jobs), \
+                    patch("validate.util.members.PARALLEL_MIN_MEMBERS",
+                          new=0):
+                reset_failures()
+                messages = self.validate({"version.inflated": 250000},
+                                         download)
+            self.assertTrue(any("version budget exceeded: inflated" in m
+                                for m in messages), messages)
+
+    def test_library_check_budgets(self):
+        path = os.path.join("tmp", "library_check.zip")
+        os.makedirs("tmp", exist_ok=True)
+        self.addCleanup(os.remove, path)
+        with zipfile.ZipFile(path, "w") as z:
+            z.writestr("a.wrz", gzip.compress(b"#VRML V2.0 utf8\n" * 100))
+            z.writestr("b.wrz", gzip.compress(b"#VRML V2.0 utf8\n" * 100))
+
+        with zipfile.ZipFile(path) as z:
+            check = package.LibraryCheck(1000000, inflated=2000)
+            self.assertEqual(check(z, "a.wrz"), (None, 1600))
+            self.assertEqual(check(z, "b.wrz"),
+                             ("expands to more than 400 bytes", 1600))
+            self.assertEqual(check(z, "a.wrz"), (
+                "not checked, inflated size budget used up", 0))
+
+            check = package.LibraryCheck(1000000, deadline=time.time() - 1)
+            self.assertEqual(check(z, "a.wrz"),
+                             ("not checked, out of time", 0))
+
+    def test_run_limit_stops_run(self):
+        with patch("validate.util.limits.LIMITS", new={"run.members": 2}), \
+                limits.scope("run"), self.assertRaises(LimitExceeded) as e:
+            self.validate({"run.members": 2})
+        self.assertEqual(e.exception.scope, "run")
+
+    @patch("validate.package.tqdm", new=MagicMock())
+    @patch("validate.util.limits.LIMITS", new={"version.time": 100})
+    def test_slow_download(self):
+        clock = Clock()
+        response = MagicMock()
+
+        def drip(size):
+            for _ in range(10):
+                clock.now += 30
+                yield b"x"
+
+        response.iter_content.side_effect = drip
+
+        with patch("time.monotonic", new=clock), \
+                patch("validate.package.HTTP") as http, \
+                patch("sys.stdout", new=StringIO()), \
+                limits.scope("version"), \
+                self.assertRaises(LimitExceeded) as e:
+            http.get.return_value = response
+            package.download_file("https://example.org/a.zip",
+                                  os.devnull)
+
+        self.assertEqual(e.exception.resource, "time")
+        http.get.assert_called_once_with(
+            "https://example.org/a.zip", stream=True,
+            timeout=(package.CONNECT_TIMEOUT, package.READ_TIMEOUT))
+        response.close.assert_called_once()
+
+    @patch("validate.package.tqdm", new=MagicMock())
+    @patch("validate.util.limits.LIMITS", new={"version.time": 1})
+    def test_drip_download(self):
+        server = http.server.ThreadingHTTPServer(
+            ("127.0.0.1", 0), DripHandler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        url = f"http://127.0.0.1:{server.server_address[1]}/a.zip"
+
+        start = time.monotonic()
+        with patch("sys.stdout", new=StringIO()), \
+                limits.scope("version"), \
+                self.assertRaises(LimitExceeded) as e:
+            package.download_file(url, os.devnull)
+
+        # 1024 byte chunks would take 20 seconds to arrive
+        self.assertLess(time.monotonic() - start, 5)
+        self.assertEqual(e.exception.resource, "time")
+
+    def test_image_decode(self):
+        icon = "test/data/package/resources/icon.png"
+        with patch("sys.stdout", new=StringIO()) as out, \
+                self.assertRaises(SystemExit):
+            image.main(["--full-icon-decode", "--limit", "run.inflated=1k",
+                        icon])
+        self.assertIn("Validation stopped, run budget exceeded: inflated "
+                      "16384 of 1024", out.getvalue())
@@ -0,0 +1,52 @@
+import importlib.util
+from unittest import TestCase
+
+# the packager app needs wx, its log buffer doesn't
+spec = importlib.util.spec_from_file_location(
+    "logsink", "../tools/app/logsink.py")
+logsink = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(logsink)
+
+
+class TestLogBuffer(TestCase):
+    def test_carriage_return(self):
+        buffer = logsink.LogBuffer()
+
+        buffer.write("default", "Downloading 10%\rDownloading 50%")
+        self.assertEqual(buffer.take(),
+                         ([], [("default", "Downloading 50%")]))
+
+        buffer.write("default", "\rDownloading 90%")
+        buffer.write("green", "\rDone\n")
+        self.assertEqual(buffer.take(),
+                         ([[("green", "Done"), ("green", "\n")]], []))
+
+    def test_partial_lines(self):
+        buffer = logsink.LogBuffer()
+
+        buffer.write("default", "Checking ")
+        self.assertEqual(buffer.take(), ([], [("default", "Checking ")]))
+        # the tail didn't change since it was taken
+        self.assertIsNone(buffer.take())
+
+        buffer.write("red", "failed\nnext")
+        self.assertEqual(buffer.take(), (
+            [[("default", "Checking "), ("red", "failed"), ("red", "\n")]],
+            [("red", "next")]))
+
+        buffer.write("default", " line\n")
+        self.assertEqual(buffer.take(), (
+            [[("red", "next"), ("default", " line"), ("default", "\n")]],
+            []))
+        self.assertIsNone(buffer.take())
+
+    def test_max_lines(self):
+        buffer = logsink.LogBuffer(max_lines=3)
+
+        buffer.write("default", "".join(f"{i}\n" for i in range(5)))
+        buffer.write("default", "5")
+
+        lines, tail = buffer.take()
+        self.assertEqual([line[0][1] for line in lines], ["2", "3", "4"])
+        self.assertEqual(tail, [("default", "5")])
+        self.assertEqual(logsink.LogBuffer().lines.maxlen, logsink.MAX_LINES)
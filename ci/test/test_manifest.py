@@ -0,0 +1,132 @@
+import io
+import json
+import os
+import shutil
+import tempfile
+import zipfile
+from unittest import TestCase
+from unittest.mock import patch
+from io import StringIO
+
+from munch import munchify
+
+from validate import manifest, package
+from validate.util.verify import reset_failures
+
+
+SHA_1 = "1" * 64
+SHA_2 = "2" * 64
+
+
+class TestManifest(TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.mkdtemp()
+        self.manifests = os.path.join(self.tmp, "manifests")
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.tmp)
+        reset_failures()
+
+    def archive(self, files):
+        path = os.path.join(self.tmp, "a.zip")
+        with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as z:
+            z.writestr("plugins/", "")
+            for name, data in files.items():
+                z.writestr(name, data)
+        return zipfile.ZipFile(path)
+
+    def save(self, sha, files):
+        with self.archive(files) as z:
+            m = manifest.make_manifest(z, sha)
+        manifest.save_manifest(self.manifests, m)
+        return m
+
+    def test_make_manifest(self):
+        with self.archive({"metadata.json": "{}"}) as z:
+            m = manifest.make_manifest(z, SHA_1)
+            info = z.getinfo("metadata.json")
+        self.assertEqual(m, {"sha256": SHA_1, "entries": [
+            ["metadata.json", 2, info.CRC, info.compress_size]]})
+
+        manifest.save_manifest(self.manifests, m)
+        self.assertEqual(manifest.load_manifest(self.manifests, SHA_1), m)
+        self.assertIsNone(manifest.load_manifest(self.manifests, SHA_2))
+
+    def test_diff(self):
+        old = self.save(SHA_1, {"metadata.json": "{}", "plugins/a.py": "a",
+                                "plugins/b.py": "b", "plugins/c.py": "c"})
+        new = self.save(SHA_2, {"metadata.json": "{}", "plugins/a.py": "A",
+                                "plugins/c.py": "cc", "plugins/d.py": "d"})
+
+        changes = manifest.diff(old, new)
+        self.assertEqual([e[0] for e in changes["added"]], ["plugins/d.py"])
+        self.assertEqual([e[0] for e in changes["removed"]],
+                         ["plugins/b.py"])
+        self.assertEqual([(p[0], e[1]) for p, e in changes["modified"]],
+                         [("plugins/a.py", 1), ("plugins/c.py", 2)])
+        self.assertEqual(changes["unchanged"], 1)
+
+    def test_main(self):
+        self.save(SHA_1, {"plugins/a.py": "a"})
+        self.save(SHA_2, {"plugins/a.py": "a", "plugins/b.py": "bb"})
+
+        packages = os.path.join(self.tmp, "packages")
+        os.makedirs(os.path.join(packages, "pkg"))
+        with io.open(os.path.join(packages, "pkg", "metadata.json"), "w",
+                     encoding="utf-8") as f:
+            json.dump({"versions": [
+                {"version": "1.0", "download_sha256": SHA_1},
+                {"version": "2.0", "download_sha256": SHA_2}]}, f)
+
+        with patch("sys.stdout", new=StringIO()) as out:
+            manifest.main(["pkg", "1.0", SHA_2, "--packages", packages,
+                           "--manifests", self.manifests])
+        self.assertEqual(out.getvalue().splitlines(), [
+            f"pkg 1.0 -> {SHA_2}",
+            "A plugins/b.py 2",
+            "1 added, 0 removed, 0 modified, 1 unchanged"])
+
+        with patch("sys.stdout", new=StringIO()) as out, \
+                self.assertRaises(SystemExit):
+            manifest.main(["pkg", "1.0", "3.0", "--packages", packages,
+                           "--manifests", self.manifests])
+        self.assertIn("No manifest of pkg 3.0", out.getvalue())
+
+        # the validator and archive-diff.py share the default directory
+        with patch.dict("os.environ", {"VALIDATE_MANIFESTS": self.manifests}):
+            self.assertEqual(manifest.default_manifests(), self.manifests)
+            with patch("sys.stdout", new=StringIO()):
+                manifest.main(["pkg", "1.0", "2.0", "--packages", packages])
+
+        with patch.dict("os.environ"), \
+                patch("sys.stderr", new=StringIO()) as err, \
+                self.assertRaises(SystemExit):
+            os.environ.pop("VALIDATE_MANIFESTS", None)
+            manifest.main(["pkg", "1.0", "2.0", "--packages", packages])
+        self.assertIn("pass --manifests or set VALIDATE_MANIFESTS",
+                      err.getvalue())
+
+    @patch("validate.package.validate_packaged_metadata")
+    @patch("validate.package.getsha256")
+    def test_validate_version_saves_manifest(self, getsha256, _):
+        with io.open("test/data/metadata_valid.json", encoding="utf-8") as f:
+            metadata = munchify(json.load(f))
+        version = metadata.versions[0]
+        getsha256.return_value = version.download_sha256
+
+        def download(url, path):
+            with zipfile.ZipFile(path, "w") as z:
+                z.write("test/data/package/metadata.json", "metadata.json")
+            return True
+
+        args = munchify({"max_icon_width": 64, "max_icon_height": 64,
+                         "max_icon_size": 20480})
+        with patch("validate.package.MANIFESTS", new=self.manifests), \
+                patch("validate.package.SCHEMA", new={}), \
+                patch("validate.package.download_file",
+                      side_effect=download), \
+                patch("sys.stdout", new=StringIO()):
+            package.validate_version(args, metadata, version)
+
+        m = manifest.load_manifest(self.manifests, version.download_sha256)
+        self.assertEqual([e[0] for e in m["entries"]], ["metadata.json"])
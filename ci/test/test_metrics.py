@@ -0,0 +1,134 @@
+import json
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+from unittest.mock import patch
+from io import StringIO
+
+from validate import image
+from validate.util import metrics
+from validate.util.verify import reset_failures
+
+
+class TestMetrics(TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.mkdtemp()
+        metrics.reset()
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.tmp)
+        metrics.reset()
+        reset_failures()
+
+    def test_prometheus(self):
+        metrics.inc("download_bytes_total", 100, host="a")
+        metrics.inc("download_bytes_total", 50, host="a")
+        metrics.set_gauge("artifact_bytes", 7, file="packages.json")
+        metrics.observe("phase_seconds", 0.2, phase="x")
+        metrics.observe("phase_seconds", 2000, phase="x")
+        metrics.inc("failures_total", rule="bad \"*\"\n")
+
+        text = metrics.to_prometheus(metrics.snapshot())
+        lines = text.splitlines()
+
+        self.assertIn("# TYPE kicad_pcm_download_bytes_total counter", lines)
+        self.assertIn('kicad_pcm_download_bytes_total{host="a"} 150', lines)
+        self.assertIn(
+            'kicad_pcm_artifact_bytes{file="packages.json"} 7', lines)
+        self.assertIn("# TYPE kicad_pcm_phase_seconds histogram", lines)
+        self.assertIn(
+            'kicad_pcm_phase_seconds_bucket{phase="x",le="0.1"} 0', lines)
+        self.assertIn(
+            'kicad_pcm_phase_seconds_bucket{phase="x",le="0.5"} 1', lines)
+        self.assertIn(
+            'kicad_pcm_phase_seconds_bucket{phase="x",le="+Inf"} 2', lines)
+        self.assertIn('kicad_pcm_phase_seconds_count{phase="x"} 2', lines)
+        self.assertIn(
+            'kicad_pcm_failures_total{rule="bad \\"*\\"\\n"} 1', lines)
+
+    def test_merge(self):
+        metrics.inc("archives_scanned_total", 2)
+        metrics.observe("phase_seconds", 1, phase="x")
+        snapshot = json.loads(json.dumps(metrics.snapshot()))
+
+        metrics.merge(snapshot)
+        data = metrics.snapshot()
+        self.assertEqual(data["counters"][0]["value"], 4)
+        self.assertEqual(data["histograms"][0]["count"], 2)
+        self.assertEqual(data["histograms"][0]["sum"], 2)
+
+    def test_rule_of(self):
+        self.assertEqual(
+            metrics.rule_of('Version 1.0: package contains extra file "a"'),
+            'package contains extra file "*"')
+        self.assertEqual(
+            metrics.rule_of("Error downloading url https://x.org/a.zip\n"
+                            "HTTP code: 404"), "Error downloading url URL")
+        self.assertEqual(
+            metrics.rule_of("Version 2.0: download size does not match, "
+                            "expected 1234, actual 1000"),
+            "download size does not match, expected N, actual N")
+
+    def test_nested_runs(self):
+        @metrics.run("inner")
+        def inner():
+            metrics.inc("archives_scanned_total")
+
+        @metrics.run("outer")
+        def outer():
+            metrics.DIRECTORY = self.tmp
+            inner()
+            inner()
+
+        outer()
+
+        self.assertEqual(sorted(os.listdir(self.tmp)),
+                         ["outer.json", "outer.prom"])
+        with open(os.path.join(self.tmp, "outer.json")) as f:
+            data = json.load(f)
+        self.assertEqual(data["job"], "outer")
+        self.assertEqual(data["counters"][0]["value"], 2)
+        self.assertEqual(
+            sorted(h["labels"]["run"] for h in data["histograms"]),
+            ["inner", "outer"])
+
+        # the next run starts from scratch and writes only when asked to
+        metrics.run("other")(lambda: None)()
+        self.assertEqual(len(os.listdir(self.tmp)), 2)
+        self.assertEqual(metrics.snapshot()["counters"], [])
+
+    def test_image_main(self):
+        with patch("sys.stdout", new=StringIO()), \
+                self.assertRaises(SystemExit):
+            image.main(["--metrics", self.tmp, "--max-icon-width", "32",
+                        "test/data/package/resources/icon.png"])
+
+        with open(os.path.join(self.tmp, "validate-image.prom")) as f:
+            text = f.read()
+        self.assertIn(
+            'kicad_pcm_failures_total{job="validate-image",'
+            'rule="Image width exceeds maximum"} 1', text)
+        self.assertIn('kicad_pcm_run_seconds_count{job="validate-image",'
+                      'run="validate-image"} 1', text)
+
+    def test_jobs_distinct(self):
+        series = []
+        for job in ["validate-package", "build-repository"]:
+            with metrics.run(job):
+                metrics.DIRECTORY = self.tmp
+                metrics.inc("download_bytes_total", 10, host="a")
+                with metrics.timer("download"):
+                    pass
+
+            with open(os.path.join(self.tmp, f"{job}.prom")) as f:
+                samples = [line.rsplit(" ", 1)[0] for line in f
+                           if not line.startswith("#")]
+            self.assertIn(
+                f'kicad_pcm_download_bytes_total{{job="{job}",host="a"}}',
+                samples)
+            self.assertTrue(all(f'job="{job}"' in s for s in samples))
+            series += samples
+
+        # the textfile collector rejects series repeated across files
+        self.assertEqual(len(series), len(set(series)))
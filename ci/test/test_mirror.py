@@ -0,0 +1,121 @@
+import functools
+import hashlib
+import http.server
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+from unittest import TestCase
+from unittest.mock import patch
+from io import StringIO
+
+from validate import mirror, package
+from validate.util import limits
+
+
+class QuietHandler(http.server.SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+class TestMirror(TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.mkdtemp()
+        self.www = os.path.join(self.tmp, "www")
+        self.store = os.path.join(self.tmp, "mirror")
+        self.packages = os.path.join(self.tmp, "packages")
+        os.makedirs(self.www)
+        os.makedirs(os.path.join(self.packages, "a"))
+
+        self.data = b"archive" * 100
+        self.sha = hashlib.sha256(self.data).hexdigest()
+        with io.open(os.path.join(self.www, "a.zip"), "wb") as f:
+            f.write(self.data)
+
+        handler = functools.partial(QuietHandler, directory=self.www)
+        self.server = http.server.ThreadingHTTPServer(
+            ("127.0.0.1", 0), handler)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.start()
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+        versions = [
+            {"version": "1", "download_url": f"{self.url}/a.zip",
+             "download_sha256": self.sha},
+            {"version": "2", "download_url": f"{self.url}/gone.zip",
+             "download_sha256": "0" * 64},
+        ]
+        with io.open(os.path.join(self.packages, "a", "metadata.json"), "w",
+                     encoding="utf-8") as f:
+            json.dump({"identifier": "a", "versions": versions}, f)
+
+    def tearDown(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+        shutil.rmtree(self.tmp)
+
+    def test_sync(self):
+        with patch("sys.stdout", new=StringIO()):
+            counts = mirror.sync(self.store, self.packages, 2)
+            self.assertEqual(counts, {"fetched": 1, "present": 0, "failed": 1})
+
+            # already mirrored archives are not fetched again
+            os.remove(os.path.join(self.www, "a.zip"))
+            counts = mirror.sync(self.store, self.packages, 2, verify=True)
+            self.assertEqual(counts, {"fetched": 0, "present": 1, "failed": 1})
+
+        m = mirror.Mirror(self.store)
+        self.assertEqual(m.lookup(f"{self.url}/a.zip"),
+                         mirror.archive_path(self.store, self.sha))
+        self.assertIsNone(m.lookup(f"{self.url}/gone.zip"))
+
+    def test_download_from_mirror(self):
+        with patch("sys.stdout", new=StringIO()):
+            mirror.sync(self.store, self.packages, 2)
+        os.remove(os.path.join(self.www, "a.zip"))
+
+        path = os.path.join(self.tmp, "download.zip")
+        with patch("validate.package.MIRROR", new=mirror.Mirror(self.store)), \
+                patch("sys.stdout", new=StringIO()):
+            self.assertTrue(package.download_file(f"{self.url}/a.zip", path))
+
+        with io.open(path, "rb") as f:
+            self.assertEqual(f.read(), self.data)
+
+        with patch("validate.package.MIRROR", new=mirror.Mirror(self.store)), \
+                patch("validate.package.MAX_DOWNLOAD_SIZE", new=10), \
+                patch("validate.package.verify") as verify, \
+                patch("sys.stdout", new=StringIO()):
+            self.assertFalse(
+                package.download_file(f"{self.url}/a.zip", path))
+        verify.assert_called_once_with(
+            False, f"Error downloading url {self.url}/a.zip\nError: File "
+            f"is too large to download, review manually")
+
+        with patch("validate.package.MIRROR", new=mirror.Mirror(self.store)), \
+                patch("validate.util.limits.LIMITS",
+                      new={"version.download": 10}), \
+                limits.scope("version"), \
+                patch("sys.stdout", new=StringIO()), \
+                self.assertRaises(limits.LimitExceeded) as e:
+            package.download_file(f"{self.url}/a.zip", path)
+        self.assertEqual(e.exception.resource, "download")
+
+    def test_rewrite_url(self):
+        rewrite = {
+            "https://github.com/": "http://mirror/github/",
+            "https://github.com/kicad/": "http://mirror/kicad/",
+        }
+
+        self.assertEqual(
+            mirror.rewrite_url("https://github.com/kicad/a.zip", rewrite),
+            "http://mirror/kicad/a.zip")
+        self.assertEqual(
+            mirror.rewrite_url("https://github.com/other/a.zip", rewrite),
+            "http://mirror/github/other/a.zip")
+        self.assertEqual(
+            mirror.rewrite_url("https://gitlab.com/a.zip", rewrite),
+            "https://gitlab.com/a.zip")
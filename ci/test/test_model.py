@@ -0,0 +1,119 @@
+import gzip
+import io
+import os
+import shutil
+import tempfile
+import zipfile
+import zlib
+from unittest import TestCase
+from unittest.mock import patch
+
+from validate import model
+from validate.model import ModelError
+from validate.util import members
+
+
+STEP = (b"ISO-10303-21;\nHEADER;\nFILE_DESCRIPTION(('model'),'2;1');\n" +
+        b"#1=CARTESIAN_POINT('',(0.,0.,0.));\n" * 2000 +
+        b"ENDSEC;\nEND-ISO-10303-21;\n")
+VRML = b"#VRML V2.0 utf8\nShape { geometry Box { } }\n" * 100
+
+
+def check(data, kind="STEP", max_size=model.MAX_INFLATED_SIZE,
+          chunk_size=512):
+    return model.check_stream(io.BytesIO(data), kind, max_size, chunk_size)
+
+
+class TestModel(TestCase):
+    def test_valid(self):
+        for chunk_size in [1, 100, 65536]:
+            self.assertEqual(check(gzip.compress(STEP),
+                                   chunk_size=chunk_size), len(STEP))
+            self.assertEqual(check(zlib.compress(VRML), "VRML",
+                                   chunk_size=chunk_size), len(VRML))
+
+        # several gzip members, byte order mark, tiny model
+        self.assertEqual(
+            check(gzip.compress(STEP[:1000]) + gzip.compress(STEP[1000:])),
+            len(STEP))
+        check(gzip.compress(model.UTF8_BOM + b"\n#VRML V1.0 ascii"), "VRML")
+
+    def assertProblem(self, data, message, kind="STEP", max_size=2 ** 30):
+        for chunk_size in [1, 7, 65536]:
+            with self.assertRaises(ModelError) as e:
+                check(data, kind, max_size, chunk_size)
+            self.assertIn(message, str(e.exception))
+
+    def test_header(self):
+        self.assertProblem(gzip.compress(VRML), "does not contain STEP data")
+        self.assertProblem(gzip.compress(STEP), "does not contain VRML data",
+                           "VRML")
+        self.assertProblem(gzip.compress(b"solid x"), "STEP data")
+
+    def test_broken_stream(self):
+        data = gzip.compress(STEP)
+        self.assertProblem(b"", "file is empty")
+        self.assertProblem(STEP, "compressed data is corrupt")
+        self.assertProblem(data[:-4], "compressed data is truncated")
+        self.assertProblem(data[:len(data) // 2], "truncated")
+        self.assertProblem(data + b"garbage", "unexpected data after")
+
+        # crc of the gzip trailer
+        broken = data[:-8] + bytes([data[-8] ^ 1]) + data[-7:]
+        self.assertProblem(broken, "incorrect data check")
+
+    def test_budget(self):
+        data = gzip.compress(STEP)
+        self.assertEqual(check(data, max_size=len(STEP)), len(STEP))
+        self.assertProblem(data, f"expands to more than {len(STEP) - 1}",
+                           max_size=len(STEP) - 1)
+
+    def test_constant_memory(self):
+        # 128 MB of zeros are expanded only up to the budget
+        data = zlib.compressobj(9)
+        bomb = io.BytesIO()
+        bomb.write(data.compress(STEP[:100]))
+        zeros = bytes(1024 * 1024)
+        for _ in range(128):
+            bomb.write(data.compress(zeros))
+        bomb.write(data.flush())
+
+        with self.assertRaises(ModelError) as e:
+            check(bomb.getvalue(), max_size=16 * 1024 * 1024,
+                  chunk_size=65536)
+        self.assertIn("expands to more than", str(e.exception))
+
+    def test_model_kind(self):
+        self.assertEqual(model.model_kind("3dmodels/a.3dshapes/b.stpz"),
+                         "STEP")
+        self.assertEqual(model.model_kind("3dmodels/a.3dshapes/b.wrz"),
+                         "VRML")
+        self.assertIsNone(model.model_kind("3dmodels/a.3dshapes/b.step"))
+
+
+class TestModelMembers(TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, "library.zip")
+        with zipfile.ZipFile(self.path, "w", zipfile.ZIP_DEFLATED) as z:
+            z.writestr("3dmodels/a.3dshapes/ok.step.gz", gzip.compress(STEP))
+            z.writestr("3dmodels/a.3dshapes/ok.wrz", gzip.compress(VRML))
+            z.writestr("3dmodels/a.3dshapes/cut.stpz",
+                       gzip.compress(STEP)[:-10])
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.tmp)
+
+    def test_check_members(self):
+        for jobs in [1, 2]:
+            with self.subTest(jobs=jobs), \
+                    patch("validate.util.members.PARALLEL_MIN_MEMBERS",
+                          new=0), \
+                    zipfile.ZipFile(self.path) as z:
+                self.assertEqual(
+                    members.check_members(
+                        z, z.infolist(), model.check_member, jobs),
+                    [("3dmodels/a.3dshapes/ok.step.gz", None),
+                     ("3dmodels/a.3dshapes/ok.wrz", None),
+                     ("3dmodels/a.3dshapes/cut.stpz",
+                      "compressed data is truncated")])
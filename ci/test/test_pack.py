@@ -0,0 +1,163 @@
+import io
+import json
+import os
+import shutil
+import tempfile
+import zipfile
+from unittest import TestCase
+from unittest.mock import patch
+from io import StringIO
+
+from validate import pack
+from validate.util.getsha import getsha256
+
+
+class TestPack(TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.mkdtemp()
+        self.source = os.path.join(self.tmp, "source")
+        shutil.copytree("test/data/package", self.source)
+        os.makedirs(os.path.join(self.source, "plugins", "__pycache__"),
+                    exist_ok=True)
+        with io.open(os.path.join(
+                self.source, "plugins", "__pycache__", "x.pyc"), "wb") as f:
+            f.write(b"pyc")
+
+        self.metadata = os.path.join(self.tmp, "metadata.json")
+        shutil.copy("test/data/metadata_valid.json", self.metadata)
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.tmp)
+
+    def output(self, name="package.zip"):
+        return os.path.join(self.tmp, name)
+
+    def test_collect_files(self):
+        files, rejected = pack.collect_files("plugin", self.source)
+
+        self.assertEqual([name for name, _ in files], [
+            "metadata.json",
+            "plugins/__init__.py",
+            "plugins/allowed_no_extension",
+            "resources/icon.png"])
+        self.assertEqual(rejected, ["extra.txt", "extra_no_extension"])
+
+    def test_build_package(self):
+        files, _ = pack.collect_files("plugin", self.source)
+        sha, size, install_size = pack.build_package(files, self.output())
+
+        self.assertEqual(sha, getsha256(self.output()))
+        self.assertEqual(size, os.path.getsize(self.output()))
+
+        with zipfile.ZipFile(self.output()) as z:
+            self.assertIsNone(z.testzip())
+            self.assertEqual(
+                z.namelist(), [name for name, _ in files])
+            self.assertEqual(
+                install_size, sum(i.file_size for i in z.infolist()))
+            for info in z.infolist():
+                self.assertEqual(info.date_time, (1980, 1, 1, 0, 0, 0))
+            with io.open(os.path.join(self.source, "metadata.json"),
+                         "rb") as f:
+                self.assertEqual(z.read("metadata.json"), f.read())
+            # incompressible png is stored
+            self.assertEqual(
+                z.getinfo("resources/icon.png").compress_type,
+                zipfile.ZIP_STORED)
+
+    def test_build_deterministic(self):
+        files, _ = pack.collect_files("plugin", self.source)
+        sha1, _, _ = pack.build_package(files, self.output("1.zip"), jobs=1)
+        os.utime(os.path.join(self.source, "metadata.json"), (0, 0))
+        sha2, _, _ = pack.build_package(files, self.output("2.zip"), jobs=8)
+
+        self.assertEqual(sha1, sha2)
+
+    def test_build_many_files(self):
+        files = []
+        for i in range(50):
+            path = os.path.join(self.tmp, f"{i}.txt")
+            with io.open(path, "w") as f:
+                f.write(f"file {i}\n" * i)
+            files.append((f"plugins/{i:02}.txt", path))
+
+        pack.build_package(files, self.output(), jobs=3)
+
+        with zipfile.ZipFile(self.output()) as z:
+            self.assertIsNone(z.testzip())
+            self.assertEqual(z.namelist(), [name for name, _ in files])
+
+    def test_update_metadata(self):
+        pack.update_metadata(self.metadata, "1.0", "a" * 64, 10, 20)
+
+        with io.open(self.metadata, encoding="utf-8") as f:
+            version = json.load(f)["versions"][1]
+
+        self.assertEqual(version["download_sha256"], "a" * 64)
+        self.assertEqual(version["download_size"], 10)
+        self.assertEqual(version["install_size"], 20)
+
+        self.assertRaises(
+            ValueError, pack.update_metadata, self.metadata, "9.0", "", 0, 0)
+
+    def test_update_metadata_keeps_formatting(self):
+        text = ('{"name": "a", "versions": [{"version": "0.9"},\r\n'
+                '  {"version" : "1.0", "download_size" : 1,\r\n'
+                '   "kicad_version" : "6.0"}], "tags": ["x", "é"]}')
+        with io.open(self.metadata, "w", encoding="utf-8", newline="") as f:
+            f.write(text)
+
+        pack.update_metadata(self.metadata, "1.0", "a" * 64, 10, 20)
+
+        with io.open(self.metadata, encoding="utf-8", newline="") as f:
+            self.assertEqual(f.read(), text.replace(
+                '"download_size" : 1', '"download_size" : 10').replace(
+                '"6.0"}', '"6.0",\r\n   "download_sha256" : "' + "a" * 64 +
+                '",\r\n   "install_size" : 20}'))
+
+    def test_main_errors(self):
+        for args, message in [
+                (["--type", "theme"], "invalid choice"),
+                (["--metadata", self.metadata, "--version", "9.0"],
+                 "Version 9.0 not found")]:
+            with patch("sys.stdout", new=StringIO()), \
+                    patch("sys.stderr", new=StringIO()) as err, \
+                    self.assertRaises(SystemExit):
+                pack.main([self.source, self.output(), *args])
+            self.assertIn(message, err.getvalue())
+
+        with io.open(os.path.join(self.source, "metadata.json"),
+                     encoding="utf-8") as f:
+            metadata = json.load(f)
+        metadata["type"] = "theme"
+        with io.open(os.path.join(self.source, "metadata.json"), "w",
+                     encoding="utf-8") as f:
+            json.dump(metadata, f)
+
+        with patch("sys.stderr", new=StringIO()) as err, \
+                self.assertRaises(SystemExit):
+            pack.main([self.source, self.output()])
+        self.assertIn("Unknown package type theme", err.getvalue())
+
+    def test_main(self):
+        with io.open(os.path.join(self.source, "metadata.json"),
+                     encoding="utf-8") as f:
+            version = json.load(f)["versions"][0]["version"]
+
+        with io.open(self.metadata, encoding="utf-8") as f:
+            metadata = json.load(f)
+        metadata["versions"][0]["version"] = version
+        with io.open(self.metadata, "w", encoding="utf-8") as f:
+            json.dump(metadata, f)
+
+        with patch('sys.stdout', new=StringIO()) as fake_out:
+            pack.main([self.source, self.output(),
+                       "--metadata", self.metadata])
+            self.assertIn('Skipping "extra.txt"', fake_out.getvalue())
+
+        with io.open(self.metadata, encoding="utf-8") as f:
+            updated = json.load(f)["versions"][0]
+
+        self.assertEqual(updated["download_sha256"], getsha256(self.output()))
+        self.assertEqual(
+            updated["download_size"], os.path.getsize(self.output()))
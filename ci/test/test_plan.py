@@ -0,0 +1,133 @@
+import os
+import tempfile
+from unittest import TestCase
+from unittest.mock import patch
+from io import StringIO
+
+from validate import plan
+
+
+DIFF = [
+    "A\tpackages/com_github_new/metadata.json",
+    "A\tpackages/com_github_new/icon.png",
+    "M\tpackages/com_github_changed/metadata.json",
+    "M       packages/com_github_icon/icon.png",
+    "M\tREADME.md",
+    "D\tpackages/com_github_other/icon.png",
+]
+
+
+class TestPlan(TestCase):
+    def test_make_plan(self):
+        p = plan.make_plan(DIFF)
+
+        self.assertEqual(p.new_packages, [plan.PackageChange(
+            "com_github_new", "packages/com_github_new/metadata.json")])
+        self.assertEqual(p.changed_packages, [plan.PackageChange(
+            "com_github_changed",
+            "packages/com_github_changed/metadata.json")])
+        self.assertEqual(p.icons, [
+            "packages/com_github_icon/icon.png",
+            "packages/com_github_new/icon.png"])
+        self.assertEqual(p.icon_only, ["com_github_icon"])
+        self.assertEqual(p.rebuild, [
+            "packages/com_github_changed/metadata.json",
+            "packages/com_github_icon/metadata.json",
+            "packages/com_github_new/metadata.json"])
+        self.assertEqual(p.errors, [])
+
+    def test_parse_line(self):
+        self.assertEqual(plan.parse_line("M\tpackages/a b/icon.png\n"),
+                         ("M", ["packages/a b/icon.png"]))
+        self.assertEqual(plan.parse_line("M       packages/a/icon.png"),
+                         ("M", ["packages/a/icon.png"]))
+        self.assertEqual(
+            plan.parse_line("R100\tpackages/a/icon.png\tpackages/b/icon.png"),
+            ("R", ["packages/a/icon.png", "packages/b/icon.png"]))
+        self.assertEqual(plan.parse_line(""), (None, []))
+        self.assertEqual(plan.parse_line("M"), (None, []))
+
+    def test_budget_refused(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".txt",
+                                         delete=False) as f:
+            f.write("A\tpackages/com_github_new/icon.png\n")
+        self.addCleanup(os.remove, f.name)
+
+        with patch("sys.stdout", new=StringIO()) as out, \
+                patch("validate.schedule.run_jobs") as run_jobs, \
+                self.assertRaises(SystemExit) as e:
+            plan.main(["validate", f.name, "--max-time", "0.1"])
+
+        self.assertEqual(e.exception.code, 1)
+        run_jobs.assert_not_called()
+        self.assertIn("Budget exceeded, refusing to run: estimated time",
+                      out.getvalue())
+        self.assertIn("Validation run refused", out.getvalue())
+        self.assertNotIn("Budget warning", out.getvalue())
+
+    def test_errors(self):
+        p = plan.make_plan([
+            "A\tpackages/bad name/metadata.json",
+            "D\tpackages/com_github_gone/metadata.json",
+        ])
+
+        self.assertEqual(len(p.errors), 2)
+        self.assertEqual(p.new_packages, [])
+        self.assertEqual(p.rebuild, [])
+
+        with patch("sys.stdout", new=StringIO()):
+            self.assertFalse(plan.execute_validate(p, None))
+
+    @patch("validate.image.main")
+    @patch("validate.package.main")
+    def test_execute_validate(self, package_main, image_main):
+        p = plan.make_plan(DIFF)
+
+        with patch("sys.stdout", new=StringIO()):
+            self.assertTrue(plan.execute_validate(p, "base"))
+
+        self.assertEqual(package_main.call_args_list[0].args, ([
+            "com_github_new", "packages/com_github_new/metadata.json"],))
+        self.assertEqual(package_main.call_args_list[1].args, ([
+            "com_github_changed", "packages/com_github_changed/metadata.json",
+            "--old-rev", "base"],))
+        self.assertEqual(image_main.call_count, 2)
+
+    @patch("validate.image.main")
+    @patch("validate.package.main", side_effect=SystemExit(1))
+    def test_execute_validate_stops(self, package_main, image_main):
+        p = plan.make_plan(DIFF)
+
+        with patch("sys.stdout", new=StringIO()):
+            self.assertFalse(plan.execute_validate(p, "base"))
+
+        package_main.assert_called_once()
+        image_main.assert_not_called()
+
+    @patch("validate.repository.main")
+    @patch("validate.resources.main")
+    def test_execute_build(self, resources_main, repository_main):
+        p = plan.make_plan(DIFF)
+
+        with patch("sys.stdout", new=StringIO()):
+            self.assertTrue(plan.execute_build(p, None, ["--binary", "x"]))
+
+        resources_main.assert_called_once_with(p.rebuild)
+        repository_main.assert_called_once_with(p.rebuild + ["--binary", "x"])
+
+    @patch("validate.resources.main")
+    def test_execute_build_forwards_options(self, _):
+        p = plan.make_plan(DIFF)
+
+        # stop the build right after its arguments are parsed
+        with patch("sys.stdout", new=StringIO()), \
+                patch("validate.util.metrics.configure",
+                      side_effect=SystemExit) as configure, \
+                self.assertRaises(SystemExit):
+            plan.execute_build(
+                p, None, ["--latest", "--kicad-versions", "7.0", "8.0"])
+
+        args = configure.call_args[0][0]
+        self.assertEqual(args.metadata, p.rebuild)
+        self.assertEqual(args.kicad_versions, ["7.0", "8.0"])
+        self.assertTrue(args.latest)
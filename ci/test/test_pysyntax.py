@@ -0,0 +1,106 @@
+import os
+import shutil
+import tempfile
+import zipfile
+from unittest import TestCase
+from unittest.mock import patch
+
+from validate import pysyntax, resultcache
+
+
+class TestPySyntax(TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.mkdtemp()
+        self.cache = resultcache.ResultCache(
+            os.path.join(self.tmp, "results.sqlite"))
+        pysyntax._KNOWN.clear()
+
+    def tearDown(self) -> None:
+        self.cache.close()
+        shutil.rmtree(self.tmp)
+        pysyntax._KNOWN.clear()
+
+    def archive(self, name, files):
+        path = os.path.join(self.tmp, name)
+        with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as z:
+            for member, source in files.items():
+                z.writestr(member, source)
+        return path
+
+    def check(self, path, jobs=1):
+        with zipfile.ZipFile(path) as z, \
+                patch("validate.pysyntax.parse_member",
+                      wraps=pysyntax.parse_member) as parse_member:
+            results = pysyntax.check_members(
+                z, z.infolist(), self.cache, jobs)
+        return results, sorted(c[0][1] for c in parse_member.call_args_list)
+
+    def test_check_source(self):
+        self.assertIsNone(pysyntax.check_source(b"import os\n", "a.py"))
+        self.assertEqual(
+            pysyntax.check_source(b"x = 1\ndef f(:\n    pass\n", "a.py"),
+            "line 2: invalid syntax")
+        self.assertIsNotNone(pysyntax.check_source(b"x = '\x00'", "a.py"))
+        # encoding declarations are honoured
+        self.assertIsNone(pysyntax.check_source(
+            "# -*- coding: latin-1 -*-\nx = 'é'\n".encode("latin-1"),
+            "a.py"))
+
+    def test_python_version(self):
+        walrus = b"if (n := 1):\n    pass\n"
+        self.assertIsNotNone(pysyntax.check_source(walrus, "a.py", (3, 7)))
+        self.assertIsNone(pysyntax.check_source(walrus, "a.py", (3, 8)))
+        # newer than any python KiCad 6 runs plugins with
+        self.assertEqual(
+            pysyntax.check_source(b"match x:\n    case 1:\n        pass\n",
+                                  "a.py"),
+            "line 3: Pattern matching is only supported in Python 3.10 and "
+            "greater")
+
+        self.assertEqual(pysyntax.python_version("6.0"), (3, 8))
+        self.assertEqual(pysyntax.python_version("9.0.1"), (3, 8))
+        self.assertEqual(pysyntax.python_version("5.1"), pysyntax.MIN_PYTHON)
+        with patch.dict(pysyntax.PYTHON_VERSIONS, {(9, 0): (3, 11)}):
+            self.assertEqual(pysyntax.python_version("9.0"), (3, 11))
+            self.assertEqual(pysyntax.python_version("8.0"), (3, 8))
+
+        # results for other grammars are kept apart
+        self.assertNotEqual(pysyntax.source_key(1, 2, (3, 8)),
+                            pysyntax.source_key(1, 2, (3, 10)))
+
+    def test_known_is_bounded(self):
+        files = {f"plugins/m{i}.py": f"X = {i}\n" for i in range(5)}
+        with patch("validate.pysyntax.MAX_KNOWN", new=3):
+            self.check(self.archive("1.zip", files))
+        self.assertEqual(len(pysyntax._KNOWN), 3)
+
+    def test_only_changed_sources_are_parsed(self):
+        files = {f"plugins/m{i}.py": f"X = {i}\n" for i in range(5)}
+        results, parsed = self.check(self.archive("1.zip", files))
+        self.assertEqual(results, [(name, None) for name in files])
+        self.assertEqual(parsed, sorted(files))
+
+        files["plugins/m1.py"] = "X = (\n"
+        files["plugins/new.py"] = "Y = 2\n"
+        path = self.archive("2.zip", files)
+        results, parsed = self.check(path)
+        self.assertEqual(parsed, ["plugins/m1.py", "plugins/new.py"])
+        self.assertEqual(dict(results)["plugins/m1.py"],
+                         "line 1: '(' was never closed")
+
+        # the sqlite cache answers for a fresh process
+        pysyntax._KNOWN.clear()
+        self.assertEqual(self.check(path), (results, []))
+
+    def test_parallel(self):
+        files = {f"plugins/m{i}.py": f"X = {i}\n" for i in range(8)}
+        files["plugins/m3.py"] = "def f(\n"
+        path = self.archive("1.zip", files)
+
+        with patch("validate.util.members.PARALLEL_MIN_MEMBERS", new=0), \
+                zipfile.ZipFile(path) as z:
+            results = pysyntax.check_members(z, z.infolist(), None, 2)
+
+        self.assertEqual([name for name, _ in results], list(files))
+        self.assertEqual([name for name, problem in results if problem],
+                         ["plugins/m3.py"])
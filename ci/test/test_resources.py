@@ -0,0 +1,114 @@
+import io
+import json
+import os
+import shutil
+import tempfile
+import zipfile
+from unittest import TestCase
+from unittest.mock import patch
+from io import StringIO
+
+from validate import resources
+
+
+ICON = "test/data/package/resources/icon.png"
+ICON_SHA = "e4d24fdf36babc82360cb6fc05c88cfba73acca6ced04ab7a6df37399b943c84"
+
+
+class TestResources(TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.mkdtemp()
+        self.packages = os.path.join(self.tmp, "packages")
+
+        for package in ["b.package", "a.package", "c.package"]:
+            os.makedirs(os.path.join(self.packages, package))
+            with io.open(os.path.join(
+                    self.packages, package, "metadata.json"), "w") as f:
+                f.write("{}")
+
+        for package in ["a.package", "b.package"]:
+            shutil.copy(ICON, os.path.join(self.packages, package))
+
+        self.files = [
+            os.path.join(self.packages, p, "metadata.json")
+            for p in ["b.package", "a.package", "c.package"]]
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.tmp)
+
+    def output(self, name="resources.zip"):
+        return os.path.join(self.tmp, name)
+
+    def test_icon_entries(self):
+        entries = resources.icon_entries(
+            self.files + [os.path.join(self.packages, "a.package/icon.png")])
+
+        self.assertEqual(
+            list(entries.keys()), ["a.package/icon.png", "b.package/icon.png"])
+
+    def test_build(self):
+        icons = resources.icon_entries(self.files)
+        manifest, reused = resources.build_resources(icons, self.output())
+
+        self.assertEqual(reused, 0)
+        self.assertEqual(manifest, {
+            "a.package/icon.png": ICON_SHA,
+            "b.package/icon.png": ICON_SHA})
+
+        with zipfile.ZipFile(self.output(), "r") as z:
+            self.assertIsNone(z.testzip())
+            self.assertEqual(
+                z.namelist(), ["a.package/icon.png", "b.package/icon.png"])
+            with io.open(ICON, "rb") as f:
+                self.assertEqual(z.read("a.package/icon.png"), f.read())
+
+        with io.open(self.output("resources.json"), encoding="utf-8") as f:
+            self.assertEqual(json.load(f), manifest)
+
+    def test_build_deterministic(self):
+        icons = resources.icon_entries(self.files)
+        resources.build_resources(icons, self.output("1.zip"))
+        resources.build_resources(icons, self.output("2.zip"))
+
+        with io.open(self.output("1.zip"), "rb") as f1, \
+                io.open(self.output("2.zip"), "rb") as f2:
+            self.assertEqual(f1.read(), f2.read())
+
+    def test_build_reuses_previous(self):
+        icons = resources.icon_entries(self.files)
+        resources.build_resources(icons, self.output("previous.zip"))
+
+        with patch("validate.resources.compress") as compress:
+            manifest, reused = resources.build_resources(
+                icons, self.output(), self.output("previous.zip"))
+            compress.assert_not_called()
+
+        self.assertEqual(reused, 2)
+
+        with io.open(self.output("previous.zip"), "rb") as f1, \
+                io.open(self.output(), "rb") as f2:
+            self.assertEqual(f1.read(), f2.read())
+
+    def test_build_reuses_previous_without_manifest(self):
+        icons = resources.icon_entries(self.files)
+        resources.build_resources(icons, self.output("previous.zip"))
+        os.remove(self.output("previous.json"))
+
+        with open(os.path.join(self.packages, "b.package/icon.png"),
+                  "ab") as f:
+            f.write(b"changed")
+
+        _, reused = resources.build_resources(
+            icons, self.output(), self.output("previous.zip"))
+
+        self.assertEqual(reused, 1)
+        with zipfile.ZipFile(self.output(), "r") as z:
+            self.assertIsNone(z.testzip())
+
+    def test_main_no_icons(self):
+        with patch('sys.stdout', new=StringIO()) as fake_out:
+            resources.main(
+                [self.files[2], "--output", self.output()])
+            self.assertIn("No icons to pack", fake_out.getvalue())
+
+        self.assertFalse(os.path.exists(self.output()))
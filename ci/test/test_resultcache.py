@@ -0,0 +1,156 @@
+from argparse import Namespace
+import io
+import json
+import os
+import shutil
+import tempfile
+import zipfile
+from unittest import TestCase
+from unittest.mock import patch
+from io import StringIO
+
+from munch import munchify
+
+from validate import manifest, package, resultcache
+from validate.util.verify import get_failures, reset_failures
+
+
+class TestResultCache(TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, "results.sqlite")
+
+        with io.open("test/data/metadata_valid.json", encoding="utf-8") as f:
+            self.metadata = munchify(json.load(f))
+
+        self.args = Namespace(
+            max_icon_width=64, max_icon_height=64, max_icon_size=20480)
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.tmp)
+
+    def test_store(self):
+        cache = resultcache.ResultCache(self.path)
+        self.assertIsNone(cache.get("a"))
+        cache.put("a", False, ["bad"])
+        cache.close()
+
+        cache = resultcache.ResultCache(self.path)
+        self.assertEqual(cache.get("a"), (False, ["bad"]))
+        cache.close()
+
+    def test_key(self):
+        args = ["sha", {"schema": 1}, {"rules": 1}, "plugin", (64, 64, 1),
+                {"version": "1.0"}]
+        key = resultcache.result_key(*args)
+
+        self.assertEqual(resultcache.result_key(*args), key)
+        for i, other in enumerate([
+                "sha2", {"schema": 2}, {"rules": 2}, "library", (32, 32, 1),
+                {"version": "1.1"}]):
+            changed = list(args)
+            changed[i] = other
+            self.assertNotEqual(resultcache.result_key(*changed), key)
+
+    def download(self, url, path):
+        with zipfile.ZipFile(path, "w") as z:
+            for name in ["metadata.json", "extra.txt"]:
+                z.write("test/data/package/" + name, name)
+        return True
+
+    @patch("validate.package.validate_packaged_metadata")
+    @patch("validate.package.getsha256")
+    def test_validate_version(self, getsha256, _):
+        version = self.metadata.versions[0]
+        getsha256.return_value = version.download_sha256
+        cache = resultcache.ResultCache(self.path)
+        failures = []
+
+        for _ in range(2):
+            reset_failures()
+            with patch("validate.package.RESULT_CACHE", new=cache), \
+                    patch("validate.package.SCHEMA", new={}), \
+                    patch("validate.package.download_file",
+                          side_effect=self.download) as download_file, \
+                    patch("sys.stdout", new=StringIO()) as out:
+                package.validate_version(self.args, self.metadata, version)
+            failures.append(get_failures())
+
+        # second run is answered from the cache with the same findings
+        download_file.assert_not_called()
+        self.assertIn("validated before, failed", out.getvalue())
+        self.assertIn("extra file \"extra.txt\"", out.getvalue())
+        self.assertEqual(failures[0], failures[1])
+        self.assertGreater(failures[0], 0)
+        cache.close()
+
+    @patch("validate.package.validate_packaged_metadata")
+    @patch("validate.package.getsha256")
+    def test_manifest_on_hit(self, getsha256, _):
+        version = self.metadata.versions[0]
+        sha = version.download_sha256
+        getsha256.return_value = sha
+        cache = resultcache.ResultCache(self.path)
+        manifests = os.path.join(self.tmp, "manifests")
+
+        with patch("validate.package.RESULT_CACHE", new=cache), \
+                patch("validate.package.MANIFESTS", new=manifests), \
+                patch("validate.package.SCHEMA", new={}), \
+                patch("validate.package.download_file",
+                      side_effect=self.download), \
+                patch("sys.stdout", new=StringIO()):
+            package.validate_version(self.args, self.metadata, version)
+        reset_failures()
+        os.remove(manifest.manifest_path(manifests, sha))
+
+        # the cached result must not leave the manifest missing
+        with patch("validate.package.RESULT_CACHE", new=cache), \
+                patch("validate.package.MANIFESTS", new=manifests), \
+                patch("validate.package.SCHEMA", new={}), \
+                patch("validate.package.download_file") as download_file, \
+                patch("sys.stdout", new=StringIO()) as out:
+            package.validate_version(self.args, self.metadata, version)
+        reset_failures()
+
+        download_file.assert_not_called()
+        self.assertIn("validated before", out.getvalue())
+        self.assertEqual(
+            [e[0] for e in manifest.load_manifest(manifests, sha)["entries"]],
+            ["metadata.json", "extra.txt"])
+        cache.close()
+
+    @patch("validate.package.validate_packaged_metadata")
+    @patch("validate.package.getsha256")
+    def test_manifest_from_cached_archive(self, getsha256, _):
+        version = self.metadata.versions[0]
+        sha = version.download_sha256
+        getsha256.return_value = sha
+        cache = resultcache.ResultCache(self.path)
+        archives = os.path.join(self.tmp, "archives")
+        manifests = os.path.join(self.tmp, "manifests")
+
+        # a result cached without manifests being kept
+        with patch("validate.package.RESULT_CACHE", new=cache), \
+                patch("validate.package.ARCHIVE_CACHE", new=archives), \
+                patch("validate.package.SCHEMA", new={}), \
+                patch("validate.package.download_file",
+                      side_effect=self.download), \
+                patch("sys.stdout", new=StringIO()):
+            package.validate_version(self.args, self.metadata, version)
+        reset_failures()
+        self.assertIsNone(cache.get_manifest(sha))
+
+        with patch("validate.package.RESULT_CACHE", new=cache), \
+                patch("validate.package.ARCHIVE_CACHE", new=archives), \
+                patch("validate.package.MANIFESTS", new=manifests), \
+                patch("validate.package.SCHEMA", new={}), \
+                patch("validate.package.download_file") as download_file, \
+                patch("sys.stdout", new=StringIO()):
+            package.validate_version(self.args, self.metadata, version)
+        reset_failures()
+
+        download_file.assert_not_called()
+        self.assertEqual(manifest.load_manifest(manifests, sha),
+                         cache.get_manifest(sha))
+        self.assertIsNotNone(cache.get_manifest(sha))
+        cache.close()
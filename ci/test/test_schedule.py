@@ -0,0 +1,85 @@
+from unittest import TestCase
+from unittest.mock import patch
+from io import StringIO
+
+from validate import schedule
+from validate.schedule import Budget, Job
+from validate.shard import ITEM_COST, WorkItem
+
+MIB = 1024 * 1024
+ICON = "test/data/package/resources/icon.png"
+
+
+class TestSchedule(TestCase):
+    def test_make_jobs(self):
+        items = [
+            WorkItem("package", "small", "s.json", "1", cost=ITEM_COST + 10),
+            WorkItem("package", "big", "b.json", "1", cost=ITEM_COST + MIB,
+                     install_size=2 * MIB),
+            WorkItem("package", "big", "b.json", "2", cost=ITEM_COST + MIB),
+            WorkItem("icon", "small", "icon.png", cost=ITEM_COST),
+        ]
+
+        jobs = schedule.make_jobs(items, None)
+
+        self.assertEqual([(j.job, j.package) for j in jobs], [
+            ("package", "big"), ("package", "small"), ("image", "small")])
+        self.assertEqual(jobs[0].download_size, 2 * MIB)
+        self.assertEqual(jobs[0].install_size, 2 * MIB)
+        self.assertEqual(jobs[0].args, [
+            "big", "b.json", "--only-version", "1", "--only-version", "2"])
+
+    def test_estimate(self):
+        jobs = [Job("package", str(i), [], size * schedule.DOWNLOAD_RATE)
+                for i, size in enumerate([4, 3, 3, 2])]
+
+        e = schedule.estimate(jobs, 1)
+        self.assertEqual(e.download_size, 12 * schedule.DOWNLOAD_RATE)
+        self.assertAlmostEqual(e.seconds, 12 + 4 * schedule.JOB_OVERHEAD)
+
+        e = schedule.estimate(jobs, 2)
+        self.assertAlmostEqual(e.seconds, 6 + 2 * schedule.JOB_OVERHEAD)
+
+    def test_budget(self):
+        jobs = [Job("package", "a", [], 10 * MIB, 20 * MIB)]
+
+        with patch("sys.stdout", new=StringIO()) as out:
+            self.assertTrue(schedule.check_budget(jobs, 1, None))
+            self.assertIn("download 10.0 MiB", out.getvalue())
+
+            self.assertTrue(schedule.check_budget(
+                jobs, 1, Budget(download_size=10 * MIB)))
+            self.assertFalse(schedule.check_budget(
+                jobs, 1, Budget(install_size=10 * MIB)))
+            self.assertFalse(schedule.check_budget(jobs, 1, Budget(seconds=1)))
+            self.assertNotIn("Budget warning", out.getvalue())
+            self.assertIn("Budget exceeded, refusing to run: estimated time",
+                          out.getvalue())
+
+            self.assertTrue(schedule.check_budget(
+                jobs, 1, Budget(seconds=1, action="warn")))
+            self.assertIn("Budget warning", out.getvalue())
+
+    @patch("validate.shard.run_job")
+    def test_run_jobs_fail_fast(self, run_job):
+        run_job.side_effect = lambda job, package, args: {
+            "package": package, "passed": package != "b"}
+        jobs = [Job("package", p, []) for p in "abc"]
+
+        self.assertEqual(len(schedule.run_jobs(jobs)), 3)
+        self.assertEqual(
+            [r["package"] for r in schedule.run_jobs(jobs, fail_fast=True)],
+            ["a", "b"])
+
+    def test_run_jobs_parallel(self):
+        jobs = [Job("image", str(i), [ICON]) for i in range(4)]
+        jobs.append(Job("image", "missing", ["test/data/missing.png"]))
+
+        with patch("sys.stdout", new=StringIO()) as out:
+            results = schedule.run_jobs(jobs, 2)
+
+        self.assertEqual(sorted(r["package"] for r in results),
+                         ["0", "1", "2", "3", "missing"])
+        self.assertEqual([r["package"] for r in results if not r["passed"]],
+                         ["missing"])
+        self.assertEqual(out.getvalue().count("Validation passed"), 4)
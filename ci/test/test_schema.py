@@ -0,0 +1,179 @@
+import io
+import json
+import os
+import shutil
+import tempfile
+import time
+from unittest import TestCase
+from unittest.mock import MagicMock, patch
+from io import StringIO
+
+from jsonschema.exceptions import SchemaError, ValidationError
+from requests.exceptions import ConnectionError
+
+from validate import schema
+
+
+URL = "https://example.org/schema.json"
+
+
+def response(status=200, body=None, headers=None):
+    r = MagicMock()
+    r.status_code = status
+    r.headers = headers or {}
+    r.json.return_value = body
+    if status >= 400:
+        r.raise_for_status.side_effect = ConnectionError("http error")
+    return r
+
+
+class TestSchemaStore(TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.mkdtemp()
+        self.bundled = os.path.join(self.tmp, "bundled.json")
+        with io.open(self.bundled, "w", encoding="utf-8") as f:
+            json.dump({"$id": "bundled", "type": "object"}, f)
+        self.schema = {"$id": "https://example.org/v1", "type": "object"}
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.tmp)
+
+    def store(self, **kwargs):
+        return schema.SchemaStore(
+            os.path.join(self.tmp, "cache"), bundled=self.bundled, **kwargs)
+
+    @patch("requests.get")
+    def test_download_and_cache(self, get):
+        get.return_value = response(
+            body=self.schema, headers={"ETag": "\"abc\""})
+
+        self.assertEqual(self.store().get(URL), self.schema)
+        self.assertEqual(self.store().get(URL), self.schema)
+
+        get.assert_called_once_with(URL, headers={}, timeout=schema.TIMEOUT)
+
+    @patch("requests.get")
+    def test_stored_by_id(self, get):
+        get.return_value = response(body=self.schema)
+        store = self.store()
+        store.get(URL)
+
+        self.assertTrue(os.path.exists(
+            store.schema_path("https://example.org/v1")))
+
+    @patch("requests.get")
+    def test_revalidate_not_modified(self, get):
+        get.return_value = response(
+            body=self.schema,
+            headers={"ETag": "\"abc\"", "Last-Modified": "yesterday"})
+        self.store(ttl=0).get(URL)
+
+        get.reset_mock()
+        get.return_value = response(status=304)
+        store = self.store(ttl=0)
+
+        self.assertEqual(store.get(URL), self.schema)
+        self.assertEqual(store.source, "cache")
+        get.assert_called_once_with(
+            URL,
+            headers={"If-None-Match": "\"abc\"",
+                     "If-Modified-Since": "yesterday"},
+            timeout=schema.TIMEOUT)
+
+    @patch("requests.get")
+    def test_revalidate_modified(self, get):
+        get.return_value = response(body=self.schema)
+        self.store(ttl=0).get(URL)
+
+        updated = dict(self.schema, title="new")
+        get.return_value = response(body=updated)
+
+        self.assertEqual(self.store(ttl=0).get(URL), updated)
+        self.assertEqual(self.store().get(URL), updated)
+
+    @patch("requests.get")
+    def test_network_failure_uses_cache(self, get):
+        get.return_value = response(body=self.schema)
+        self.store(ttl=0).get(URL)
+
+        get.side_effect = ConnectionError("offline")
+        with patch('sys.stdout', new=StringIO()) as fake_out:
+            self.assertEqual(self.store(ttl=0).get(URL), self.schema)
+            self.assertIn("using cached copy", fake_out.getvalue())
+
+    @patch("requests.get")
+    def test_network_failure_uses_bundled(self, get):
+        get.side_effect = ConnectionError("offline")
+
+        with patch('sys.stdout', new=StringIO()):
+            store = self.store()
+            self.assertEqual(store.get(URL)["$id"], "bundled")
+            self.assertEqual(store.source, "bundled")
+
+    @patch("requests.get")
+    def test_offline(self, get):
+        with patch('sys.stdout', new=StringIO()):
+            self.assertEqual(
+                self.store(offline=True).get(URL)["$id"], "bundled")
+        get.assert_not_called()
+
+        get.return_value = response(body=self.schema)
+        self.store(ttl=0).get(URL)
+        get.reset_mock()
+
+        self.assertEqual(self.store(offline=True).get(URL), self.schema)
+        get.assert_not_called()
+
+    @patch("requests.get")
+    def test_main(self, get):
+        get.return_value = response(body=self.schema)
+        output = os.path.join(self.tmp, "schema.json")
+
+        with patch('sys.stdout', new=StringIO()):
+            schema.main(["--url", URL, "--output", output,
+                         "--cache-dir", os.path.join(self.tmp, "cache")])
+
+        with io.open(output, encoding="utf-8") as f:
+            self.assertEqual(json.load(f), self.schema)
+
+
+class TestSchemaValidator(TestCase):
+    def test_compiled_once(self):
+        s = {"type": "object", "required": ["a"]}
+
+        validator = schema.get_validator(s)
+        schema.validate({"a": 1}, s)
+
+        self.assertIs(schema.get_validator(s), validator)
+        # equal schema loaded again reuses the compiled validator
+        self.assertIs(schema.get_validator(dict(s)), validator)
+        self.assertIsNot(
+            schema.get_validator({"type": "object"}), validator)
+
+    def test_keyed_cache(self):
+        s = schema.with_key({"$id": "a", "type": "object"})
+        self.assertIs(schema.with_key(s), s)
+
+        validator = schema.get_validator(s)
+        with patch("validate.schema.schema_key",
+                   wraps=schema.schema_key) as schema_key:
+            self.assertIs(schema.get_validator(s), validator)
+            self.assertIs(schema.get_validator(
+                schema.with_key({"$id": "a", "type": "object"})), validator)
+        # only with_key() serialized the schema
+        self.assertEqual(schema_key.call_count, 1)
+
+        # the cache is bounded, the oldest validator goes first
+        with patch("validate.schema.MAX_COMPILED", new=2):
+            for i in range(3):
+                schema.get_validator({"type": "object", "minProperties": i})
+            self.assertEqual(len(schema._COMPILED), 2)
+        self.assertIsNot(schema.get_validator(s), validator)
+
+    def test_validation_error(self):
+        self.assertRaises(
+            ValidationError, schema.validate, {}, {"required": ["a"]})
+
+    def test_schema_error(self):
+        self.assertRaises(
+            SchemaError, schema.validate, {}, {"type": "abracadabra"})
@@ -0,0 +1,81 @@
+import io
+import json
+from unittest import TestCase
+
+from validate import search
+
+
+class TestSearch(TestCase):
+    def setUp(self) -> None:
+        with io.open("test/data/metadata_valid.json", encoding="utf-8") as f:
+            metadata = json.load(f)
+
+        self.packages = [
+            metadata,
+            {
+                "identifier": "com.example.router",
+                "name": "Interactive Router",
+                "description": "Routing helper",
+                "description_full": "Route, route and route again.",
+                "tags": ["routing", "PCB"],
+            },
+            {
+                "identifier": "com.example.rules",
+                "name": "Rule Helper",
+                "description": "Design rules",
+                "tags": ["pcb", "Rules"],
+            },
+        ]
+        self.index = search.build_index(self.packages)
+
+    def test_normalize(self):
+        self.assertEqual(
+            search.normalize("KiCad's Router, v2.0!"),
+            ["kicad", "s", "router", "v2", "0"])
+
+    def test_build_index(self):
+        self.assertEqual(self.index["packages"], [
+            "testpackage", "com.example.router", "com.example.rules"])
+        self.assertEqual(self.index["terms"]["route"], [[1, 3]])
+        self.assertEqual(self.index["terms"]["helper"], [[1, 1], [2, 1]])
+        self.assertEqual(self.index["tags"], {
+            "pcb": [1, 2], "routing": [1], "rules": [2], "tag1": [0]})
+        self.assertEqual(
+            list(self.index["terms"]), sorted(self.index["terms"]))
+
+    def test_index_is_json(self):
+        loaded = json.loads(json.dumps(self.index))
+        index = search.SearchIndex(loaded)
+        self.assertEqual(index.tag("PCB"), index.tag("pcb"))
+
+    def test_prefix(self):
+        index = search.SearchIndex(self.index)
+
+        self.assertEqual(index.prefix("rout"), ["com.example.router"])
+        self.assertEqual(
+            index.prefix("help"), ["com.example.router", "com.example.rules"])
+        self.assertEqual(index.prefix("rule help"), ["com.example.rules"])
+        self.assertEqual(index.prefix("test package"), ["testpackage"])
+        self.assertEqual(index.prefix("zzz"), [])
+        self.assertEqual(index.prefix("help zzz"), [])
+        self.assertEqual(index.prefix(""), [])
+
+    def test_prefix_ranking(self):
+        index = search.SearchIndex(self.index)
+
+        # router package mentions "rout*" far more often than rules does
+        self.assertEqual(
+            index.prefix("r"), ["com.example.router", "com.example.rules"])
+
+    def test_tag(self):
+        index = search.SearchIndex(self.index)
+
+        self.assertEqual(
+            index.tag("pcb"), ["com.example.router", "com.example.rules"])
+        self.assertEqual(index.tag(" Rules "), ["com.example.rules"])
+        self.assertEqual(index.tag("nope"), [])
+        self.assertEqual(index.tag_prefix("r"), ["routing", "rules"])
+
+    def test_version(self):
+        self.index["version"] = 0
+        self.assertRaises(ValueError, search.SearchIndex, self.index)
@@ -0,0 +1,134 @@
+import io
+import os
+import shutil
+import tempfile
+import zipfile
+from unittest import TestCase
+from unittest.mock import patch
+
+from validate import sexpr
+from validate.sexpr import SexprChecker, SexprError
+from validate.util import members
+
+
+FOOTPRINT = b"""(footprint "R_0603" (version 20221018) (generator pcbnew)
+  (layer "F.Cu")
+  (descr "Resistor (\\"0603\\") ((unbalanced in a string")
+  (pad "1" smd roundrect (at -0.8 0) (size 0.8 0.95) (layers "F.Cu"))
+)
+"""
+
+SYMBOLS = b"""(kicad_symbol_lib (version 20220914) (generator eeschema)
+  (symbol "R" (property "Reference" "R" (at 0 0 0)))
+)
+"""
+
+
+def check(data, roots=("footprint", "module"), chunk_size=7):
+    sexpr.check_stream(io.BytesIO(data), roots, chunk_size)
+
+
+class TestSexpr(TestCase):
+    def test_valid(self):
+        for chunk_size in [1, 2, 7, 65536]:
+            check(FOOTPRINT, chunk_size=chunk_size)
+            check(SYMBOLS, ("kicad_symbol_lib",), chunk_size)
+        check(b"(module x)", chunk_size=1)
+        check(b"  \n(footprint)\n\n")
+
+    def assertProblem(self, data, message, roots=("footprint", "module")):
+        for chunk_size in [1, 3, 65536]:
+            with self.assertRaises(SexprError) as e:
+                check(data, roots, chunk_size)
+            self.assertIn(message, str(e.exception))
+
+    def test_truncated(self):
+        self.assertProblem(FOOTPRINT[:-3], "1 list(s) not closed")
+        self.assertProblem(
+            FOOTPRINT[:FOOTPRINT.index(b"(layer") + 6], "2 list(s) not closed")
+        self.assertProblem(b"(footprint", "1 list(s) not closed")
+        self.assertProblem(b"(footprint \"abc", "unterminated string")
+        self.assertProblem(b"(footprint \"a\\\")", "unterminated string")
+
+    def test_structure(self):
+        self.assertProblem(b"", "file is empty")
+        self.assertProblem(b"  \n ", "file is empty")
+        self.assertProblem(b"footprint", "does not start with")
+        self.assertProblem(b"()", "root list has no token")
+        self.assertProblem(b"(footprint x))", "unexpected data after")
+        self.assertProblem(b"(footprint x) (y)", "at byte 14")
+        self.assertProblem(b"(footprint x)\"\"", "unexpected data after")
+
+    def test_root_token(self):
+        self.assertProblem(
+            SYMBOLS, "unexpected root token \"kicad_symbol_lib\"")
+        self.assertProblem(
+            FOOTPRINT, "expected kicad_symbol_lib", ("kicad_symbol_lib",))
+
+    def test_roots_for(self):
+        self.assertEqual(sexpr.roots_for("symbols/a.kicad_sym"),
+                         ("kicad_symbol_lib",))
+        self.assertEqual(
+            sexpr.roots_for("footprints/a.pretty/b.kicad_mod"),
+            ("footprint", "module"))
+        self.assertIsNone(sexpr.roots_for("3dmodels/a.3dshapes/b.step"))
+
+    def test_checker_feed(self):
+        checker = SexprChecker(("footprint",))
+        for i in range(0, len(FOOTPRINT), 5):
+            checker.feed(FOOTPRINT[i:i + 5])
+        checker.close()
+        self.assertEqual(checker.root, "footprint")
+
+
+class TestMembers(TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, "library.zip")
+        self.names = []
+        with zipfile.ZipFile(self.path, "w", zipfile.ZIP_DEFLATED) as z:
+            for i in range(20):
+                name = f"footprints/lib.pretty/fp{i}.kicad_mod"
+                data = FOOTPRINT if i != 13 else FOOTPRINT[:-3]
+                z.writestr(name, data)
+                self.names.append(name)
+            z.writestr("symbols/lib.kicad_sym", SYMBOLS)
+            self.names.append("symbols/lib.kicad_sym")
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.tmp)
+
+    def test_batches(self):
+        with zipfile.ZipFile(self.path) as z:
+            infos = z.infolist()
+        parts = members.batches(infos, 4)
+        self.assertEqual(len(parts), 4)
+        self.assertEqual(sorted(sum(parts, [])), sorted(self.names))
+        self.assertEqual(members.batches(infos[:2], 4),
+                         [[infos[0].filename], [infos[1].filename]])
+
+    def test_check_members(self):
+        expected = [(name, None) for name in self.names]
+        expected[13] = (self.names[13],
+                        "unexpected end of file, 1 list(s) not closed")
+
+        for jobs, min_members in [(1, 0), (2, 0), (2, 256)]:
+            with self.subTest(jobs=jobs, min_members=min_members), \
+                    patch("validate.util.members.PARALLEL_MIN_MEMBERS",
+                          new=min_members), \
+                    zipfile.ZipFile(self.path) as z:
+                self.assertEqual(members.check_members(
+                    z, z.infolist(), sexpr.check_member, jobs), expected)
+
+    def test_check_member_bad_data(self):
+        # corrupt the deflate stream of the first member
+        with zipfile.ZipFile(self.path) as z:
+            info = z.infolist()[0]
+            offset = info.header_offset + 30 + len(info.filename) + 2
+        with open(self.path, "r+b") as f:
+            f.seek(offset)
+            f.write(b"\xff" * 16)
+
+        with zipfile.ZipFile(self.path) as z:
+            self.assertIn("could not be read",
+                          sexpr.check_member(z, self.names[0]))
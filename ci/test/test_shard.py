@@ -0,0 +1,128 @@
+import io
+import json
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+from unittest.mock import patch
+from io import StringIO
+
+from validate import shard
+from validate.plan import make_plan
+from validate.shard import WorkItem
+
+
+class TestShard(TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.mkdtemp()
+
+        with io.open("test/data/metadata_valid.json", encoding="utf-8") as f:
+            self.metadata = json.load(f)
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.tmp)
+
+    def write(self, metadata):
+        path = os.path.join(self.tmp, "metadata.json")
+        with io.open(path, "w", encoding="utf-8") as f:
+            json.dump(metadata, f)
+        return path
+
+    def test_package_items(self):
+        path = self.write(self.metadata)
+        items = shard.package_items("pkg", path)
+
+        self.assertEqual([i.version for i in items],
+                         [v["version"] for v in self.metadata["versions"]])
+        self.assertEqual(
+            items[0].cost,
+            shard.ITEM_COST + self.metadata["versions"][0]["download_size"])
+
+        with patch("validate.shard.get_object_reader") as reader:
+            reader.return_value.read.return_value = json.dumps(
+                self.metadata).encode()
+            items = shard.package_items("pkg", path, "base")
+
+        self.assertEqual(items, [WorkItem("package", "pkg", path,
+                                          changed=True)])
+
+        with io.open(path, "w") as f:
+            f.write("{ nope")
+        self.assertEqual(shard.package_items("pkg", path),
+                         [WorkItem("package", "pkg", path)])
+
+    def test_partition(self):
+        items = [WorkItem("package", f"p{i}", "", "1", cost=c)
+                 for i, c in enumerate([10, 7, 6, 5, 4, 3, 1])]
+
+        shards = shard.partition(items, 3)
+
+        self.assertEqual([sum(i.cost for i in s) for s in shards],
+                         [13, 12, 11])
+        self.assertEqual(
+            sorted(i.key() for s in shards for i in s),
+            sorted(i.key() for i in items))
+        # same result whatever the input order
+        self.assertEqual(shard.partition(list(reversed(items)), 3), shards)
+
+        self.assertEqual(shard.partition(items[:1], 3)[1:], [[], []])
+
+    def test_jobs(self):
+        items = [
+            WorkItem("icon", "a", "packages/a/icon.png"),
+            WorkItem("package", "a", "packages/a/metadata.json", "1", True),
+            WorkItem("package", "a", "packages/a/metadata.json", "2", True),
+            WorkItem("package", "b", "packages/b/metadata.json"),
+        ]
+
+        self.assertEqual(shard.jobs(items, "base"), [
+            ("image", "a", ["packages/a/icon.png"]),
+            ("package", "a", ["a", "packages/a/metadata.json",
+                              "--old-rev", "base",
+                              "--only-version", "1", "--only-version", "2"]),
+            ("package", "b", ["b", "packages/b/metadata.json"]),
+        ])
+
+    @patch("validate.shard.run_job")
+    def test_run_shard(self, run_job):
+        run_job.side_effect = lambda job, package, args: {
+            "job": job, "package": package, "passed": package != "b"}
+        plan = make_plan(["A\tpackages/a/metadata.json",
+                          "A\tpackages/b/metadata.json"])
+
+        with patch("sys.stdout", new=StringIO()):
+            reports = [shard.run_shard(plan, i, 2, None) for i in (1, 2)]
+
+        self.assertEqual(run_job.call_count, 2)
+        self.assertEqual(sum(len(r["results"]) for r in reports), 2)
+
+        merged = shard.merge_reports(reports)
+        self.assertFalse(merged["passed"])
+        self.assertEqual(merged["missing"], [])
+
+        merged = shard.merge_reports(
+            [r for r in reports if r["passed"]])
+        self.assertFalse(merged["passed"])
+        self.assertEqual(len(merged["missing"]), 1)
+
+    def test_plan_errors(self):
+        plan = make_plan(["D\tpackages/a/metadata.json"])
+
+        with patch("sys.stdout", new=StringIO()):
+            report = shard.run_shard(plan, 1, 1, None)
+
+        self.assertFalse(report["passed"])
+        self.assertEqual(report["results"], [])
+        self.assertFalse(shard.merge_reports([report])["passed"])
+        self.assertFalse(shard.merge_reports([])["passed"])
+
+    def test_run_job(self):
+        with patch("sys.stdout", new=StringIO()):
+            result = shard.run_job("image", "a", ["test/data/missing.png"])
+            self.assertFalse(result["passed"])
+            self.assertIn("FileNotFoundError", result["messages"][0])
+
+            # failures of a previous job are not carried over
+            result = shard.run_job(
+                "image", "a", ["test/data/package/resources/icon.png"])
+            self.assertTrue(result["passed"])
@@ -0,0 +1,205 @@
+import http.server
+import multiprocessing
+import threading
+import time
+from unittest import TestCase, skipUnless
+from unittest.mock import ANY, patch
+from io import StringIO
+
+from validate import schedule
+from validate.schedule import Job
+from validate.util import throttle
+from validate.util.throttle import HostLimiter, HostPolicy, ThrottledSession
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class ThrottlingHandler(http.server.BaseHTTPRequestHandler):
+    """
+    Stand-in server: /slow counts concurrent requests, /retry-after and
+    /ratelimit throttle the first request of every client run.
+    """
+
+    def log_message(self, *args):
+        pass
+
+    def reply(self, code, headers=None):
+        self.send_response(code)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"ok")
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.hits[self.path] = server.hits.get(self.path, 0) + 1
+            hits = server.hits[self.path]
+            server.times.append((self.path, time.monotonic()))
+
+        if self.path == "/slow":
+            with server.lock:
+                server.active += 1
+                server.max_active = max(server.max_active, server.active)
+            time.sleep(0.1)
+            with server.lock:
+                server.active -= 1
+            self.reply(200)
+        elif self.path == "/retry-after" and hits == 1:
+            self.reply(429, {"Retry-After": "1"})
+        elif self.path == "/ratelimit" and hits == 1:
+            self.reply(403, {"X-RateLimit-Remaining": "0",
+                             "X-RateLimit-Reset": str(int(time.time()) + 2)})
+        else:
+            self.reply(200)
+
+
+def fetch_job(job, package, args):
+    from validate import package as package_validator
+
+    response = package_validator.HTTP.get(args[0])
+    return {"package": package, "passed": response.status_code == 200}
+
+
+class TestThrottle(TestCase):
+    def start_servers(self):
+        self.servers = []
+        self.urls = []
+        self.addCleanup(self.stop_servers)
+        for _ in range(2):
+            server = http.server.ThreadingHTTPServer(
+                ("127.0.0.1", 0), ThrottlingHandler)
+            server.lock = threading.Lock()
+            server.hits = {}
+            server.times = []
+            server.active = 0
+            server.max_active = 0
+            thread = threading.Thread(target=server.serve_forever)
+            thread.start()
+            self.servers.append((server, thread))
+            self.urls.append(f"http://127.0.0.1:{server.server_address[1]}")
+
+    def stop_servers(self):
+        for server, thread in self.servers:
+            server.shutdown()
+            server.server_close()
+            thread.join()
+
+    def test_token_bucket(self):
+        clock = Clock()
+        limiter = HostLimiter({}, HostPolicy(10, rate=2.0, burst=2), clock)
+
+        limiter.acquire("a")
+        limiter.acquire("a")
+        self.assertAlmostEqual(limiter.wait_time("a"), 0.5)
+        # other hosts have their own bucket
+        self.assertEqual(limiter.wait_time("b"), 0)
+
+        clock.now = 0.5
+        self.assertEqual(limiter.wait_time("a"), 0)
+
+    def test_connection_cap(self):
+        clock = Clock()
+        limiter = HostLimiter({}, HostPolicy(1, rate=100, burst=100), clock)
+
+        limiter.acquire("a")
+        self.assertIsNone(limiter.wait_time("a"))
+        limiter.release("a")
+        self.assertEqual(limiter.wait_time("a"), 0)
+
+    def test_retry_after_header(self):
+        self.assertEqual(throttle.retry_after("120", 0), 120)
+        self.assertAlmostEqual(
+            throttle.retry_after("Thu, 01 Jan 1970 00:01:40 GMT", 40), 60)
+        self.assertIsNone(throttle.retry_after("soon", 0))
+
+    def test_host_cap(self):
+        self.start_servers()
+        limiter = HostLimiter({}, HostPolicy(2, rate=100, burst=100))
+        session = ThrottledSession(limiter)
+
+        results = throttle.fair_map(
+            lambda url: session.get(url).status_code,
+            [self.urls[0] + "/slow"] * 6, throttle.host_of, 6, limiter)
+
+        self.assertEqual(results, [200] * 6)
+        self.assertEqual(self.servers[0][0].max_active, 2)
+
+    def test_retry(self):
+        self.start_servers()
+        limiter = HostLimiter({}, HostPolicy(4, rate=100, burst=100))
+        session = ThrottledSession(limiter)
+
+        for path in ("/retry-after", "/ratelimit"):
+            start = time.monotonic()
+            response = session.get(self.urls[0] + path)
+            self.assertEqual(response.status_code, 200)
+            self.assertGreaterEqual(time.monotonic() - start, 0.4)
+            self.assertEqual(self.servers[0][0].hits[path], 2)
+
+    def test_streamed_response_holds_slot(self):
+        self.start_servers()
+        limiter = HostLimiter({}, HostPolicy(1, rate=100, burst=100))
+        session = ThrottledSession(limiter)
+        host = throttle.host_of(self.urls[0])
+
+        response = session.get(self.urls[0] + "/slow", stream=True)
+        self.assertIsNone(limiter.wait_time(host))
+        with response:
+            pass
+        self.assertEqual(limiter.wait_time(host), 0)
+
+    def test_fair_map_interleaves_hosts(self):
+        self.start_servers()
+        limiter = HostLimiter({}, HostPolicy(1, rate=100, burst=100))
+        session = ThrottledSession(limiter)
+        finished = []
+
+        # first host answers the first request after a second
+        items = ([self.urls[0] + "/retry-after"] * 2 +
+                 [self.urls[1] + "/fast"] * 3)
+
+        def fetch(url):
+            status = session.get(url).status_code
+            finished.append(url)
+            return status
+
+        results = throttle.fair_map(fetch, items, throttle.host_of, 2,
+                                    limiter)
+
+        self.assertEqual(results, [200] * 5)
+        # the slow host didn't hold up the other one
+        self.assertEqual(finished[:3], [self.urls[1] + "/fast"] * 3)
+
+    @skipUnless(multiprocessing.get_start_method() == "fork",
+                "workers need the patched job")
+    @patch("validate.shard.run_job", new=fetch_job)
+    def test_workers_share_limits(self):
+        self.start_servers()
+        server = self.servers[0][0]
+        host = throttle.host_of(self.urls[0])
+        policy = HostPolicy(2, rate=100, burst=100)
+        jobs = [Job("package", str(i), [self.urls[0] + "/slow"])
+                for i in range(8)]
+        jobs.insert(0, Job("package", "r", [self.urls[0] + "/retry-after"]))
+
+        with patch.dict(throttle.POLICIES, {host: policy}), \
+                patch("sys.stdout", new=StringIO()):
+            results = schedule.run_jobs(jobs, 4)
+
+        self.assertTrue(all(r["passed"] for r in results))
+        # 4 workers together kept to 2 connections
+        self.assertEqual(server.max_active, 2)
+        # and all of them waited out the 429, but the one request that may
+        # have been in flight with it
+        start = server.times.index(("/retry-after", ANY))
+        start = server.times[start][1]
+        early = [t for _, t in server.times if start < t < start + 0.9]
+        self.assertLessEqual(len(early), 1)
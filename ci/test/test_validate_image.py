@@ -1,10 +1,27 @@
 from argparse import Namespace
+import os
+import shutil
+import struct
+import tempfile
+import zlib
 from unittest import TestCase
 from unittest.mock import ANY, Mock, call, patch
 from validate import image
+from validate.util.verify import reset_failures
 from io import StringIO, BytesIO
 
 
+ICON = "test/data/package/resources/icon.png"
+
+
+def png_header(width, height, crc=None):
+    data = struct.pack(">IIBBBBB", width, height, 8, 6, 0, 0, 0)
+    if crc is None:
+        crc = zlib.crc32(b"IHDR" + data)
+    return (image.PNG_SIGNATURE + struct.pack(">I4s", 13, b"IHDR") + data +
+            struct.pack(">I", crc))
+
+
 @patch("validate.image.verify_exit")
 @patch("validate.image.verify")
 class TestValidateImage(TestCase):
@@ -21,7 +38,11 @@ class TestValidateImage(TestCase):
                 max_icon_width=3,
                 max_icon_height=4,
                 max_icon_size=5,
-                file="test/data/package/resources/icon.png"),
+                full_icon_decode=False,
+                jobs=ANY,
+                files=["test/data/package/resources/icon.png"],
+                limit=None,
+                metrics=None),
             "test/data/package/resources/icon.png",
             2749)
         verify_exit.assert_called_once_with(True, ANY)
@@ -38,7 +59,11 @@ class TestValidateImage(TestCase):
                 max_icon_width=3,
                 max_icon_height=4,
                 max_icon_size=5,
-                file="test/data/package/resources/icon.png"),
+                full_icon_decode=False,
+                jobs=ANY,
+                files=["test/data/package/resources/icon.png"],
+                limit=None,
+                metrics=None),
             "test/data/package/resources/icon.png",
             2749)
         verify_exit.assert_called_once_with(False, "1 error(s) detected")
@@ -64,3 +89,83 @@ class TestValidateImage(TestCase):
     def test_image_invalid(self, verify, verify_exit):
         image.verify_image(Namespace(), BytesIO(), 111)
         verify.assert_called_once_with(False, "Image could not be loaded")
+
+    def test_image_full_decode(self, verify, verify_exit):
+        args = Namespace(max_icon_width=64, max_icon_height=64,
+                         max_icon_size=20480, full_icon_decode=True)
+        image.verify_image(args, ICON, 2749)
+        verify.assert_has_calls([call(True, "Image width exceeds maximum")])
+        verify.reset_mock()
+
+        # header is fine but the image data is missing
+        with open(ICON, "rb") as f:
+            truncated = f.read(100)
+        image.verify_image(args, BytesIO(truncated), 100)
+        verify.assert_called_once_with(False, "Image could not be loaded")
+
+
+class TestPngHeader(TestCase):
+    def test_header(self):
+        self.assertEqual(image.read_png_header(ICON), (64, 64))
+        self.assertEqual(
+            image.read_png_header(BytesIO(png_header(300, 20))), (300, 20))
+
+    def test_invalid_header(self):
+        for data in [b"", b"GIF89a" + bytes(27), png_header(64, 64)[:30],
+                     png_header(64, 64, crc=1), png_header(0, 64)]:
+            self.assertIsNone(image.read_png_header(BytesIO(data)))
+
+
+class TestBatch(TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.mkdtemp()
+        for name in ["a", "b", "c"]:
+            os.makedirs(os.path.join(self.tmp, name))
+            shutil.copy(ICON, os.path.join(self.tmp, name, "icon.png"))
+        with open(os.path.join(self.tmp, "b", "icon.png"), "r+b") as f:
+            f.write(png_header(65, 64))
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.tmp)
+        reset_failures()
+
+    def test_collect_files(self):
+        files = image.collect_files([self.tmp, ICON])
+        self.assertEqual(files, [
+            os.path.join(self.tmp, name, "icon.png") for name in "abc"] +
+            [ICON])
+
+    def test_main(self):
+        for jobs in ["1", "2"]:
+            with self.subTest(jobs=jobs), \
+                    patch("sys.stdout", new=StringIO()) as out, \
+                    self.assertRaises(SystemExit):
+                image.main(["--jobs", jobs, self.tmp])
+
+            output = out.getvalue()
+            self.assertIn(os.path.join(self.tmp, "b", "icon.png") +
+                          ": Image width exceeds maximum", output)
+            self.assertIn("Checked 3 image(s)", output)
+            self.assertIn("1 error(s) detected", output)
+
+    def test_main_nothing_found(self):
+        empty = os.path.join(self.tmp, "empty")
+        os.makedirs(empty)
+        for pattern in [empty, os.path.join(self.tmp, "*.jpg")]:
+            with patch("sys.stdout", new=StringIO()) as out, \
+                    self.assertRaises(SystemExit) as e:
+                image.main([ICON, pattern])
+            self.assertEqual(e.exception.code, 1)
+            self.assertIn(f"No images found for {pattern}", out.getvalue())
+
+        pattern = os.path.join(self.tmp, "[ac]", "*.png")
+        with patch("sys.stdout", new=StringIO()) as out:
+            image.main(["--jobs", "1", pattern])
+        self.assertIn("Checked 2 image(s)", out.getvalue())
+
+    def test_main_missing_file(self):
+        missing = os.path.join(self.tmp, "missing.png")
+        with patch("sys.stdout", new=StringIO()) as out, \
+                self.assertRaises(SystemExit):
+            image.main(["--jobs", "1", ICON, missing])
+        self.assertIn(missing + ": Image could not be read", out.getvalue())
@@ -1,6 +1,10 @@
 from argparse import Namespace
+import gzip
 import io
 import json
+import os
+import shutil
+import tempfile
 from requests import HTTPError
 import zipfile
 from unittest import TestCase
@@ -8,6 +12,7 @@ from unittest.mock import ANY, MagicMock, Mock, PropertyMock, patch
 from io import StringIO
 
 from validate import package
+from validate.util.git import GitError
 from munch import munchify
 
 
@@ -37,9 +42,19 @@ class TestValidatePackage(TestCase):
             identifier="testpackage",
             metadata="metadata.json",
             oldmetadata="metadata_old.json",
+            old_rev=None,
+            mirror=None,
+            rewrite_map=None,
+            result_cache=None,
+            manifests=None,
+            member_jobs=None,
+            max_model_size=package.MAX_INFLATED_SIZE,
             max_icon_width=64,
             max_icon_height=64,
-            max_icon_size=20480)
+            max_icon_size=20480,
+            full_icon_decode=False,
+            limit=None,
+            metrics=None)
 
         self.package_files = [
             "metadata.json",
@@ -102,10 +117,52 @@ class TestValidatePackage(TestCase):
                 ["testpackage", "metadata.json", "metadata_old.json"])
             self.assertIn("Validation passed", fake_out.getvalue())
 
+        # options of sharded runs are not needed by validate_metadata
         validate_metadata.assert_called_once_with(
-            self.args, ANY, ANY, "testpackage")
+            Namespace(**vars(self.args), only_version=None), ANY, ANY,
+            "testpackage")
         verify_exit.assert_any_call(True, "0 error(s) detected")
 
+    @patch("validate.package.get_object_reader")
+    @patch("validate.package.load_json_file")
+    @patch("validate.package.validate_metadata")
+    def test_main_old_rev(self, validate_metadata, load_json_file,
+                          get_object_reader, verify, verify_exit):
+        load_json_file.side_effect = self.load_json_sideeffect
+        reader = get_object_reader.return_value
+        reader.read.return_value = json.dumps(self.oldmetadata).encode()
+
+        with patch('sys.stdout', new=StringIO()):
+            package.main(
+                ["testpackage", "metadata.json", "--old-rev", "base"])
+
+        reader.read.assert_called_once_with("base", "metadata.json")
+        self.assertEqual(
+            validate_metadata.call_args.args[2], self.oldmetadata)
+
+        reader.read.return_value = None
+
+        with patch('sys.stdout', new=StringIO()):
+            package.main(
+                ["testpackage", "metadata.json", "--old-rev", "base"])
+
+        self.assertIsNone(validate_metadata.call_args.args[2])
+
+        # a revision that doesn't resolve is not a new package
+        reader.read.side_effect = GitError("Revision base is not a commit")
+        verify_exit.side_effect = SystemExit(1)
+        validate_metadata.reset_mock()
+
+        with patch('sys.stdout', new=StringIO()), \
+                self.assertRaises(SystemExit):
+            package.main(
+                ["testpackage", "metadata.json", "--old-rev", "base"])
+
+        verify_exit.assert_called_with(
+            False, "Can't read previous metadata: Revision base is not a "
+            "commit")
+        validate_metadata.assert_not_called()
+
     @patch("validate.package.load_json_file")
     @patch("validate.package.validate_metadata")
     def test_main_invalid_schema(self, validate_metadata,
@@ -181,6 +238,30 @@ class TestValidatePackage(TestCase):
         validate_version.assert_any_call(
             self.args, self.metadata, self.metadata.versions[1])
 
+    @patch("validate.package.validate_version")
+    def test_validate_metadata_only_version(self, validate_version,
+                                            verify, verify_exit):
+        self.oldmetadata.versions[0].download_url = "https://other.com"
+        self.args.only_version = [self.metadata.versions[1].version]
+
+        package.validate_metadata(
+            self.args, self.metadata, self.oldmetadata, "testpackage")
+
+        validate_version.assert_called_once_with(
+            self.args, self.metadata, self.metadata.versions[1])
+
+    def test_versions_to_download(self, verify, verify_exit):
+        self.assertEqual(
+            package.versions_to_download(self.metadata, None),
+            self.metadata.versions)
+        self.assertEqual(
+            package.versions_to_download(self.metadata, self.metadata), [])
+
+        self.oldmetadata.versions[0].download_url = "https://other.com"
+        self.assertEqual(
+            package.versions_to_download(self.metadata, self.oldmetadata),
+            self.metadata.versions)
+
     @patch("validate.package.validate_version")
     def test_validate_metadata_delisted(self, validate_version,
                                         verify, verify_exit):
@@ -412,6 +493,77 @@ class TestValidatePackage(TestCase):
             "Version 2.0: non plugin type packages should not have "
             "platforms field in version entries")
 
+    @patch("validate.package.validate_packaged_metadata")
+    @patch("validate.package.download_file")
+    @patch("validate.package.getsha256")
+    def test_validate_version_library_files(self, getsha256, download_file,
+                                            _, verify, verify_exit):
+        getsha256.return_value = self.metadata.versions[0].download_sha256
+        self.metadata.type = "library"
+        del self.metadata.versions[0].platforms
+
+        def download(url, path):
+            self.download_file_sideeffect(url, path)
+            with zipfile.ZipFile(path, "a") as z:
+                z.writestr("footprints/a.pretty/ok.kicad_mod",
+                           "(footprint \"ok\" (layer \"F.Cu\"))\n")
+                z.writestr("footprints/a.pretty/cut.kicad_mod",
+                           "(footprint \"cut\" (layer \"F.Cu\")\n")
+                z.writestr("symbols/a.kicad_sym", "(footprint \"a\")\n")
+                z.writestr("3dmodels/a.3dshapes/m.wrz",
+                           gzip.compress(b"#VRML V2.0 utf8\n"))
+                z.writestr("3dmodels/a.3dshapes/m.stpz", b"ISO-10303-21;")
+            return True
+
+        download_file.side_effect = download
+
+        with patch("validate.package.SCHEMA", new={}):
+            package.validate_version(
+                self.args, self.metadata, self.metadata.versions[0])
+
+        verify.assert_any_call(
+            False, 'Version 2.0: file "footprints/a.pretty/cut.kicad_mod" is '
+            'malformed, unexpected end of file, 1 list(s) not closed')
+        verify.assert_any_call(
+            False, 'Version 2.0: file "symbols/a.kicad_sym" is malformed, '
+            'unexpected root token "footprint", expected kicad_symbol_lib')
+        verify.assert_any_call(
+            True, 'Version 2.0: file "footprints/a.pretty/ok.kicad_mod" is '
+            'malformed, None')
+        verify.assert_any_call(
+            True, 'Version 2.0: file "3dmodels/a.3dshapes/m.wrz" is '
+            'malformed, None')
+        verify.assert_any_call(
+            False, 'Version 2.0: file "3dmodels/a.3dshapes/m.stpz" is '
+            'malformed, compressed data is corrupt: Error -3 while '
+            'decompressing data: incorrect header check')
+
+    @patch("validate.package.validate_packaged_metadata")
+    @patch("validate.package.download_file")
+    @patch("validate.package.getsha256")
+    def test_validate_version_python_syntax(self, getsha256, download_file,
+                                            _, verify, verify_exit):
+        getsha256.return_value = self.metadata.versions[0].download_sha256
+
+        def download(url, path):
+            self.download_file_sideeffect(url, path)
+            with zipfile.ZipFile(path, "a") as z:
+                z.writestr("plugins/broken.py", "import os\nif True\n")
+            return True
+
+        download_file.side_effect = download
+
+        with patch("validate.package.SCHEMA", new={}):
+            package.validate_version(
+                self.args, self.metadata, self.metadata.versions[0])
+
+        verify.assert_any_call(
+            False, 'Version 2.0: python file "plugins/broken.py" does not '
+            "parse, line 2: expected ':'")
+        verify.assert_any_call(
+            True, 'Version 2.0: python file "plugins/__init__.py" does not '
+            "parse, None")
+
     @patch("validate.package.validate_packaged_metadata")
     @patch("validate.package.download_file")
     @patch("validate.package.getsha256")
@@ -682,3 +834,27 @@ class TestValidatePackage(TestCase):
             verify,
             False,
             lambda msg: "HTTP code: 404" in msg)
+
+    def test_archive_cache(self, verify, verify_exit):
+        tmp = tempfile.mkdtemp()
+        version = munchify({"download_sha256": "abc"})
+
+        try:
+            self.assertIsNone(package.cached_archive(version))
+
+            with patch("validate.package.ARCHIVE_CACHE", new=tmp):
+                self.assertIsNone(package.cached_archive(version))
+
+                path = os.path.join(tmp, "download.zip")
+                with io.open(path, "wb") as f:
+                    f.write(b"data")
+
+                self.assertTrue(package.cache_archive(version, path))
+                self.assertFalse(os.path.exists(path))
+
+                with patch('sys.stdout', new=StringIO()):
+                    self.assertEqual(package.cached_archive(version),
+                                     os.path.join(tmp, "abc.zip"))
+                self.assertIsNone(package.cached_archive(munchify({})))
+        finally:
+            shutil.rmtree(tmp)
@@ -0,0 +1,85 @@
+import io
+import json
+from unittest import TestCase
+
+from validate import versions
+
+
+class TestVersions(TestCase):
+    def setUp(self) -> None:
+        with io.open("test/data/metadata_valid.json", encoding="utf-8") as f:
+            self.metadata = json.load(f)
+
+        self.package = {
+            "identifier": "pkg",
+            "versions": [
+                {"version": "1.0", "status": "stable",
+                 "kicad_version": "6.0"},
+                {"version": "1.10", "status": "stable",
+                 "kicad_version": "6.0", "kicad_version_max": "7.0"},
+                {"version": "1.9", "status": "stable",
+                 "kicad_version": "6.0"},
+                {"version": "2.0", "status": "testing",
+                 "kicad_version": "8.0.2", "platforms": ["linux"]},
+                {"version": "3.0", "status": "deprecated",
+                 "kicad_version": "6.0"},
+            ]
+        }
+
+    def test_parse_version(self):
+        self.assertEqual(versions.parse_version("6"), (6, 0, 0))
+        self.assertEqual(versions.parse_version("6.1"), (6, 1, 0))
+        self.assertEqual(versions.parse_version("6.1.12"), (6, 1, 12))
+        self.assertRaises(ValueError, versions.parse_version, "1.2.3.4")
+        self.assertRaises(ValueError, versions.parse_version, "1.a")
+
+    def test_version_key(self):
+        self.assertLess(
+            versions.version_key({"version": "1.9"}),
+            versions.version_key({"version": "1.10"}))
+        self.assertLess(
+            versions.version_key({"version": "1.0.1"}),
+            versions.version_key({"version": "1.1"}))
+        self.assertLess(
+            versions.version_key({"version": "9.0"}),
+            versions.version_key({"version": "1.0", "version_epoch": 1}))
+
+    def test_is_compatible(self):
+        v = self.package["versions"]
+        self.assertTrue(versions.is_compatible(v[0], (6, 0), "windows"))
+        self.assertTrue(versions.is_compatible(v[0], (9, 0), "windows"))
+        self.assertFalse(versions.is_compatible(v[0], (5, 1), "windows"))
+        self.assertTrue(versions.is_compatible(v[1], (7, 0), "macos"))
+        self.assertFalse(versions.is_compatible(v[1], (7, 99), "macos"))
+        self.assertTrue(versions.is_compatible(v[3], (8, 0), "linux"))
+        self.assertFalse(versions.is_compatible(v[3], (8, 0), "windows"))
+        self.assertFalse(versions.is_compatible(v[4], (8, 0), "linux"))
+
+    def test_best_version(self):
+        def best(series, platform):
+            version = versions.best_version(self.package, series, platform)
+            return version["version"] if version else None
+
+        self.assertEqual(best((5, 1), "linux"), None)
+        self.assertEqual(best((6, 0), "linux"), "1.10")
+        self.assertEqual(best((8, 0), "linux"), "2.0")
+        self.assertEqual(best((8, 0), "windows"), "1.9")
+
+    def test_compatibility_table(self):
+        self.assertEqual(
+            versions.compatibility_table(
+                self.package, ["5.1", "7.0", "8.0"], ["windows", "linux"]),
+            {
+                "7.0": {"windows": "1.10", "linux": "1.10"},
+                "8.0": {"windows": "1.9", "linux": "2.0"},
+            })
+
+    def test_latest_versions(self):
+        latest = versions.latest_versions([self.metadata], ["6.0"])
+
+        self.assertEqual(latest["kicad_versions"], ["6.0"])
+        self.assertEqual(latest["packages"], {
+            "testpackage": {
+                "6.0": {"windows": "2.0", "macos": "2.0", "linux": "2.0"}
+            }
+        })
@@ -0,0 +1,70 @@
+import hashlib
+import io
+import zipfile
+import zlib
+from unittest import TestCase
+
+from validate.util import ziputil
+
+FILES = [("a.txt", b"hello " * 100), ("b/ü.bin", bytes(range(256))),
+         ("c", b"")]
+
+
+def build(files=FILES) -> bytes:
+    f = io.BytesIO()
+    with ziputil.RawZipWriter(f) as z:
+        for name, data in files:
+            zinfo = ziputil.deterministic_zipinfo(name)
+            raw, crc, zinfo.compress_type = ziputil.compress(data)
+            z.write(zinfo, raw, crc, len(data))
+    return f.getvalue()
+
+
+class TestRawZipWriter(TestCase):
+    def test_roundtrip(self):
+        data = build()
+
+        with zipfile.ZipFile(io.BytesIO(data)) as z:
+            self.assertIsNone(z.testzip())
+            self.assertEqual(z.namelist(), [name for name, _ in FILES])
+            for name, content in FILES:
+                self.assertEqual(z.read(name), content)
+            info = z.getinfo("a.txt")
+            self.assertEqual(info.compress_type, zipfile.ZIP_DEFLATED)
+            self.assertEqual(info.date_time, ziputil.FIXED_DATE_TIME)
+            self.assertEqual(info.external_attr, 0o644 << 16)
+            self.assertEqual(z.getinfo("c").compress_type,
+                             zipfile.ZIP_STORED)
+
+    def test_reproducible(self):
+        self.assertEqual(build(), build())
+
+        # Layout of archives is pinned, stored members keep it independent
+        # of the zlib build.
+        f = io.BytesIO()
+        with ziputil.RawZipWriter(f) as z:
+            for name, data in FILES:
+                zinfo = ziputil.deterministic_zipinfo(name)
+                zinfo.compress_type = zipfile.ZIP_STORED
+                z.write(zinfo, data, zlib.crc32(data), len(data))
+        self.assertEqual(
+            hashlib.sha256(f.getvalue()).hexdigest(),
+            "c278c9cec4f4abcd80e2305867205db8b65069e0ac61dea2f4959876bcbefde8")
+
+    def test_copy_raw(self):
+        source = build()
+        with zipfile.ZipFile(io.BytesIO(source)) as z:
+            infos = z.infolist()
+
+        f = io.BytesIO()
+        with ziputil.RawZipWriter(f) as z:
+            for info in infos:
+                zinfo = ziputil.deterministic_zipinfo(info.filename)
+                zinfo.compress_type = info.compress_type
+                z.write(zinfo, ziputil.read_raw(io.BytesIO(source), info),
+                        info.CRC, info.file_size)
+
+        self.assertEqual(f.getvalue(), source)
+
+    def test_duplicate_name(self):
+        self.assertRaises(ValueError, build, FILES + FILES[:1])
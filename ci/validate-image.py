@@ -1,6 +1,7 @@
 import sys
-from validate.image import main
+from validate.daemon import client_main
 
 
 if __name__ == "__main__":
-    main(sys.argv[1:])
+    # runs through the daemon at $VALIDATE_DAEMON if it is set
+    client_main("image", sys.argv[1:])
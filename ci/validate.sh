@@ -12,77 +12,42 @@ echo "Changed files"
 echo "$DIFF_FILES"
 
 
-# Check for spaces in packages
-PACKAGES_WITH_SPACES=$(echo "$DIFF_FILES" | egrep '^?\s+packages\/[^/]* [^/]*/.*$' )
-
-if [ ! -z "$PACKAGES_WITH_SPACES" ]; then
-    echo "Spaces are not allowed in package names"
-    exit 1
+# Check for identifiers, names, urls and hashes used by other packages
+CONSISTENCY_ARGS=""
+if [ ! -z "$REPOSITORY_INDEX" ]; then
+    CONSISTENCY_ARGS="--index $REPOSITORY_INDEX --base $MERGE_BASE_SHA --head $CI_COMMIT_SHA"
 fi
 
-
-# Don't allow deleted package files
-DELETED_METADATA_FILES=$(echo "$DIFF_FILES" | egrep '^D\s+packages\/[^\/]*\/metadata.json$' )
-
-if [ ! -z "$DELETED_METADATA_FILES" ]; then
-    echo "Deleting package metadata files is not allowed, to delist a package remove all versions."
+python3 "ci/validate-consistency.py" artifacts/diff_files.txt $CONSISTENCY_ARGS
+if [ $? -ne 0 ]; then
+    echo "Cross package validation failed"
     exit 1
 fi
 
 
-# Download schema file
+# Download schema file, a cached copy is used if it's recent enough
 if [ -z "$SCHEMA_URL" ]; then
     SCHEMA_URL="https://gitlab.com/kicad/code/kicad/-/raw/master/kicad/pcm/schemas/pcm.v1.schema.json"
 fi
 
-curl -s -S -L "$SCHEMA_URL" -o schema.json
-CURL_RETURN=$?
-
-if [ $CURL_RETURN -ne 0 ]; then
-    echo "Failed to download schema, curl returned $CURL_RETURN"
-    exit 1
+SCHEMA_ARGS=""
+if [ ! -z "$SCHEMA_OFFLINE" ]; then
+    SCHEMA_ARGS="--offline"
 fi
 
-# Validate new packages
-NEW_METADATA_FILES=$(echo "$DIFF_FILES" | egrep '^A\s+packages\/[^\/]*\/metadata.json$' | awk '{print $2}')
-
-for f in $NEW_METADATA_FILES; do
-    PACKAGE=$(echo "$f" | awk -F'/' '{print $2}')
-    echo "Validating new package $PACKAGE"
-    python3 "ci/validate-package.py" "$PACKAGE" "$f"
-    if [ $? -ne 0 ]; then
-        echo "Validation of package $PACKAGE failed"
-        exit 1
-    fi
-done
-
+python3 "ci/fetch-schema.py" --url "$SCHEMA_URL" --output schema.json $SCHEMA_ARGS
 
-# Validate changed packages
-CHANGED_METADATA_FILES=$(echo "$DIFF_FILES" | egrep '^M\s+packages\/[^\/]*\/metadata.json$' | awk '{print $2}')
-
-for f in $CHANGED_METADATA_FILES; do
-    PACKAGE=$(echo "$f" | awk -F'/' '{print $2}')
-    echo "Validating changes to package $PACKAGE"
-    git show "$MERGE_BASE_SHA:$f" > "$f".old
-    python3 "ci/validate-package.py" "$PACKAGE" "$f" "$f".old
-    if [ $? -ne 0 ]; then
-        echo "Validation of package $PACKAGE failed"
-        exit 1
-    fi
-done
-
-
-# Validate icon files
-ICON_FILES=$(echo "$DIFF_FILES" | egrep '^[MA]\s+packages\/[^\/]*\/icon.png$' | awk '{print $2}')
-
-for f in $ICON_FILES; do
-    echo "Validating icon $f"
-    PACKAGE=$(echo "$f" | awk -F'/' '{print $2}')
-    python3 "ci/validate-image.py" "$f"
-    if [ $? -ne 0 ]; then
-        echo "Validation of icon for package $PACKAGE failed"
-        exit 1
-    fi
-done
+if [ $? -ne 0 ]; then
+    echo "Failed to download schema"
+    exit 1
+fi
 
-echo "Done"
+# Validate new and changed packages and icons, the diff is parsed once into
+# a work plan that is run in a single process. Parallel jobs validate their
+# share of the plan and write partial reports for merge-validation.sh.
+# $VALIDATE_ARGS can set parallel jobs and budgets, e.g. "--jobs 4 --max-time 600"
+if [ ! -z "$CI_NODE_TOTAL" ] && [ "$CI_NODE_TOTAL" -gt 1 ]; then
+    python3 "ci/validate-shard.py" run artifacts/diff_files.txt --merge-base "$MERGE_BASE_SHA" $VALIDATE_ARGS
+else
+    python3 "ci/run-plan.py" validate artifacts/diff_files.txt --merge-base "$MERGE_BASE_SHA" $VALIDATE_ARGS
+fi
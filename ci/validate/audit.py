@@ -0,0 +1,306 @@
+import argparse
+import glob
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+from dataclasses import asdict, dataclass
+from requests.exceptions import RequestException
+from .package import MAX_DOWNLOAD_SIZE, load_json_file, max_deviation
+from .util.throttle import ThrottledSession, fair_map, get_limiter, host_of
+
+
+TIMEOUT = 30
+CHUNK_SIZE = 64 * 1024
+PROBLEMS = ["missing", "sha_mismatch", "size_mismatch", "error"]
+
+
+@dataclass
+class Target:
+    package: str
+    version: str
+    url: str
+    sha256: str = None
+    size: int = None
+
+
+@dataclass
+class Result:
+    package: str
+    version: str
+    url: str
+    # ok, unchanged, verified or one of PROBLEMS
+    status: str
+    detail: str = ""
+    http_status: int = None
+    downloaded: bool = False
+
+
+def targets(packages_dir: str) -> list:
+    result = []
+
+    for path in sorted(glob.glob(
+            os.path.join(packages_dir, "*", "metadata.json"))):
+        package = os.path.basename(os.path.dirname(path))
+        try:
+            metadata = load_json_file(path)
+        except ValueError:
+            continue
+
+        for v in metadata.get("versions", []):
+            if "download_url" in v:
+                result.append(Target(
+                    package, v.get("version"), v["download_url"],
+                    v.get("download_sha256"), v.get("download_size")))
+
+    return result
+
+
+def load_state(path: str) -> dict:
+    if not path or not os.path.exists(path):
+        return {}
+    with io.open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_state(path: str, state: dict):
+    tmp = path + ".tmp"
+    with io.open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=4, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def remote_size(response) -> int:
+    """
+    Size of the whole resource from a HEAD or ranged GET response.
+    """
+    content_range = response.headers.get("Content-Range", "")
+    if "/" in content_range:
+        total = content_range.rsplit("/", 1)[1]
+        if total.isdigit():
+            return int(total)
+    length = response.headers.get("Content-Length")
+    if response.status_code == 200 and length and length.isdigit():
+        return int(length)
+    return None
+
+
+class Auditor:
+    """
+    Checks that download urls still serve the declared archives. A url is
+    probed with HEAD, or a single byte ranged GET when HEAD is refused,
+    sending the validators saved from the last run. The archive is only
+    downloaded when its sha256 was never confirmed or the server says the
+    content changed.
+    """
+
+    def __init__(self, state: dict, archive_cache: str = None,
+                 download: bool = True, limiter=None):
+        self.state = state
+        self.archive_cache = archive_cache
+        self.download = download
+        self.limiter = limiter or get_limiter()
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    def session(self) -> ThrottledSession:
+        if not hasattr(self.local, "session"):
+            self.local.session = ThrottledSession(self.limiter)
+        return self.local.session
+
+    def probe(self, target: Target, record: dict):
+        headers = {}
+        if record.get("sha256") == target.sha256:
+            if record.get("etag"):
+                headers["If-None-Match"] = record["etag"]
+            if record.get("last_modified"):
+                headers["If-Modified-Since"] = record["last_modified"]
+
+        s = self.session()
+        response = s.head(target.url, headers=headers, allow_redirects=True,
+                          timeout=TIMEOUT)
+        if response.status_code in (403, 405, 501):
+            response = s.get(target.url, allow_redirects=True, stream=True,
+                             timeout=TIMEOUT,
+                             headers=dict(headers, Range="bytes=0-0"))
+            response.close()
+        return response
+
+    def fetch_sha(self, target: Target) -> str:
+        """
+        Download the archive and return its sha256, keeping it in the
+        archive cache when it matches.
+        """
+        sha = hashlib.sha256()
+        size = 0
+        f = None
+        tmp = None
+
+        if self.archive_cache and target.sha256:
+            os.makedirs(self.archive_cache, exist_ok=True)
+            tmp = os.path.join(
+                self.archive_cache, f"{target.sha256}.zip.{os.getpid()}."
+                f"{threading.get_ident()}.tmp")
+            f = io.open(tmp, "wb")
+
+        try:
+            with self.session().get(target.url, stream=True,
+                                    timeout=TIMEOUT) as response:
+                response.raise_for_status()
+                for chunk in response.iter_content(CHUNK_SIZE):
+                    size += len(chunk)
+                    if size > MAX_DOWNLOAD_SIZE:
+                        raise RuntimeError("File is too large to download")
+                    sha.update(chunk)
+                    if f:
+                        f.write(chunk)
+        except BaseException:
+            # partial downloads must not pile up in the cache
+            if tmp:
+                f.close()
+                os.remove(tmp)
+            raise
+        finally:
+            if f:
+                f.close()
+
+        digest = sha.hexdigest()
+        if tmp:
+            if digest == target.sha256:
+                os.replace(tmp, os.path.join(
+                    self.archive_cache, f"{target.sha256}.zip"))
+            else:
+                os.remove(tmp)
+
+        return digest
+
+    def check(self, target: Target) -> Result:
+        result = Result(target.package, target.version, target.url, "ok")
+
+        with self.lock:
+            record = dict(self.state.get(target.url, {}))
+
+        try:
+            response = self.probe(target, record)
+            result.http_status = response.status_code
+
+            if response.status_code == 304:
+                result.status = "unchanged"
+                record["checked"] = time.time()
+                with self.lock:
+                    self.state[target.url] = record
+                return result
+
+            if response.status_code in (404, 410):
+                result.status = "missing"
+                return result
+
+            if response.status_code >= 400:
+                result.status = "error"
+                result.detail = f"HTTP code: {response.status_code}"
+                return result
+
+            size = remote_size(response)
+            if (size is not None and target.size is not None and
+                    not max_deviation(size, target.size, 1024)):
+                result.status = "size_mismatch"
+                result.detail = f"expected {target.size}, actual {size}"
+                return result
+
+            etag = response.headers.get("ETag")
+            last_modified = response.headers.get("Last-Modified")
+            confirmed = (record.get("sha256") == target.sha256 and
+                         (etag or last_modified) and
+                         record.get("etag") == etag and
+                         record.get("last_modified") == last_modified)
+
+            if target.sha256 and not confirmed and self.download:
+                result.downloaded = True
+                sha = self.fetch_sha(target)
+                if sha != target.sha256:
+                    result.status = "sha_mismatch"
+                    result.detail = f"actual {sha}"
+                    return result
+                result.status = "verified"
+                record = {"sha256": sha, "etag": etag,
+                          "last_modified": last_modified}
+            elif confirmed:
+                result.status = "unchanged"
+
+            record["checked"] = time.time()
+            with self.lock:
+                self.state[target.url] = record
+
+        except (RequestException, RuntimeError, OSError) as e:
+            result.status = "error"
+            result.detail = str(e)
+
+        return result
+
+    def run(self, targets: list, jobs: int) -> list:
+        # hosts are interleaved so one rate limited host doesn't hold up
+        # checks of the others
+        return fair_map(self.check, targets, lambda t: host_of(t.url), jobs,
+                        self.limiter)
+
+
+def make_report(results: list) -> dict:
+    counts = {}
+    for r in results:
+        counts[r.status] = counts.get(r.status, 0) + 1
+
+    return {
+        "checked": len(results),
+        "downloaded": sum(r.downloaded for r in results),
+        "counts": counts,
+        "problems": [asdict(r) for r in results if r.status in PROBLEMS],
+        "results": [asdict(r) for r in results],
+    }
+
+
+def main(args):
+    parser = argparse.ArgumentParser(
+        description="KiCad PCM repository download url audit")
+
+    parser.add_argument(
+        "--packages", help="Packages directory", default="packages")
+    parser.add_argument(
+        "--report", help="Report to write", default="artifacts/audit.json")
+    parser.add_argument(
+        "--state", help="State file with validators of confirmed urls, "
+        "keep it between runs", default="artifacts/audit-state.json")
+    parser.add_argument(
+        "--archive-cache", help="Directory to keep confirmed archives in",
+        default=None)
+    parser.add_argument(
+        "--jobs", help="Number of concurrent checks", type=int, default=8)
+    parser.add_argument(
+        "--no-download", help="Only probe urls, never download archives",
+        action="store_true")
+
+    args = parser.parse_args(args)
+
+    state = load_state(args.state)
+    auditor = Auditor(state, args.archive_cache, not args.no_download)
+    results = auditor.run(targets(args.packages), args.jobs)
+
+    report = make_report(results)
+
+    os.makedirs(os.path.dirname(args.report) or ".", exist_ok=True)
+    with io.open(args.report, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=4)
+    if args.state:
+        os.makedirs(os.path.dirname(args.state) or ".", exist_ok=True)
+        save_state(args.state, state)
+
+    for problem in report["problems"]:
+        print(f"{problem['package']} {problem['version']}: "
+              f"{problem['status']} {problem['url']} {problem['detail']}")
+
+    print(f"Checked {report['checked']} url(s), downloaded "
+          f"{report['downloaded']}, {len(report['problems'])} problem(s)")
+
+    if report["problems"]:
+        raise SystemExit(1)
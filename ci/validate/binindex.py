@@ -0,0 +1,294 @@
+import io
+import struct
+
+
+# Binary encoding of the packages.json document.
+#
+# Layout, all integers little endian:
+#   magic        8 bytes  b"KPCMBIN1"
+#   strings      u32 count, u32[count + 1] offsets, utf-8 data
+#   packages     u32 count, (u32 identifier string, u32 value offset)[count]
+#   extra        u32 value offset of the remaining top level fields
+#   values       encoded package objects followed by the extra object
+#
+# Every string (keys and values) is stored once in the string table and
+# referenced by index. Packages are encoded separately and listed in a
+# directory so that a reader can look one up by identifier without
+# decoding the rest of the index, long description_full fields included.
+#
+# This is a lazy lookup index: opening it and getting a few packages is
+# much faster than parsing packages.json, but decoding every package is
+# done in python and is slower than json.loads. Clients that list all
+# packages should keep reading packages.json.
+
+MAGIC = b"KPCMBIN1"
+
+T_NULL = 0
+T_FALSE = 1
+T_TRUE = 2
+T_INT = 3
+T_FLOAT = 4
+T_STR = 5
+T_LIST = 6
+T_DICT = 7
+
+_U32 = struct.Struct("<I")
+_I64 = struct.Struct("<q")
+_F64 = struct.Struct("<d")
+_DIRENTRY = struct.Struct("<II")
+
+U32_MAX = 2 ** 32 - 1
+I64_MIN = -2 ** 63
+I64_MAX = 2 ** 63 - 1
+
+
+class BinaryIndexError(ValueError):
+    pass
+
+
+def _count(n: int) -> int:
+    if n > U32_MAX:
+        raise BinaryIndexError(f"{n} items do not fit the index")
+    return n
+
+
+class _Encoder:
+    def __init__(self):
+        self.strings = {}
+        self.out = io.BytesIO()
+
+    def string(self, s: str) -> int:
+        index = self.strings.get(s)
+        if index is None:
+            index = len(self.strings)
+            self.strings[s] = index
+        return index
+
+    def value(self, v):
+        out = self.out
+        if v is None:
+            out.write(bytes((T_NULL,)))
+        elif v is True:
+            out.write(bytes((T_TRUE,)))
+        elif v is False:
+            out.write(bytes((T_FALSE,)))
+        elif isinstance(v, int):
+            if not I64_MIN <= v <= I64_MAX:
+                raise BinaryIndexError(f"Integer {v} does not fit 64 bits")
+            out.write(bytes((T_INT,)))
+            out.write(_I64.pack(v))
+        elif isinstance(v, float):
+            out.write(bytes((T_FLOAT,)))
+            out.write(_F64.pack(v))
+        elif isinstance(v, str):
+            out.write(bytes((T_STR,)))
+            out.write(_U32.pack(self.string(v)))
+        elif isinstance(v, (list, tuple)):
+            out.write(bytes((T_LIST,)))
+            out.write(_U32.pack(_count(len(v))))
+            for item in v:
+                self.value(item)
+        elif isinstance(v, dict):
+            out.write(bytes((T_DICT,)))
+            out.write(_U32.pack(_count(len(v))))
+            for key, item in v.items():
+                out.write(_U32.pack(self.string(key)))
+                self.value(item)
+        else:
+            raise TypeError(f"Can not encode {type(v).__name__}")
+
+
+def dumps(index: dict) -> bytes:
+    """
+    Encode a packages.json document ({"packages": [...]}) to bytes.
+    """
+    encoder = _Encoder()
+    directory = []
+
+    for package in index.get("packages", []):
+        offset = encoder.out.tell()
+        encoder.value(package)
+        directory.append((encoder.string(package["identifier"]), offset))
+
+    extra = {k: v for k, v in index.items() if k != "packages"}
+    extra_offset = encoder.out.tell()
+    encoder.value(extra)
+
+    data = [s.encode("utf-8") for s in encoder.strings]
+    out = io.BytesIO()
+    out.write(MAGIC)
+    out.write(_U32.pack(_count(len(data))))
+    offset = 0
+    out.write(_U32.pack(offset))
+    for s in data:
+        offset += len(s)
+        out.write(_U32.pack(_count(offset)))
+    for s in data:
+        out.write(s)
+
+    # value offsets grow with the data, the last one is the largest
+    _count(extra_offset)
+    out.write(_U32.pack(len(directory)))
+    for entry in directory:
+        out.write(_DIRENTRY.pack(*entry))
+    out.write(_U32.pack(extra_offset))
+    out.write(encoder.out.getvalue())
+
+    return out.getvalue()
+
+
+class BinaryIndex:
+    """
+    Lazy reader for the binary index. Opening only reads the string offsets
+    and the package directory, packages are decoded on access.
+    """
+
+    def __init__(self, buf: bytes):
+        self.buf = memoryview(buf)
+
+        if bytes(self.buf[0:len(MAGIC)]) != MAGIC:
+            raise BinaryIndexError("Not a binary package index")
+
+        try:
+            pos = len(MAGIC)
+            (count,) = _U32.unpack_from(self.buf, pos)
+            pos += _U32.size
+            self.string_offsets = struct.unpack_from(
+                f"<{count + 1}I", self.buf, pos)
+            pos += (count + 1) * _U32.size
+            self.string_base = pos
+            pos += self.string_offsets[-1]
+            self.strings = [None] * count
+
+            (count,) = _U32.unpack_from(self.buf, pos)
+            pos += _U32.size
+            entries = struct.unpack_from(f"<{count * 2}I", self.buf, pos)
+            pos += count * _DIRENTRY.size
+            (self.extra_offset,) = _U32.unpack_from(self.buf, pos)
+            self.value_base = pos + _U32.size
+        except struct.error as e:
+            raise BinaryIndexError(f"Truncated binary package index: {e}")
+
+        self.order = [
+            (self.string(entries[i]), entries[i + 1])
+            for i in range(0, len(entries), 2)]
+        self.directory = dict(self.order)
+
+    def string(self, index: int) -> str:
+        s = self.strings[index]
+        if s is None:
+            start = self.string_base + self.string_offsets[index]
+            end = self.string_base + self.string_offsets[index + 1]
+            s = str(self.buf[start:end], "utf-8")
+            self.strings[index] = s
+        return s
+
+    def all_strings(self) -> list:
+        """
+        Decode the whole string table at once, for decoding everything.
+        """
+        offsets = self.string_offsets
+        data = bytes(self.buf[self.string_base:
+                              self.string_base + offsets[-1]])
+        self.strings = [str(data[start:end], "utf-8")
+                        for start, end in zip(offsets, offsets[1:])]
+        return self.strings
+
+    def _decoder(self, strings):
+        """
+        Return a function decoding the value at a position to (value, end
+        position), with strings looked up in strings.
+        """
+        buf = self.buf
+        u32 = _U32.unpack_from
+        i64 = _I64.unpack_from
+        f64 = _F64.unpack_from
+
+        def value(pos):
+            tag = buf[pos]
+            if tag == T_STR:
+                return strings[u32(buf, pos + 1)[0]], pos + 5
+            if tag == T_DICT:
+                (count,) = u32(buf, pos + 1)
+                pos += 5
+                result = {}
+                for _ in range(count):
+                    key = strings[u32(buf, pos)[0]]
+                    result[key], pos = value(pos + 4)
+                return result, pos
+            if tag == T_LIST:
+                (count,) = u32(buf, pos + 1)
+                pos += 5
+                result = []
+                append = result.append
+                for _ in range(count):
+                    item, pos = value(pos)
+                    append(item)
+                return result, pos
+            if tag == T_INT:
+                return i64(buf, pos + 1)[0], pos + 1 + _I64.size
+            if tag == T_FLOAT:
+                return f64(buf, pos + 1)[0], pos + 1 + _F64.size
+            if tag == T_NULL:
+                return None, pos + 1
+            if tag == T_TRUE:
+                return True, pos + 1
+            if tag == T_FALSE:
+                return False, pos + 1
+
+            raise BinaryIndexError(f"Unknown value tag {tag} at {pos}")
+
+        return value
+
+    def identifiers(self) -> list:
+        return [identifier for identifier, _ in self.order]
+
+    def __contains__(self, identifier: str) -> bool:
+        return identifier in self.directory
+
+    def __len__(self) -> int:
+        return len(self.order)
+
+    def _decode(self, offset: int, decoder=None):
+        decoder = decoder or self._decoder(_LazyStrings(self))
+        try:
+            return decoder(self.value_base + offset)[0]
+        except (IndexError, struct.error, UnicodeDecodeError) as e:
+            raise BinaryIndexError(f"Truncated binary package index: {e}")
+
+    def get(self, identifier: str) -> dict:
+        offset = self.directory.get(identifier)
+        if offset is None:
+            return None
+        return self._decode(offset)
+
+    def to_dict(self) -> dict:
+        try:
+            decoder = self._decoder(self.all_strings())
+        except UnicodeDecodeError as e:
+            raise BinaryIndexError(f"Truncated binary package index: {e}")
+        result = {"packages": [self._decode(o, decoder)
+                               for _, o in self.order]}
+        result.update(self._decode(self.extra_offset, decoder))
+        return result
+
+
+class _LazyStrings:
+    """
+    String table view decoding strings on first access.
+    """
+
+    def __init__(self, index: BinaryIndex):
+        self.string = index.string
+
+    def __getitem__(self, i: int) -> str:
+        return self.string(i)
+
+
+def loads(buf: bytes) -> dict:
+    return BinaryIndex(buf).to_dict()
+
+
+def load_file(file_name: str) -> BinaryIndex:
+    with io.open(file_name, "rb") as f:
+        return BinaryIndex(f.read())
@@ -0,0 +1,256 @@
+import argparse
+import glob
+import io
+import json
+import os
+import re
+import subprocess
+from .plan import parse_line
+from .util.verify import verify, verify_exit, get_failures
+
+
+INDEX_VERSION = 1
+METADATA_RE = re.compile(r"^packages/([^/]+)/metadata\.json$")
+_NAME_RE = re.compile(r"[\W_]+")
+
+
+def normalize_name(name: str) -> str:
+    return _NAME_RE.sub("", name.casefold())
+
+
+def parse_diff(lines: list) -> dict:
+    """
+    Parse "git diff --name-status" output into {package dir: status} for
+    package metadata files. The source of a rename counts as deleted and
+    its destination as added.
+    """
+    changes = {}
+
+    def change(path, status):
+        match = METADATA_RE.match(path)
+        if match:
+            changes[match.group(1)] = status
+
+    for line in lines:
+        status, paths = parse_line(line)
+        if status in ("R", "C"):
+            # a copy leaves its source as it was
+            if status == "R":
+                change(paths[0], "D")
+            change(paths[1], "A")
+        elif status:
+            change(paths[0], status)
+
+    return changes
+
+
+def package_entry(metadata: dict) -> dict:
+    versions = metadata.get("versions", [])
+    return {
+        "identifier": metadata.get("identifier"),
+        "name": normalize_name(metadata.get("name", "")),
+        "urls": sorted({v["download_url"] for v in versions
+                        if "download_url" in v}),
+        "sha256": sorted({v["download_sha256"] for v in versions
+                          if "download_sha256" in v}),
+    }
+
+
+class RepositoryIndex:
+    """
+    Index of all package metadata files in the repository with hash maps
+    from identifier, download url, download sha256 and normalized name to
+    the package directories using them.
+    """
+
+    KEYS = {
+        "identifier": lambda e: [e["identifier"]],
+        "name": lambda e: [e["name"]],
+        "urls": lambda e: e["urls"],
+        "sha256": lambda e: e["sha256"],
+    }
+
+    def __init__(self, packages_dir: str = "packages"):
+        self.packages_dir = packages_dir
+        self.revision = None
+        self.entries = {}
+        self.maps = {key: {} for key in self.KEYS}
+
+    def _link(self, package: str, entry: dict, add: bool):
+        for key, values in self.KEYS.items():
+            m = self.maps[key]
+            for value in values(entry):
+                if not value:
+                    continue
+                users = m.setdefault(value, set())
+                if add:
+                    users.add(package)
+                else:
+                    users.discard(package)
+                    if not users:
+                        del m[value]
+
+    def add(self, package: str, metadata: dict):
+        self.remove(package)
+        entry = package_entry(metadata)
+        self.entries[package] = entry
+        self._link(package, entry, True)
+
+    def remove(self, package: str):
+        entry = self.entries.pop(package, None)
+        if entry is not None:
+            self._link(package, entry, False)
+
+    def metadata_path(self, package: str) -> str:
+        return os.path.join(self.packages_dir, package, "metadata.json")
+
+    def load_package(self, package: str):
+        path = self.metadata_path(package)
+        if not os.path.exists(path):
+            self.remove(package)
+            return
+
+        try:
+            with io.open(path, encoding="utf-8") as f:
+                self.add(package, json.load(f))
+        except ValueError:
+            # invalid json is reported by package validation
+            self.remove(package)
+
+    def scan(self):
+        for path in sorted(glob.glob(self.metadata_path("*"))):
+            self.load_package(os.path.basename(os.path.dirname(path)))
+
+    def apply_changes(self, changes: dict):
+        for package in changes:
+            self.load_package(package)
+
+    def conflicts(self, package: str) -> list:
+        entry = self.entries.get(package)
+        if entry is None:
+            return []
+
+        messages = []
+        checks = [
+            ("identifier", "Package identifier \"{}\" is also used by {}"),
+            ("name", "Package name is the same as the name of {1} "
+                     "ignoring case, spaces and punctuation"),
+            ("urls", "Download url {} is also used by {}"),
+            ("sha256", "Download sha256 {} is also used by {}"),
+        ]
+
+        for key, message in checks:
+            for value in self.KEYS[key](entry):
+                others = sorted(self.maps[key].get(value, set()) - {package})
+                if others:
+                    messages.append(message.format(value, ", ".join(others)))
+
+        return messages
+
+    def to_json(self) -> dict:
+        return {
+            "version": INDEX_VERSION,
+            "revision": self.revision,
+            "packages": self.entries,
+        }
+
+    def save(self, path: str):
+        with io.open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_json(), f, sort_keys=True)
+
+    @classmethod
+    def load(cls, path: str, packages_dir: str = "packages"):
+        index = cls(packages_dir)
+        with io.open(path, encoding="utf-8") as f:
+            data = json.load(f)
+
+        if data.get("version") != INDEX_VERSION:
+            raise ValueError("Unsupported repository index version")
+
+        index.revision = data.get("revision")
+        for package, entry in data["packages"].items():
+            index.entries[package] = entry
+            index._link(package, entry, True)
+
+        return index
+
+
+def git_changes(old: str, new: str) -> dict:
+    output = subprocess.run(
+        ["git", "diff", "--no-renames", "--name-status", old, new,
+         "--", "packages"],
+        check=True, capture_output=True, text=True).stdout
+    return parse_diff(output.splitlines())
+
+
+def open_index(path: str, base: str, packages_dir: str) -> RepositoryIndex:
+    """
+    Load the index from path and bring it to the base revision. The index
+    is rolled forward with git when it was saved at another revision and
+    rebuilt from the tree when that is not possible.
+    """
+    index = None
+
+    if path and os.path.exists(path):
+        try:
+            index = RepositoryIndex.load(path, packages_dir)
+        except (ValueError, KeyError) as e:
+            print(f"Ignoring repository index {path}: {e}")
+
+    if index is not None and base and index.revision != base:
+        try:
+            if index.revision is None:
+                raise FileNotFoundError("index has no revision")
+            index.apply_changes(git_changes(index.revision, base))
+        except (subprocess.CalledProcessError, FileNotFoundError):
+            print(f"Can not update repository index from revision "
+                  f"{index.revision}, rebuilding")
+            index = None
+
+    if index is None:
+        index = RepositoryIndex(packages_dir)
+        index.scan()
+
+    index.revision = base
+    return index
+
+
+def main(args):
+    parser = argparse.ArgumentParser(
+        description="KiCad PCM repository cross package validator")
+
+    parser.add_argument(
+        "diff", help="File with \"git diff --name-status\" output")
+    parser.add_argument(
+        "--index", help="Persistent repository index file", default=None)
+    parser.add_argument(
+        "--base", help="Revision the diff starts from", default=None)
+    parser.add_argument(
+        "--head", help="Revision the diff ends at, the index is saved "
+        "for this revision", default=None)
+    parser.add_argument(
+        "--packages", help="Packages directory", default="packages")
+
+    args = parser.parse_args(args)
+
+    with io.open(args.diff, encoding="utf-8") as f:
+        changes = parse_diff(f.read().splitlines())
+
+    index = open_index(args.index, args.base, args.packages)
+
+    # Files in the working tree are already at head, only packages
+    # touched by the diff need to be reloaded and checked.
+    index.apply_changes(changes)
+
+    for package in sorted(changes):
+        for message in index.conflicts(package):
+            verify(False, f"Package {package}: {message}")
+
+    if args.index:
+        index.revision = args.head
+        index.save(args.index)
+
+    failures = get_failures()
+
+    verify_exit(failures == 0, f"{failures} error(s) detected")
+    print("\033[92mValidation passed\033[0m")
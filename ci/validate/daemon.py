@@ -0,0 +1,361 @@
+import argparse
+import contextlib
+import ipaddress
+import json
+import os
+import socket
+import socketserver
+import sys
+import time
+from .util import verify
+from .util.git import close_readers
+from .util.throttle import ThrottledSession
+
+
+DEFAULT_ADDRESS = os.environ.get(
+    "VALIDATE_DAEMON", "/tmp/kicad-pcm-validate.sock")
+ARCHIVE_CACHE = os.path.join(
+    os.path.expanduser("~"), ".cache", "kicad-pcm-archives")
+ARCHIVE_CACHE_SIZE = 2 * 1024 * 1024 * 1024  # 2 Gb
+
+
+def parse_address(address: str):
+    """
+    "host:port" is a TCP address, anything else is a Unix socket path.
+    """
+    host, sep, port = address.rpartition(":")
+    if sep and port.isdigit() and "/" not in address:
+        return (host or "127.0.0.1", int(port))
+    return address
+
+
+def is_loopback(host: str) -> bool:
+    try:
+        infos = socket.getaddrinfo(host, None)
+    except socket.gaierror:
+        return False
+    return all(ipaddress.ip_address(info[4][0]).is_loopback
+               for info in infos)
+
+
+def job_environment(environ: dict = None) -> dict:
+    """
+    VALIDATE_* variables that configure a job, sent along with it so that
+    the daemon runs it as it would run in the client.
+    """
+    environ = os.environ if environ is None else environ
+    return {k: v for k, v in environ.items()
+            if k.startswith("VALIDATE_") and k != "VALIDATE_DAEMON"}
+
+
+@contextlib.contextmanager
+def applied_environment(env: dict):
+    """
+    Replace the VALIDATE_* variables of this process with the ones of a
+    job for its duration.
+    """
+    saved = job_environment()
+    for name in saved:
+        del os.environ[name]
+    os.environ.update(job_environment(env))
+    try:
+        yield
+    finally:
+        for name in job_environment():
+            del os.environ[name]
+        os.environ.update(saved)
+
+
+def connect(address: str) -> socket.socket:
+    address = parse_address(address)
+    if isinstance(address, tuple):
+        return socket.create_connection(address)
+
+    s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        s.connect(address)
+    except OSError:
+        s.close()
+        raise
+    return s
+
+
+def entry_points() -> dict:
+    from . import image, package
+    return {
+        "package": package.main,
+        "image": image.main,
+    }
+
+
+class ClientGone(BaseException):
+    """
+    Raised from output writes when the client disconnected. Derived from
+    BaseException so that validators catching Exception don't swallow it.
+    """
+
+
+class StreamWriter:
+    """
+    File like object that sends everything written as output messages.
+    """
+
+    def __init__(self, send, stream: str):
+        self.send = send
+        self.stream = stream
+
+    def write(self, s):
+        if s:
+            try:
+                self.send(
+                    {"type": "output", "stream": self.stream, "text": s})
+            except OSError:
+                raise ClientGone()
+        return len(s)
+
+    def flush(self):
+        pass
+
+    def isatty(self):
+        return False
+
+
+def prune_cache(cache_dir: str, max_size: int):
+    """
+    Remove least recently used archives until the cache fits in max_size.
+    """
+    if not os.path.isdir(cache_dir):
+        return
+
+    entries = []
+    for name in os.listdir(cache_dir):
+        path = os.path.join(cache_dir, name)
+        st = os.stat(path)
+        entries.append((st.st_atime, st.st_size, path))
+
+    total = sum(e[1] for e in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_size:
+            break
+        os.remove(path)
+        total -= size
+
+
+def run_job(request: dict, send) -> dict:
+    """
+    Run one validation job in this process with its output sent as it is
+    produced. Returns the result message.
+    """
+    start = time.monotonic()
+    job = entry_points().get(request.get("job"))
+
+    if job is None:
+        return {"type": "result", "passed": False, "exit_code": 2,
+                "failures": 0, "messages": [
+                    f"Unknown job {request.get('job')}"], "duration": 0}
+
+    verify.reset_failures()
+    exit_code = 0
+    cwd = os.getcwd()
+
+    try:
+        with contextlib.redirect_stdout(StreamWriter(send, "stdout")), \
+                contextlib.redirect_stderr(StreamWriter(send, "stderr")):
+            os.chdir(request.get("cwd") or cwd)
+            with applied_environment(request.get("env") or {}):
+                job(request.get("args", []))
+    except SystemExit as e:
+        exit_code = e.code if isinstance(e.code, int) else 1
+    finally:
+        os.chdir(cwd)
+        # the next job may see moved branches
+        close_readers()
+
+    return {
+        "type": "result",
+        "passed": exit_code == 0 and verify.get_failures() == 0,
+        "exit_code": exit_code,
+        "failures": verify.get_failures(),
+        "messages": verify.get_messages(),
+        "duration": time.monotonic() - start,
+    }
+
+
+class JobHandler(socketserver.StreamRequestHandler):
+    """
+    Reads one JSON request per line and answers with output messages
+    followed by a result message, all JSON lines.
+    """
+
+    def send(self, message: dict):
+        self.wfile.write(json.dumps(message).encode("utf-8") + b"\n")
+        self.wfile.flush()
+
+    def handle(self):
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+            except ValueError as e:
+                self.send({"type": "result", "passed": False, "exit_code": 2,
+                           "failures": 0, "messages": [str(e)],
+                           "duration": 0})
+                continue
+
+            try:
+                result = run_job(request, self.send)
+            except ClientGone:
+                self.server.after_job()
+                return
+            except Exception as e:
+                result = {"type": "result", "passed": False, "exit_code": 1,
+                          "failures": verify.get_failures(),
+                          "messages": verify.get_messages() + [repr(e)],
+                          "duration": 0}
+
+            self.server.after_job()
+
+            try:
+                self.send(result)
+            except OSError:
+                return
+
+
+class _ServerMixin:
+    archive_cache = None
+    archive_cache_size = ARCHIVE_CACHE_SIZE
+
+    def after_job(self):
+        if self.archive_cache:
+            prune_cache(self.archive_cache, self.archive_cache_size)
+
+
+class UnixServer(_ServerMixin, socketserver.UnixStreamServer):
+    def server_bind(self):
+        # only the owner may submit jobs and read their output
+        umask = os.umask(0o177)
+        try:
+            super().server_bind()
+        finally:
+            os.umask(umask)
+        os.chmod(self.server_address, 0o600)
+
+    def server_close(self):
+        super().server_close()
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(self.server_address)
+
+
+class TCPServer(_ServerMixin, socketserver.TCPServer):
+    allow_reuse_address = True
+
+
+def make_server(address: str):
+    """
+    Create a server, jobs are handled one at a time since validators keep
+    global state.
+    """
+    address = parse_address(address)
+    if isinstance(address, tuple):
+        # jobs read and write anywhere the daemon can, there is no
+        # authentication to let other machines in
+        if not is_loopback(address[0]):
+            raise ValueError(
+                f"Refusing to listen on {address[0]}, only loopback "
+                f"addresses are allowed")
+        return TCPServer(address, JobHandler)
+
+    if os.path.exists(address):
+        os.remove(address)
+    return UnixServer(address, JobHandler)
+
+
+def warm_up(archive_cache: str):
+    from . import package, schema
+
+    package.HTTP = ThrottledSession()
+    package.ARCHIVE_CACHE = archive_cache
+    package.TQDM_NCOL = 80
+
+    if os.path.exists("schema.json"):
+        schema.get_validator(
+            schema.with_key(package.load_json_file("schema.json")))
+
+
+def run_remote(address: str, job: str, args: list, output=None) -> dict:
+    """
+    Send a job to the daemon at address and return its result. Output
+    is passed to output(stream, text) as it arrives, printed by default.
+    Raises OSError if the daemon can't be reached.
+    """
+    if output is None:
+        def output(stream, text):
+            print(text, end="", file=getattr(sys, stream), flush=True)
+
+    with contextlib.closing(connect(address)) as s:
+        request = {"job": job, "args": args, "cwd": os.getcwd(),
+                   "env": job_environment()}
+        s.sendall(json.dumps(request).encode("utf-8") + b"\n")
+
+        with s.makefile("rb") as f:
+            for line in f:
+                message = json.loads(line)
+                if message["type"] == "output":
+                    output(message["stream"], message["text"])
+                elif message["type"] == "result":
+                    return message
+
+    raise OSError("Validation daemon closed connection without a result")
+
+
+def client_main(job: str, args: list, address: str = None):
+    """
+    Run job through the daemon when one is configured and reachable,
+    otherwise run it in this process.
+    """
+    address = address or os.environ.get("VALIDATE_DAEMON")
+
+    if address:
+        try:
+            result = run_remote(address, job, args)
+            sys.exit(0 if result["passed"] else result["exit_code"] or 1)
+        except OSError as e:
+            print(f"Validation daemon at {address} is not available, "
+                  f"running locally\n{e}", file=sys.stderr)
+
+    entry_points()[job](args)
+
+
+def main(args):
+    parser = argparse.ArgumentParser(
+        description="KiCad PCM repository validation daemon")
+
+    parser.add_argument(
+        "--address", help="Unix socket path or loopback host:port to "
+        "listen on",
+        default=DEFAULT_ADDRESS)
+    parser.add_argument(
+        "--archive-cache", help="Directory to keep verified package "
+        "archives in", default=ARCHIVE_CACHE)
+    parser.add_argument(
+        "--archive-cache-size", help="Maximum archive cache size in bytes",
+        type=int, default=ARCHIVE_CACHE_SIZE)
+
+    args = parser.parse_args(args)
+
+    try:
+        server = make_server(args.address)
+    except ValueError as e:
+        parser.error(str(e))
+
+    # requests wait in the listen queue until the daemon is warm
+    warm_up(args.archive_cache)
+    server.archive_cache = args.archive_cache
+    server.archive_cache_size = args.archive_cache_size
+
+    print(f"Listening on {args.address}")
+
+    with server:
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
@@ -1,7 +1,19 @@
 import argparse
+import contextlib
+import functools
+import glob
+import io
 import os
+import struct
+import zlib
+from concurrent.futures import ProcessPoolExecutor
 from PIL import Image, UnidentifiedImageError
-from .util.verify import verify, verify_exit, get_failures
+from .util import limits, metrics
+from .util.verify import (
+    verify, verify_exit, get_failures, get_messages, reset_failures)
+
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
 
 
 def add_image_args(parser):
@@ -11,33 +23,173 @@ def add_image_args(parser):
         "--max-icon-height", help="Maximum height", type=int, default=64)
     parser.add_argument(
         "--max-icon-size", help="Maximum file size", type=int, default=20480)
+    parser.add_argument(
+        "--full-icon-decode", help="Decode the whole image instead of only "
+        "reading the PNG header", action="store_true")
 
 
-def verify_image(args, file, size):
+def read_png_header(file) -> tuple:
+    """
+    Return (width, height) from the IHDR chunk of a PNG file or file
+    object, None if it doesn't start like a valid PNG.
+    """
+    if isinstance(file, (str, os.PathLike)):
+        with io.open(file, "rb") as f:
+            header = f.read(33)
+    else:
+        header = file.read(33)
+
+    # signature, then IHDR: length, type, 13 bytes of data and crc
+    if len(header) != 33 or header[:8] != PNG_SIGNATURE:
+        return None
+
+    length, chunk_type = struct.unpack(">I4s", header[8:16])
+    if length != 13 or chunk_type != b"IHDR":
+        return None
+
+    (crc,) = struct.unpack(">I", header[29:33])
+    if zlib.crc32(header[12:29]) != crc:
+        return None
+
+    width, height = struct.unpack(">II", header[16:24])
+    if width == 0 or height == 0:
+        return None
+
+    return width, height
+
+
+def decode_png(file) -> tuple:
+    """
+    Fully decode the image with PIL and return (width, height). The
+    decoded size counts against the inflated bytes limit.
+    """
+    position = None if isinstance(file, (str, os.PathLike)) else file.tell()
+    dimensions = read_png_header(file)
+    if position is not None:
+        file.seek(position)
+    if dimensions is None:
+        return None
+    limits.charge("inflated", dimensions[0] * dimensions[1] * 4)
+
     try:
-        img = Image.open(file, formats=["PNG"])
-        verify(img.width <= args.max_icon_width, "Image width exceeds maximum")
-        verify(img.height <= args.max_icon_height,
-               "Image height exceeds maximum")
-        verify(size <= args.max_icon_size,
-               "Image file size exceeds maximum")
-        img.close()
-    except UnidentifiedImageError:
+        with Image.open(file, formats=["PNG"]) as img:
+            img.load()
+            return img.width, img.height
+    except (UnidentifiedImageError, OSError, SyntaxError, ValueError):
+        return None
+
+
+def verify_image(args, file, size):
+    if getattr(args, "full_icon_decode", False):
+        dimensions = decode_png(file)
+    else:
+        dimensions = read_png_header(file)
+
+    if dimensions is None:
         verify(False, "Image could not be loaded")
+        return
+
+    width, height = dimensions
+    verify(width <= args.max_icon_width, "Image width exceeds maximum")
+    verify(height <= args.max_icon_height, "Image height exceeds maximum")
+    verify(size <= args.max_icon_size, "Image file size exceeds maximum")
+
+
+def collect_files(paths: list) -> list:
+    """
+    Expand directories to the PNG files in them and glob patterns to the
+    files they match.
+    """
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files += sorted(glob.glob(
+                os.path.join(path, "**", "*.png"), recursive=True))
+        elif glob.escape(path) != path:
+            files += sorted(glob.glob(path, recursive=True))
+        else:
+            files.append(path)
+    return files
+
+
+def check_file(args, path: str) -> list:
+    """
+    Validate one file and return the failure messages.
+    """
+    reset_failures()
+    with contextlib.redirect_stdout(io.StringIO()):
+        try:
+            verify_image(args, path, os.path.getsize(path))
+        except OSError as e:
+            verify(False, f"Image could not be read: {e}")
+    return get_messages()
+
+
+def check_files(args, files: list, jobs: int) -> list:
+    check = functools.partial(check_file, args)
 
+    if jobs <= 1 or len(files) < 2:
+        results = []
+        for f in files:
+            limits.check()
+            results.append(check(f))
+        return results
 
+    chunksize = max(1, len(files) // (jobs * 4))
+    with ProcessPoolExecutor(jobs) as pool:
+        results = list(pool.map(check, files, chunksize=chunksize))
+    limits.check()
+    return results
+
+
+@metrics.run("validate-image")
 def main(args):
     parser = argparse.ArgumentParser(
         description='KiCad PCM repository image validator')
 
-    parser.add_argument("file", help="Path to image file")
+    parser.add_argument(
+        "files", help="Image files, directories or glob patterns", nargs="+")
+    parser.add_argument(
+        "--jobs", help="Number of processes to validate many files with",
+        type=int, default=os.cpu_count() or 1)
     add_image_args(parser)
+    limits.add_limit_args(parser)
+    metrics.add_metrics_args(parser)
 
     args = parser.parse_args(args)
+    metrics.configure(args)
+    try:
+        limits.configure(args.limit)
+    except ValueError as e:
+        parser.error(str(e))
+
+    files = []
+    for path in args.files:
+        found = collect_files([path])
+        # an empty directory or a mistyped pattern must not pass unchecked
+        if not found:
+            verify_exit(False, f"No images found for {path}")
+        files += found
 
-    verify_image(args, args.file, os.path.getsize(args.file))
+    try:
+        with limits.scope("run"):
+            if len(files) == 1:
+                verify_image(args, files[0], os.path.getsize(files[0]))
+                results = None
+            else:
+                results = check_files(args, files, args.jobs)
+    except limits.LimitExceeded as e:
+        verify_exit(False, f"Validation stopped, {e}")
 
-    failures = get_failures()
+    if results is None:
+        failures = get_failures()
+    else:
+        reset_failures()
+        for path, messages in zip(files, results):
+            for message in messages:
+                verify(False, f"{path}: {message}")
+        failures = get_failures()
+        print(f"Checked {len(files)} image(s)")
 
     verify_exit(failures == 0, f"{failures} error(s) detected")
 
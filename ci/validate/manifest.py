@@ -0,0 +1,143 @@
+import argparse
+import io
+import json
+import os
+import re
+import zipfile
+
+
+_SHA256 = re.compile(r"[0-9a-f]{64}")
+
+
+def default_manifests() -> str:
+    """
+    Manifest directory the validator writes to and archive-diff.py reads
+    from when none is given.
+    """
+    return os.environ.get("VALIDATE_MANIFESTS")
+
+
+def manifest_path(manifests: str, sha256: str) -> str:
+    return os.path.join(manifests, f"{sha256}.json")
+
+
+def make_manifest(z: zipfile.ZipFile, sha256: str) -> dict:
+    """
+    File list of an archive: [path, size, crc32, compressed size] of every
+    file, as read from the zip directory.
+    """
+    return {
+        "sha256": sha256,
+        "entries": [
+            [i.filename, i.file_size, i.CRC, i.compress_size]
+            for i in z.infolist() if not i.is_dir()
+        ],
+    }
+
+
+def save_manifest(manifests: str, manifest: dict):
+    os.makedirs(manifests, exist_ok=True)
+    path = manifest_path(manifests, manifest["sha256"])
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with io.open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, separators=(",", ":"))
+    os.replace(tmp, path)
+
+
+def load_manifest(manifests: str, sha256: str) -> dict:
+    path = manifest_path(manifests, sha256)
+    if not os.path.exists(path):
+        return None
+    with io.open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def diff(old: dict, new: dict) -> dict:
+    """
+    Compare two manifests by path. Files count as modified when their
+    size or crc32 differ.
+    """
+    old_entries = {e[0]: e for e in old["entries"]}
+    result = {"added": [], "removed": [], "modified": [], "unchanged": 0}
+
+    for entry in new["entries"]:
+        previous = old_entries.pop(entry[0], None)
+        if previous is None:
+            result["added"].append(entry)
+        elif previous[1:3] != entry[1:3]:
+            result["modified"].append([previous, entry])
+        else:
+            result["unchanged"] += 1
+
+    result["removed"] = list(old_entries.values())
+    return result
+
+
+def version_sha256(packages: str, identifier: str, version: str) -> str:
+    """
+    Resolve a version of a package from the repository to its archive
+    sha256. Anything that looks like a sha256 is returned as is.
+    """
+    if _SHA256.fullmatch(version):
+        return version
+
+    from .package import load_json_file
+
+    metadata = load_json_file(
+        os.path.join(packages, identifier, "metadata.json"))
+    for v in metadata.get("versions", []):
+        if v.get("version") == version:
+            return v.get("download_sha256")
+    return None
+
+
+def print_diff(changes: dict):
+    for path, size, *_ in changes["added"]:
+        print(f"A {path} {size}")
+    for path, *_ in changes["removed"]:
+        print(f"D {path}")
+    for previous, entry in changes["modified"]:
+        print(f"M {entry[0]} {previous[1]} -> {entry[1]}")
+
+    print(f"{len(changes['added'])} added, {len(changes['removed'])} "
+          f"removed, {len(changes['modified'])} modified, "
+          f"{changes['unchanged']} unchanged")
+
+
+def main(args):
+    parser = argparse.ArgumentParser(
+        description="Compare package archive manifests kept by the "
+        "validator, without downloading the archives")
+
+    parser.add_argument("identifier", help="Package identifier")
+    parser.add_argument("old", help="Old version or archive sha256")
+    parser.add_argument("new", help="New version or archive sha256")
+    parser.add_argument(
+        "--manifests", help="Manifest directory the validator wrote to",
+        default=default_manifests())
+    parser.add_argument(
+        "--packages", help="Packages directory", default="packages")
+    parser.add_argument(
+        "--json", help="Print the differences as json", action="store_true")
+
+    args = parser.parse_args(args)
+    if not args.manifests:
+        parser.error("pass --manifests or set VALIDATE_MANIFESTS")
+
+    manifests = []
+    for version in (args.old, args.new):
+        sha = version_sha256(args.packages, args.identifier, version)
+        manifest = load_manifest(args.manifests, sha) if sha else None
+        if manifest is None:
+            print(f"No manifest of {args.identifier} {version}, validate "
+                  f"that version with --manifests {args.manifests} first")
+            raise SystemExit(1)
+        manifests.append(manifest)
+
+    changes = diff(*manifests)
+
+    if args.json:
+        print(json.dumps(changes, indent=4))
+    else:
+        print(f"{args.identifier} {args.old} -> {args.new}")
+        print_diff(changes)
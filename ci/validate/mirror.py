@@ -0,0 +1,142 @@
+import argparse
+import io
+import json
+import os
+from .util.getsha import getsha256
+from .util.throttle import fair_map, host_of
+
+
+URL_MAP = "urls.json"
+
+
+def archive_path(mirror: str, sha256: str) -> str:
+    return os.path.join(mirror, f"{sha256}.zip")
+
+
+def load_url_map(mirror: str) -> dict:
+    path = os.path.join(mirror, URL_MAP)
+    if not os.path.exists(path):
+        return {}
+    with io.open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_url_map(mirror: str, url_map: dict):
+    path = os.path.join(mirror, URL_MAP)
+    tmp = path + ".tmp"
+    with io.open(tmp, "w", encoding="utf-8") as f:
+        json.dump(url_map, f, indent=4, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def rewrite_url(url: str, rewrite_map: dict) -> str:
+    """
+    Replace the longest matching url prefix from rewrite_map.
+    """
+    prefixes = [p for p in rewrite_map if url.startswith(p)]
+    if not prefixes:
+        return url
+    best = max(prefixes, key=len)
+    return rewrite_map[best] + url[len(best):]
+
+
+class Mirror:
+    """
+    sha256 addressed archive store. urls.json maps every mirrored
+    download url to the sha256 of its archive.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.url_map = load_url_map(path)
+
+    def lookup(self, url: str) -> str:
+        """
+        Return path of the mirrored archive for url or None.
+        """
+        sha = self.url_map.get(url)
+        if sha is None:
+            return None
+        path = archive_path(self.path, sha)
+        return path if os.path.exists(path) else None
+
+
+def sync(mirror: str, packages_dir: str, jobs: int,
+         verify: bool = False) -> dict:
+    """
+    Fetch every version archive of every package into the mirror. Archives
+    already in the store are skipped, or rehashed with verify. Returns
+    counts of fetched, present and failed archives.
+    """
+    from .audit import Auditor, targets
+
+    os.makedirs(mirror, exist_ok=True)
+    url_map = load_url_map(mirror)
+    fetcher = Auditor({}, archive_cache=mirror)
+    counts = {"fetched": 0, "present": 0, "failed": 0}
+    failures = []
+
+    todo = []
+    for target in targets(packages_dir):
+        if not target.sha256:
+            continue
+
+        path = archive_path(mirror, target.sha256)
+        if os.path.exists(path):
+            if not verify or getsha256(path) == target.sha256:
+                url_map[target.url] = target.sha256
+                counts["present"] += 1
+                continue
+            os.remove(path)
+
+        todo.append(target)
+
+    def fetch(target):
+        try:
+            return fetcher.fetch_sha(target)
+        except Exception as e:
+            return e
+
+    results = fair_map(fetch, todo, lambda t: host_of(t.url), jobs)
+
+    for target, result in zip(todo, results):
+        if result == target.sha256:
+            url_map[target.url] = target.sha256
+            counts["fetched"] += 1
+        else:
+            counts["failed"] += 1
+            reason = (f"sha256 {result}" if isinstance(result, str)
+                      else str(result))
+            failures.append(f"{target.package} {target.version}: "
+                            f"{target.url} {reason}")
+
+    save_url_map(mirror, url_map)
+
+    for failure in failures:
+        print(failure)
+
+    return counts
+
+
+def main(args):
+    parser = argparse.ArgumentParser(
+        description="KiCad PCM repository archive mirror")
+
+    parser.add_argument("mirror", help="Mirror directory")
+    parser.add_argument(
+        "--packages", help="Packages directory", default="packages")
+    parser.add_argument(
+        "--jobs", help="Number of concurrent downloads", type=int, default=8)
+    parser.add_argument(
+        "--verify", help="Rehash archives already in the mirror",
+        action="store_true")
+
+    args = parser.parse_args(args)
+
+    counts = sync(args.mirror, args.packages, args.jobs, args.verify)
+
+    print(f"Mirror {args.mirror}: {counts['fetched']} fetched, "
+          f"{counts['present']} already present, {counts['failed']} failed")
+
+    if counts["failed"]:
+        raise SystemExit(1)
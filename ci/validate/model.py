@@ -0,0 +1,128 @@
+import zipfile
+import zlib
+
+
+CHUNK_SIZE = 64 * 1024
+# default limit of the decompressed size of one model
+MAX_INFLATED_SIZE = 512 * 1024 * 1024
+# expanded bytes looked at for the file header
+HEAD_SIZE = 256
+
+MODELS = {
+    ".stp.gz": "STEP",
+    ".step.gz": "STEP",
+    ".stpz": "STEP",
+    ".wrz": "VRML",
+}
+HEADERS = {
+    "STEP": b"ISO-10303-21",
+    "VRML": b"#VRML",
+}
+
+GZIP_MAGIC = b"\x1f\x8b"
+UTF8_BOM = b"\xef\xbb\xbf"
+
+
+class ModelError(ValueError):
+    # bytes inflated before the problem was found
+    inflated = 0
+
+
+def model_kind(name: str) -> str:
+    for extension, kind in MODELS.items():
+        if name.endswith(extension):
+            return kind
+    return None
+
+
+def check_head(head: bytes, kind: str):
+    head = head[len(UTF8_BOM):] if head.startswith(UTF8_BOM) else head
+    if not head.lstrip().startswith(HEADERS[kind]):
+        raise ModelError(f"does not contain {kind} data")
+
+
+def check_stream(stream, kind: str, max_size: int = MAX_INFLATED_SIZE,
+                 chunk_size: int = CHUNK_SIZE) -> int:
+    """
+    Inflate a gzip or zlib compressed model chunk by chunk, checking the
+    stream trailers, the header of the model and that it doesn't expand
+    beyond max_size. Memory use doesn't depend on the model size. Returns
+    the expanded size, raises ModelError.
+    """
+    d = zlib.decompressobj(zlib.MAX_WBITS | 32)
+    buf = b""
+    head = b""
+    size = 0
+    compressed = 0
+
+    try:
+        while True:
+            data = stream.read(chunk_size)
+            compressed += len(data)
+            buf += data
+
+            while True:
+                if d.eof:
+                    # gzip files may hold several members
+                    if not buf or (len(buf) < len(GZIP_MAGIC) and data):
+                        break
+                    if not buf.startswith(GZIP_MAGIC):
+                        raise ModelError(
+                            "unexpected data after the compressed stream")
+                    d = zlib.decompressobj(zlib.MAX_WBITS | 16)
+
+                try:
+                    out = d.decompress(buf, chunk_size)
+                except zlib.error as e:
+                    raise ModelError(f"compressed data is corrupt: {e}")
+                buf = d.unused_data if d.eof else d.unconsumed_tail
+
+                size += len(out)
+                if size > max_size:
+                    raise ModelError(f"expands to more than {max_size} bytes")
+                if len(head) < HEAD_SIZE:
+                    head += out[:HEAD_SIZE - len(head)]
+                    if len(head) == HEAD_SIZE:
+                        check_head(head, kind)
+
+                if not d.eof and not buf and len(out) < chunk_size:
+                    break
+
+            if not data:
+                break
+
+        if compressed == 0:
+            raise ModelError("file is empty")
+        if not d.eof or buf:
+            raise ModelError("compressed data is truncated")
+        if len(head) < HEAD_SIZE:
+            check_head(head, kind)
+    except ModelError as e:
+        e.inflated = size
+        raise
+
+    return size
+
+
+def measure_member(z: zipfile.ZipFile, name: str,
+                   max_size: int = MAX_INFLATED_SIZE) -> tuple:
+    """
+    Check a compressed model straight from the zip stream. Returns the
+    problem found or None and the number of bytes inflated.
+    """
+    try:
+        with z.open(name) as f:
+            return None, check_stream(f, model_kind(name), max_size)
+    except ModelError as e:
+        return str(e), e.inflated
+    except (zipfile.BadZipFile, zlib.error, EOFError, OSError) as e:
+        return f"could not be read: {e}", 0
+
+
+def check_member(z: zipfile.ZipFile, name: str,
+                 max_size: int = MAX_INFLATED_SIZE) -> str:
+    """
+    Check a compressed model straight from the zip stream. Returns the
+    problem found or None.
+    """
+    return measure_member(z, name, max_size)[0]
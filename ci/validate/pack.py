@@ -0,0 +1,284 @@
+import argparse
+import collections
+import hashlib
+import io
+import json
+import os
+import pathlib
+from concurrent.futures import ThreadPoolExecutor
+from .package import load_json_file, path_match
+from .util.ziputil import RawZipWriter, compress, deterministic_zipinfo
+
+
+PACKAGE_TYPES = ["plugin", "library", "colortheme"]
+IGNORED_NAMES = ["__pycache__", ".DS_Store", "Thumbs.db"]
+
+_DECODER = json.JSONDecoder()
+
+
+class HashingWriter:
+    """
+    Write-only file wrapper that hashes and counts everything written.
+    It has no seek(), archives are written strictly sequentially.
+    """
+
+    def __init__(self, f):
+        self.f = f
+        self.sha = hashlib.sha256()
+        self.size = 0
+
+    def write(self, data):
+        self.f.write(data)
+        self.sha.update(data)
+        self.size += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.size
+
+    def flush(self):
+        self.f.flush()
+
+
+def is_ignored(name: str) -> bool:
+    return name in IGNORED_NAMES or name.startswith(".")
+
+
+def collect_files(package_type: str, source: str) -> tuple:
+    """
+    Walk source directory and split files into those allowed in a package
+    of the given type and those that are not.
+
+    Returns (sorted [(archive name, path)], sorted [rejected archive name]).
+    """
+    included = []
+    rejected = []
+
+    for root, dirs, files in os.walk(source):
+        dirs[:] = [d for d in dirs if not is_ignored(d)]
+        for name in files:
+            if is_ignored(name):
+                continue
+            path = os.path.join(root, name)
+            arcname = pathlib.PurePath(
+                os.path.relpath(path, source)).as_posix()
+            if path_match(package_type, pathlib.PurePath("/" + arcname)):
+                included.append((arcname, path))
+            else:
+                rejected.append(arcname)
+
+    return sorted(included), sorted(rejected)
+
+
+def compress_file(path: str) -> tuple:
+    with io.open(path, "rb") as f:
+        data = f.read()
+    raw, crc, compress_type = compress(data)
+    return raw, crc, compress_type, len(data)
+
+
+def ordered_map(pool, fn, items, window: int):
+    """
+    Like pool.map() but with at most window tasks in flight so compressed
+    data of the whole package is never held in memory at once.
+    """
+    pending = collections.deque()
+    for item in items:
+        pending.append(pool.submit(fn, item))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def build_package(files: list, output: str, jobs: int = None) -> tuple:
+    """
+    Write files to a deterministic zip archive, compressing members in
+    parallel. zlib releases the GIL so threads scale across cores.
+
+    Returns (sha256, download size, install size).
+    """
+    jobs = jobs or os.cpu_count() or 1
+    install_size = 0
+
+    with io.open(output, "wb") as f, \
+            ThreadPoolExecutor(jobs) as pool:
+        writer = HashingWriter(f)
+        with RawZipWriter(writer) as z:
+            results = ordered_map(
+                pool, compress_file, [path for _, path in files], jobs * 4)
+            for (arcname, _), result in zip(files, results):
+                raw, crc, compress_type, size = result
+                zinfo = deterministic_zipinfo(arcname)
+                zinfo.compress_type = compress_type
+                z.write(zinfo, raw, crc, size)
+                install_size += size
+
+    return writer.sha.hexdigest(), writer.size, install_size
+
+
+def _skip(text: str, i: int) -> int:
+    while i < len(text) and text[i] in " \t\r\n":
+        i += 1
+    return i
+
+
+def _object_members(text: str, i: int) -> list:
+    """
+    Return [(key, key start, key end, value start, value end)] of the
+    members of the json object starting at i.
+    """
+    members = []
+    i = _skip(text, i + 1)
+    while text[i] != "}":
+        key_start = i
+        key, key_end = _DECODER.raw_decode(text, i)
+        value_start = _skip(text, _skip(text, key_end) + 1)
+        _, value_end = _DECODER.raw_decode(text, value_start)
+        members.append((key, key_start, key_end, value_start, value_end))
+        i = _skip(text, value_end)
+        if text[i] == ",":
+            i = _skip(text, i + 1)
+    return members
+
+
+def _array_elements(text: str, i: int) -> list:
+    """
+    Return [(start, end)] of the elements of the json array starting at i.
+    """
+    elements = []
+    i = _skip(text, i + 1)
+    while text[i] != "]":
+        _, end = _DECODER.raw_decode(text, i)
+        elements.append((i, end))
+        i = _skip(text, end)
+        if text[i] == ",":
+            i = _skip(text, i + 1)
+    return elements
+
+
+def _set_members(text: str, members: list, values: dict) -> str:
+    """
+    Replace values of members of an object, new ones are added after the
+    last member with the same separators.
+    """
+    last = members[-1]
+    separator = text[members[-2][4]:last[1]] if len(members) > 1 else ", "
+    colon = text[last[2]:last[3]]
+    present = {m[0]: m for m in members}
+
+    edits = []
+    added = ""
+    for name, value in values.items():
+        dumped = json.dumps(value, ensure_ascii=False)
+        if name in present:
+            edits.append((present[name][3], present[name][4], dumped))
+        else:
+            added += f"{separator}{json.dumps(name)}{colon}{dumped}"
+    if added:
+        edits.append((last[4], last[4], added))
+
+    for start, end, new in sorted(edits, reverse=True):
+        text = text[:start] + new + text[end:]
+    return text
+
+
+def update_metadata(file_name: str, version: str,
+                    sha: str, size: int, install_size: int):
+    """
+    Fill download fields of version in a repository metadata file. Only
+    those values change, the rest of the file keeps its formatting.
+    """
+    # checks the file is valid before it is edited as text
+    load_json_file(file_name)
+
+    with io.open(file_name, encoding="utf-8", newline="") as f:
+        text = f.read()
+
+    root = _object_members(text, _skip(text, 0))
+    versions = [m[3] for m in root if m[0] == "versions"]
+    elements = _array_elements(text, versions[-1]) \
+        if versions and text[versions[-1]] == "[" else []
+
+    for start, _ in elements:
+        if text[start] != "{":
+            continue
+        members = _object_members(text, start)
+        if any(m[0] == "version" and
+               json.loads(text[m[3]:m[4]]) == version for m in members):
+            text = _set_members(text, members, {
+                "download_sha256": sha,
+                "download_size": size,
+                "install_size": install_size,
+            })
+            break
+    else:
+        raise ValueError(f"Version {version} not found in {file_name}")
+
+    with io.open(file_name, "w", encoding="utf-8", newline="") as f:
+        f.write(text)
+
+
+def package_info(source: str) -> tuple:
+    """
+    Return (type, version) from metadata.json in the package source.
+    """
+    metadata = load_json_file(os.path.join(source, "metadata.json"))
+    versions = metadata.get("versions", [])
+    if len(versions) != 1:
+        raise ValueError(
+            "metadata.json in package must have exactly one version")
+    return metadata.get("type"), versions[0].get("version")
+
+
+def main(args):
+    parser = argparse.ArgumentParser(
+        description="KiCad PCM package builder")
+
+    parser.add_argument("source", help="Package source directory")
+    parser.add_argument("output", help="Package archive to write")
+    parser.add_argument(
+        "--type", help="Package type, read from metadata.json in the source "
+        "directory by default", choices=PACKAGE_TYPES, default=None)
+    parser.add_argument(
+        "--metadata", help="Repository metadata file to fill download_sha256, "
+        "download_size and install_size in", default=None)
+    parser.add_argument(
+        "--version", help="Version to update in repository metadata, read "
+        "from metadata.json in the source directory by default",
+        default=None)
+    parser.add_argument(
+        "--jobs", help="Number of compression threads", type=int,
+        default=None)
+
+    args = parser.parse_args(args)
+
+    try:
+        package_type, version = package_info(args.source)
+    except (OSError, ValueError) as e:
+        parser.error(f"Can't read package metadata.json: {e}")
+    package_type = args.type or package_type
+    version = args.version or version
+
+    if package_type not in PACKAGE_TYPES:
+        parser.error(f"Unknown package type {package_type}, use --type")
+
+    files, rejected = collect_files(package_type, args.source)
+
+    for name in rejected:
+        print(f"Skipping \"{name}\", not allowed in {package_type} packages")
+
+    sha, size, install_size = build_package(files, args.output, args.jobs)
+
+    print(f"Package {args.output}\n"
+          f"    files: {len(files)}\n"
+          f"    download_sha256: {sha}\n"
+          f"    download_size: {size}\n"
+          f"    install_size: {install_size}")
+
+    if args.metadata:
+        try:
+            update_metadata(args.metadata, version, sha, size, install_size)
+        except (OSError, ValueError) as e:
+            parser.error(str(e))
+        print(f"Updated version {version} in {args.metadata}")
@@ -1,22 +1,61 @@
 import argparse
-import jsonschema
 import json
 import io
 import os
 import requests
 import pathlib
+import shutil
+import socket
+import time
 import zipfile
 from jsonschema.exceptions import SchemaError, ValidationError
 from requests.exceptions import HTTPError
 from tqdm import tqdm
 from munch import Munch, munchify
-from .util.verify import verify, verify_exit, get_failures
+from .util import limits, metrics
+from .util.verify import verify, verify_exit, get_failures, get_messages
 from .util.getsha import getsha256
+from .util.git import GitError, get_object_reader
+from .util.members import check_members
+from .util.throttle import host_of
 from .image import add_image_args, verify_image
+from .manifest import default_manifests, make_manifest, manifest_path, \
+    save_manifest
+from .mirror import Mirror, rewrite_url
+from .model import MAX_INFLATED_SIZE, measure_member as measure_model, \
+    model_kind
+from .pysyntax import check_members as check_python_members, \
+    python_version
+from .resultcache import open_cache, result_key
+from .schema import validate as validate_schema, with_key
+from .sexpr import check_member as check_sexpr_member, roots_for
 
 
 MAX_DOWNLOAD_SIZE = 100 * 1024 * 1024  # 100 Mb
+# seconds to wait for a connection and for each read of a download
+CONNECT_TIMEOUT = 30
+READ_TIMEOUT = 60
 TQDM_NCOL = None
+# requests module, a requests.Session() to reuse connections or a
+# util.throttle.ThrottledSession() to limit requests per host
+HTTP = requests
+# directory to keep verified package archives in, keyed by sha256
+ARCHIVE_CACHE = None
+# mirror.Mirror that downloads are served from when it has the url
+MIRROR = None
+# {url prefix: replacement} applied to urls not found in the mirror
+REWRITE_MAP = {}
+# resultcache.ResultCache with results of archives validated before
+RESULT_CACHE = None
+# bump when archive checks change so that cached results are not reused
+RULES_VERSION = 4
+# worker processes for checking members of big archives, None for one per
+# cpu
+MEMBER_JOBS = None
+# directory to keep manifests of validated archives in, keyed by sha256
+MANIFESTS = None
+# limit of the decompressed size of one compressed 3D model
+MAX_MODEL_SIZE = MAX_INFLATED_SIZE
 
 ALLOWED_FILES = {
     "all": [
@@ -67,6 +106,11 @@ def load_json_file(file_name: str) -> dict:
         return json.load(f, object_pairs_hook=raise_on_duplicate_keys)
 
 
+def load_json_bytes(data: bytes) -> dict:
+    return json.loads(data.decode("utf-8"),
+                      object_pairs_hook=raise_on_duplicate_keys)
+
+
 def path_match(type: str, purepath: pathlib.PurePath) -> bool:
     for pattern in ALLOWED_FILES["all"]:
         if purepath.match(pattern):
@@ -88,18 +132,64 @@ def max_deviation(a: int, b: int, delta: int) -> bool:
     return abs(a - b) < delta
 
 
+def stop_download(response):
+    """
+    Shut the connection of a streamed response down so that a read
+    blocked on a slow server returns.
+    """
+    try:
+        # shutting down a duplicate of the descriptor ends the connection
+        # for everyone using it
+        sock = socket.fromfd(
+            response.raw.fileno(), socket.AF_INET, socket.SOCK_STREAM)
+    except (AttributeError, OSError, ValueError):
+        return
+    with sock:
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+
 def download_file(url: str, path: str) -> bool:
+    if MIRROR is not None:
+        mirrored = MIRROR.lookup(url)
+        metrics.inc("cache_requests_total", cache="mirror",
+                    result="hit" if mirrored else "miss")
+        if mirrored:
+            # mirrored archives count like downloaded ones
+            size = os.path.getsize(mirrored)
+            if size > MAX_DOWNLOAD_SIZE:
+                verify(False, f"Error downloading url {url}\n"
+                       f"Error: File is too large to download, review "
+                       f"manually")
+                return False
+            limits.charge("download", size)
+            print(f"Copying {url} from mirror {mirrored} to {path}")
+            shutil.copyfile(mirrored, path)
+            return True
+
+    url = rewrite_url(url, REWRITE_MAP)
     print(f"Downloading {url} to {path}")
+    response = None
+    start = time.monotonic()
 
     try:
-        response = requests.get(url, stream=True)
+        left = limits.remaining("time")
+        read_timeout = READ_TIMEOUT if left is None else \
+            max(min(READ_TIMEOUT, left), 1)
+        response = HTTP.get(url, stream=True,
+                            timeout=(CONNECT_TIMEOUT, read_timeout))
         response.raise_for_status()
         total = response.headers.get('Content-length', None)
         if total:
             total = int(total)
         bytes_written = 0
 
-        with io.open(path, "wb") as f:
+        # reads block until a whole chunk arrives, a server sending a byte
+        # at a time would never let the loop check the time
+        with io.open(path, "wb") as f, \
+                limits.deadline(lambda: stop_download(response)):
             progress = tqdm(
                 unit="B",
                 miniters=1,
@@ -112,6 +202,7 @@ def download_file(url: str, path: str) -> bool:
                 f.write(chunk)
                 bytes_written += len(chunk)
                 progress.update(len(chunk))
+                limits.charge("download", len(chunk))
 
                 if bytes_written > MAX_DOWNLOAD_SIZE:
                     progress.close()
@@ -119,19 +210,37 @@ def download_file(url: str, path: str) -> bool:
                         "File is too large to download, review manually")
 
             progress.close()
-
+        # a download cut off at the deadline may end without an error
+        limits.check()
+
+        seconds = time.monotonic() - start
+        host = host_of(url)
+        metrics.inc("download_bytes_total", bytes_written, host=host)
+        metrics.inc("download_seconds_total", seconds, host=host)
+        metrics.observe("phase_seconds", seconds, phase="download")
+        metrics.observe("download_throughput_bytes_per_second",
+                        bytes_written / max(seconds, 1e-6),
+                        metrics.BYTES_PER_SECOND, host=host)
         return True
 
+    except limits.LimitExceeded:
+        raise
     except HTTPError as e:
         verify(
             False,
             f"Error downloading url {url}\n"
             f"HTTP code: {e.response.status_code}")
     except Exception as e:
+        # errors of a download stopped at the deadline are the time limit
+        limits.check()
         verify(
             False,
             f"Error downloading url {url}\n"
             f"Error: {e}")
+    finally:
+        # throttled sessions keep the host slot until the response is closed
+        if response is not None:
+            response.close()
 
     return False
 
@@ -177,18 +286,180 @@ def validate_packaged_metadata(
                f"{msg_prefix} has different platforms field")
 
 
+def cached_archive(version: Munch) -> str:
+    """
+    Return path of the cached archive for version if there is one.
+    """
+    if not ARCHIVE_CACHE or "download_sha256" not in version:
+        return None
+
+    path = os.path.join(ARCHIVE_CACHE, f"{version.download_sha256}.zip")
+    if os.path.exists(path):
+        metrics.inc("cache_requests_total", cache="archive", result="hit")
+        print(f"Using cached {path}")
+        return path
+
+    metrics.inc("cache_requests_total", cache="archive", result="miss")
+    return None
+
+
+def cache_archive(version: Munch, path: str) -> bool:
+    """
+    Move a downloaded archive whose sha256 matched into the cache.
+    """
+    if not ARCHIVE_CACHE or "download_sha256" not in version:
+        return False
+
+    os.makedirs(ARCHIVE_CACHE, exist_ok=True)
+    os.replace(path, os.path.join(
+        ARCHIVE_CACHE, f"{version.download_sha256}.zip"))
+    return True
+
+
+def restore_manifest(version: Munch):
+    """
+    Write the manifest of an archive whose result came from the result
+    cache, from the copy stored with the result or the cached archive.
+    """
+    sha256 = version.download_sha256
+    if not MANIFESTS or os.path.exists(manifest_path(MANIFESTS, sha256)):
+        return
+
+    manifest = RESULT_CACHE.get_manifest(sha256)
+    if manifest is None:
+        cached = cached_archive(version)
+        if not cached:
+            return
+        with zipfile.ZipFile(cached, "r") as z:
+            manifest = make_manifest(z, sha256)
+        RESULT_CACHE.put_manifest(manifest)
+
+    save_manifest(MANIFESTS, manifest)
+
+
+def version_result_key(args: argparse.Namespace,
+                       metadata: Munch, version: Munch) -> str:
+    if RESULT_CACHE is None or "download_sha256" not in version:
+        return None
+
+    return result_key(
+        version.download_sha256, SCHEMA,
+        {"rules": RULES_VERSION, "allowed_files": ALLOWED_FILES,
+         "full_icon_decode": getattr(args, "full_icon_decode", False),
+         "max_model_size": MAX_MODEL_SIZE,
+         "python": list(python_version(version.get("kicad_version")))},
+        metadata.type,
+        (args.max_icon_width, args.max_icon_height, args.max_icon_size),
+        {"identifier": metadata.identifier, "version": version})
+
+
+class LibraryCheck:
+    """
+    Check of library members in worker processes, within what was left of
+    the inflated size and time budgets when the checks started. Returns
+    (problem, bytes inflated by nested model streams) for every member.
+    """
+
+    def __init__(self, max_model_size: int, inflated: float = None,
+                 deadline: float = None):
+        self.max_model_size = max_model_size
+        # shared by the members of one batch, each batch gets its own copy
+        self.inflated = inflated
+        self.deadline = deadline
+
+    def __call__(self, z: zipfile.ZipFile, name: str) -> tuple:
+        if self.deadline is not None and time.time() > self.deadline:
+            return "not checked, out of time", 0
+        if roots_for(name):
+            return check_sexpr_member(z, name), 0
+
+        max_size = self.max_model_size
+        if self.inflated is not None:
+            if self.inflated <= 0:
+                return "not checked, inflated size budget used up", 0
+            max_size = int(min(max_size, self.inflated))
+        problem, inflated = measure_model(z, name, max_size)
+        if self.inflated is not None:
+            self.inflated -= inflated
+        return problem, inflated
+
+
+def charge_library(results: dict):
+    limits.charge("inflated",
+                  sum(inflated for _, inflated in results.values()))
+
+
+def test_archive(z: zipfile.ZipFile) -> str:
+    """
+    ZipFile.testzip() that counts inflated bytes against the limits.
+    Returns name of the first member with a bad crc or None.
+    """
+    for info in z.infolist():
+        try:
+            with z.open(info) as f:
+                data = f.read(1024 * 1024)
+                while data:
+                    limits.charge("inflated", len(data))
+                    data = f.read(1024 * 1024)
+        except zipfile.BadZipFile:
+            return info.filename
+    return None
+
+
+def archive_tmp_path(metadata: Munch, version: Munch) -> str:
+    return os.path.join(
+        "tmp", f"{metadata.identifier}_v{version.version}.zip")
+
+
 def validate_version(args: argparse.Namespace,
                      metadata: Munch, version: Munch):
-    if not os.path.isdir("tmp"):
-        os.mkdir("tmp")
-    path = os.path.join(
-        "tmp", f"{metadata.identifier}_v{version.version}.zip")
+    """
+    Validate the archive of a version within the per version limits. A
+    version over its limits is a failure, run limits stop the run.
+    """
+    try:
+        with limits.scope("version"):
+            check_version(args, metadata, version)
+    except limits.LimitExceeded as e:
+        path = archive_tmp_path(metadata, version)
+        if os.path.exists(path):
+            os.remove(path)
+        if e.scope != "version":
+            raise
+        verify(False, f"Version {version.version}: {e}")
+
+
+def check_version(args: argparse.Namespace,
+                  metadata: Munch, version: Munch):
+    # validations may run in parallel processes
+    os.makedirs("tmp", exist_ok=True)
+    path = archive_tmp_path(metadata, version)
 
     verify(metadata.type == "plugin" or "platforms" not in version,
            f"Version {version.version}: non plugin type packages "
            f"should not have platforms field in version entries")
 
-    if download_file(version.download_url, path):
+    key = version_result_key(args, metadata, version)
+    if key is not None:
+        known = RESULT_CACHE.get(key)
+        metrics.inc("cache_requests_total", cache="result",
+                    result="miss" if known is None else "hit")
+        if known is not None:
+            print(f"Version {version.version}: archive was validated "
+                  f"before, {'passed' if known[0] else 'failed'}")
+            for message in known[1]:
+                verify(False, message)
+            restore_manifest(version)
+            return
+
+    first_message = len(get_messages())
+    sha_matches = False
+    cached = cached_archive(version)
+    if cached:
+        path = cached
+
+    if cached or download_file(version.download_url, path):
+        start = time.monotonic()
         dlsize = os.path.getsize(path)
         instsize = None
 
@@ -198,20 +469,31 @@ def validate_version(args: argparse.Namespace,
                    f"expected {version.download_size}, actual {dlsize}")
 
         if "download_sha256" in version:
-            verify(getsha256(path) == version.download_sha256,
+            sha_matches = getsha256(path) == version.download_sha256
+            verify(sha_matches,
                    f"Version {version.version}: package sha256 does not match")
 
         z = None
         try:
             z = zipfile.ZipFile(path, "r")
-            testzip = z.testzip()
+            metrics.inc("archives_scanned_total")
+            limits.charge("members", len(z.infolist()))
+            testzip = test_archive(z)
             verify(
                 testzip is None,
                 f"Version {version.version}: bad zip file, "
                 f"checksum error on {testzip}")
 
+            if MANIFESTS and sha_matches and testzip is None:
+                manifest = make_manifest(z, version.download_sha256)
+                save_manifest(MANIFESTS, manifest)
+                if RESULT_CACHE is not None:
+                    RESULT_CACHE.put_manifest(manifest)
+
             pkg_has_metadata = False
             instsize = 0
+            library_members = []
+            python_members = []
 
             for entry in z.infolist():
                 if entry.is_dir():
@@ -225,6 +507,17 @@ def validate_version(args: argparse.Namespace,
                     f"extra file \"{entry.filename}\"")
 
                 instsize += entry.file_size
+                metrics.inc("archive_members_total")
+                limits.check()
+
+                if metadata.type == "library" and (
+                        roots_for(entry.filename) or
+                        model_kind(entry.filename)):
+                    library_members.append(entry)
+
+                if metadata.type == "plugin" and \
+                        entry.filename.endswith(".py"):
+                    python_members.append(entry)
 
                 if entry.filename == "resources/icon.png":
                     iconbytes = z.read(entry)
@@ -238,7 +531,7 @@ def validate_version(args: argparse.Namespace,
                             io.BytesIO(metadatabytes),
                             object_pairs_hook=raise_on_duplicate_keys)
                         global SCHEMA
-                        jsonschema.validate(metadata, SCHEMA)
+                        validate_schema(metadata, SCHEMA)
                         pkg_metadata = munchify(pkg_metadata_json)
                         validate_packaged_metadata(
                             pkg_metadata, metadata, version)
@@ -255,20 +548,61 @@ def validate_version(args: argparse.Namespace,
             verify(pkg_has_metadata,
                    f"Version {version.version}: package has no metadata.json")
 
+            metrics.inc("members_checked_total", len(library_members),
+                        check="library")
+            metrics.inc("members_checked_total", len(python_members),
+                        check="python")
+            # nested model streams may inflate only what is left, workers
+            # are other processes and get a wall clock deadline
+            left = limits.remaining("time")
+            check = LibraryCheck(
+                MAX_MODEL_SIZE, limits.remaining("inflated"),
+                None if left is None else time.time() + left)
+            for name, (problem, _) in check_members(
+                    z, library_members, check, MEMBER_JOBS,
+                    progress=charge_library):
+                verify(problem is None,
+                       f"Version {version.version}: file \"{name}\" is "
+                       f"malformed, {problem}")
+
+            for name, problem in check_python_members(
+                    z, python_members, RESULT_CACHE, MEMBER_JOBS,
+                    python_version(version.get("kicad_version"))):
+                verify(problem is None,
+                       f"Version {version.version}: python file \"{name}\" "
+                       f"does not parse, {problem}")
+
+            limits.check()
+
         except zipfile.BadZipFile:
             verify(False, f"Version {version.version}: bad zip file")
-
-        if z:
-            z.close()
+        finally:
+            if z:
+                z.close()
 
         if "install_size" in version and instsize is not None:
             verify(max_deviation(version.install_size, instsize, 1024),
                    f"Version {version.version}: install size does not match, "
                    f"expected {version.install_size}, actual {instsize}")
+
+        metrics.observe("phase_seconds", time.monotonic() - start,
+                        phase="archive_checks")
     else:
         verify(False, f"Version {version.version}: download failed")
 
-    if os.path.exists(path):
+    # only results of the archive the key names are kept
+    if key is not None and sha_matches:
+        findings = get_messages()[first_message:]
+        RESULT_CACHE.put(key, not findings, findings)
+
+    if cached:
+        # a cached archive that doesn't match its name is dropped
+        if not sha_matches:
+            os.remove(path)
+        return
+
+    if os.path.exists(path) and not (sha_matches and
+                                     cache_archive(version, path)):
         os.remove(path)
 
 
@@ -341,9 +675,29 @@ def validate_metadata(args: argparse.Namespace,
                     new_versions.pop(old.version)
 
     for version in new_versions.values():
-        validate_version(args, metadata, version)
+        # when sharded only the versions assigned to this shard are fetched
+        only_version = getattr(args, "only_version", None)
+        if only_version is None or version.version in only_version:
+            validate_version(args, metadata, version)
 
 
+def versions_to_download(metadata: dict, oldmetadata: dict) -> list:
+    """
+    Return version entries validate_metadata() downloads: new versions and
+    versions whose download url changed.
+    """
+    old_urls = {}
+    if oldmetadata:
+        old_urls = {v.get("version"): v.get("download_url")
+                    for v in oldmetadata.get("versions", [])}
+
+    return [v for v in metadata.get("versions", [])
+            if v.get("version") not in old_urls or
+            ("download_url" in v and
+             v["download_url"] != old_urls[v.get("version")])]
+
+
+@metrics.run("validate-package")
 def main(args):
     parser = argparse.ArgumentParser(
         description='KiCad PCM repository package validator')
@@ -353,13 +707,54 @@ def main(args):
     parser.add_argument(
         "oldmetadata", help="Path to previous version of the metadata",
         nargs='?', default=None)
+    parser.add_argument(
+        "--old-rev", help="Git revision to read previous version of the "
+        "metadata from, instead of the oldmetadata file", default=None)
+    parser.add_argument(
+        "--only-version", help="Download and check only this version, can "
+        "be given multiple times", action="append", default=None)
+    parser.add_argument(
+        "--mirror", help="Archive mirror directory made by mirror-sync.py",
+        default=os.environ.get("VALIDATE_MIRROR"))
+    parser.add_argument(
+        "--rewrite-map", help="JSON file mapping download url prefixes to "
+        "replacements", default=None)
+    parser.add_argument(
+        "--result-cache", help="SQLite file with results of archives "
+        "validated before", default=os.environ.get("VALIDATE_RESULT_CACHE"))
+    parser.add_argument(
+        "--manifests", help="Directory to write manifests of validated "
+        "archives to, see archive-diff.py",
+        default=default_manifests())
+    parser.add_argument(
+        "--member-jobs", help="Worker processes for checking files of big "
+        "archives, default is one per cpu", type=int, default=None)
+    parser.add_argument(
+        "--max-model-size", help="Maximum decompressed size of a compressed "
+        "3D model", type=int, default=MAX_INFLATED_SIZE)
 
     add_image_args(parser)
+    limits.add_limit_args(parser)
+    metrics.add_metrics_args(parser)
 
     args = parser.parse_args(args)
-
-    global SCHEMA
-    SCHEMA = load_json_file("schema.json")
+    metrics.configure(args)
+    try:
+        limits.configure(args.limit)
+    except ValueError as e:
+        parser.error(str(e))
+
+    global SCHEMA, MIRROR, REWRITE_MAP, RESULT_CACHE, MEMBER_JOBS, \
+        MAX_MODEL_SIZE, MANIFESTS
+    SCHEMA = with_key(load_json_file("schema.json"))
+    MIRROR = Mirror(args.mirror) if args.mirror else None
+    REWRITE_MAP = load_json_file(args.rewrite_map) if args.rewrite_map \
+        else {}
+    RESULT_CACHE = open_cache(args.result_cache) if args.result_cache \
+        else None
+    MEMBER_JOBS = args.member_jobs
+    MAX_MODEL_SIZE = args.max_model_size
+    MANIFESTS = args.manifests
 
     metadata = {}
     try:
@@ -371,19 +766,31 @@ def main(args):
 
     if args.oldmetadata:
         oldmetadata = load_json_file(args.oldmetadata)
+    elif args.old_rev:
+        try:
+            data = get_object_reader().read(args.old_rev, args.metadata)
+        except GitError as e:
+            verify_exit(False, f"Can't read previous metadata: {e}")
+        # not present at that revision means the package is new
+        if data is not None:
+            oldmetadata = load_json_bytes(data)
 
     try:
-        jsonschema.validate(metadata, SCHEMA)
+        validate_schema(metadata, SCHEMA)
     except ValidationError as e:
         verify_exit(False, f"Metadata doesn't comply with schema\n{e.message}")
     except SchemaError as e:
         verify_exit(False, f"Schema is invalid\n{e.message}")
 
-    validate_metadata(
-        args,
-        munchify(metadata),
-        munchify(oldmetadata),
-        args.identifier)
+    try:
+        with limits.scope("run"):
+            validate_metadata(
+                args,
+                munchify(metadata),
+                munchify(oldmetadata),
+                args.identifier)
+    except limits.LimitExceeded as e:
+        verify_exit(False, f"Validation stopped, {e}")
 
     failures = get_failures()
 
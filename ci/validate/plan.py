@@ -0,0 +1,206 @@
+import argparse
+import io
+import os
+import re
+from dataclasses import dataclass, field
+from .util import metrics
+
+
+PACKAGE_FILE_RE = re.compile(r"^packages/([^/]+)/(.+)$")
+
+
+@dataclass
+class PackageChange:
+    package: str
+    metadata: str
+
+
+@dataclass
+class Plan:
+    """
+    Work derived from one pass over the "git diff --name-status" output.
+    """
+    # packages whose metadata.json was added
+    new_packages: list = field(default_factory=list)
+    # packages whose metadata.json was modified
+    changed_packages: list = field(default_factory=list)
+    # added or modified icon.png files
+    icons: list = field(default_factory=list)
+    # packages with a changed icon and unchanged metadata
+    icon_only: list = field(default_factory=list)
+    # metadata.json of every package that goes into the built repository
+    rebuild: list = field(default_factory=list)
+    # problems that fail validation before any package is looked at
+    errors: list = field(default_factory=list)
+
+
+def parse_line(line: str) -> tuple:
+    """
+    Split a "git diff --name-status" line into (status letter, paths).
+    Renames and copies (R100, C75) have the old and the new path, other
+    statuses one path. Fields are tab separated so paths may contain
+    spaces, lines separated by spaces are accepted for paths without them.
+    Returns (None, []) for other lines.
+    """
+    line = line.rstrip("\r\n")
+    if "\t" in line:
+        parts = line.split("\t")
+    else:
+        parts = line.split()
+
+    status = parts[0][:1] if parts else None
+    paths = parts[1:]
+
+    if status in ("R", "C") and len(paths) == 2:
+        return status, paths
+    if status and len(paths) == 1:
+        return status, paths
+    if status and paths and "\t" not in line:
+        # space separated path with spaces
+        return status, [line.strip().split(None, 1)[1]]
+    return None, []
+
+
+def make_plan(lines: list) -> Plan:
+    plan = Plan()
+    metadata = {}
+    icons = {}
+
+    for line in lines:
+        status, paths = parse_line(line)
+        if not status:
+            continue
+        path = paths[-1]
+
+        match = PACKAGE_FILE_RE.match(path)
+        if not match:
+            continue
+
+        package, name = match.groups()
+
+        if " " in package:
+            plan.errors.append(
+                f"Spaces are not allowed in package names: {package}")
+            continue
+
+        if name == "metadata.json":
+            if status == "D":
+                plan.errors.append(
+                    "Deleting package metadata files is not allowed, "
+                    "to delist a package remove all versions.")
+            elif status in "AM":
+                metadata[package] = (status, path)
+        elif name == "icon.png" and status in "AM":
+            icons[package] = path
+
+    for package, (status, path) in sorted(metadata.items()):
+        change = PackageChange(package, path)
+        if status == "A":
+            plan.new_packages.append(change)
+        else:
+            plan.changed_packages.append(change)
+
+    plan.icons = [icons[p] for p in sorted(icons)]
+    plan.icon_only = sorted(p for p in icons if p not in metadata)
+    plan.rebuild = [
+        f"packages/{p}/metadata.json"
+        for p in sorted(set(metadata) | set(icons))]
+
+    return plan
+
+
+def load_plan(file_name: str) -> Plan:
+    with io.open(file_name, encoding="utf-8") as f:
+        return make_plan(f.read().splitlines())
+
+
+def execute_validate(plan: Plan, merge_base: str, workers: int = 1,
+                     budget=None) -> bool:
+    from . import schedule, shard
+
+    for error in plan.errors:
+        print(error)
+    if plan.errors:
+        return False
+
+    jobs = schedule.make_jobs(shard.work_items(plan, merge_base), merge_base)
+
+    if not schedule.check_budget(jobs, workers, budget):
+        print("Validation run refused, it exceeds the budget")
+        return False
+
+    results = schedule.run_jobs(jobs, workers, fail_fast=True)
+
+    for result in results:
+        if not result["passed"]:
+            what = "icon for package" if result["job"] == "image" else \
+                "package"
+            print(f"Validation of {what} {result['package']} failed")
+            return False
+
+    print("Done")
+    return True
+
+
+def execute_build(plan: Plan, previous_resources: str,
+                  repository_args: list) -> bool:
+    from . import repository, resources
+
+    if not plan.rebuild:
+        print("No changed packages")
+        return True
+
+    resources_args = list(plan.rebuild)
+    if previous_resources and os.path.exists(previous_resources):
+        resources_args += ["--previous", previous_resources]
+    resources.main(resources_args)
+
+    print("Generating repo with following packages:")
+    for path in plan.rebuild:
+        print(path.split("/")[1])
+    # options like --kicad-versions take several values, metadata paths
+    # after them would be taken as more values
+    repository.main(plan.rebuild + repository_args)
+
+    return True
+
+
+@metrics.run("run-plan")
+def main(args):
+    from .schedule import add_budget_args, budget_from_args
+
+    parser = argparse.ArgumentParser(
+        description="KiCad PCM repository CI change planner")
+
+    parser.add_argument(
+        "command", help="Stage to run", choices=["validate", "build", "show"])
+    parser.add_argument(
+        "diff", help="File with \"git diff --name-status\" output")
+    parser.add_argument(
+        "--merge-base", help="Revision to read previous metadata from",
+        default=os.environ.get("MERGE_BASE_SHA"))
+    parser.add_argument(
+        "--previous-resources", help="Previously built resources archive",
+        default=os.environ.get("PREVIOUS_RESOURCES"))
+
+    add_budget_args(parser)
+    metrics.add_metrics_args(parser)
+
+    # anything else is passed on to the repository builder
+    args, repository_args = parser.parse_known_args(args)
+    metrics.configure(args)
+
+    plan = load_plan(args.diff)
+
+    if args.command == "show":
+        print(plan)
+        return
+
+    if args.command == "validate":
+        ok = execute_validate(plan, args.merge_base, args.jobs,
+                              budget_from_args(args))
+    else:
+        ok = execute_build(plan, args.previous_resources, repository_args)
+
+    if not ok:
+        raise SystemExit(1)
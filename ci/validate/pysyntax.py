@@ -0,0 +1,121 @@
+import ast
+import collections
+import functools
+import zipfile
+import zlib
+from .resultcache import digest
+from .util import members, metrics
+from .versions import kicad_series
+
+
+# oldest python plugins of a KiCad series may run on, KiCad 6 ships 3.8
+# on Windows and macOS and distributions of that time have it too.
+# Sources are parsed by the python running the checks with feature_version
+# set to that version. This is best effort: the parser rejects most newer
+# syntax for older versions, but not all of it. On 3.12 and later newer
+# f-string syntax passes for example.
+PYTHON_VERSIONS = {(6, 0): (3, 8)}
+MIN_PYTHON = (3, 8)
+
+# results of sources parsed by this process by source_key(), least
+# recently used first
+_KNOWN = collections.OrderedDict()
+MAX_KNOWN = 10000
+
+
+def python_version(kicad_version: str) -> tuple:
+    """
+    Python version to check plugins requiring kicad_version for.
+    """
+    try:
+        series = kicad_series(kicad_version)
+    except (AttributeError, ValueError):
+        return MIN_PYTHON
+    known = [v for s, v in PYTHON_VERSIONS.items() if s <= series]
+    return max(known) if known else MIN_PYTHON
+
+
+def source_key(crc: int, size: int, python: tuple = MIN_PYTHON) -> str:
+    """
+    Key of a parse result. Zip members carry the crc32 and size of their
+    content, so unchanged files are recognized without reading them.
+    """
+    return digest(["python-syntax", crc, size, list(python)])
+
+
+def remember(key: str, problem: str):
+    _KNOWN[key] = problem
+    _KNOWN.move_to_end(key)
+    while len(_KNOWN) > MAX_KNOWN:
+        _KNOWN.popitem(last=False)
+
+
+def check_source(data: bytes, name: str, python: tuple = MIN_PYTHON) -> str:
+    """
+    Parse python source, rejecting syntax newer than the python version
+    where the parser can tell, and return the syntax error found or None.
+    """
+    try:
+        ast.parse(data, name, feature_version=python)
+    except SyntaxError as e:
+        if e.lineno:
+            return f"line {e.lineno}: {e.msg}"
+        return e.msg
+    except ValueError as e:
+        # null bytes in the source
+        return str(e)
+    return None
+
+
+def parse_member(z: zipfile.ZipFile, name: str,
+                 python: tuple = MIN_PYTHON) -> tuple:
+    """
+    Returns (problem, parsed), parsed is False when the member could not
+    be read and the result says nothing about its content.
+    """
+    try:
+        data = z.read(name)
+    except (zipfile.BadZipFile, zlib.error, EOFError, OSError) as e:
+        return f"could not be read: {e}", False
+    return check_source(data, name, python), True
+
+
+def check_members(z: zipfile.ZipFile, infos: list, cache=None,
+                  jobs: int = None, python: tuple = MIN_PYTHON) -> list:
+    """
+    Parse python members of an open archive as check_source() does and
+    return [(name, problem)] in the order of infos. Only sources not seen
+    before by this process or in the resultcache.ResultCache are parsed,
+    in parallel for big archives.
+    """
+    results = {}
+    todo = []
+
+    for info in infos:
+        key = source_key(info.CRC, info.file_size, python)
+        if key not in _KNOWN and cache is not None:
+            known = cache.get(key)
+            if known is not None:
+                remember(key, known[1][0] if known[1] else None)
+        if key in _KNOWN:
+            _KNOWN.move_to_end(key)
+            results[info.filename] = _KNOWN[key]
+            metrics.inc("cache_requests_total", cache="python_syntax",
+                        result="hit")
+        else:
+            todo.append(info)
+            metrics.inc("cache_requests_total", cache="python_syntax",
+                        result="miss")
+
+    parsed = members.check_members(
+        z, todo, functools.partial(parse_member, python=python), jobs)
+    for info, (name, (problem, readable)) in zip(todo, parsed):
+        results[name] = problem
+        if not readable:
+            continue
+        key = source_key(info.CRC, info.file_size, python)
+        remember(key, problem)
+        if cache is not None:
+            cache.put(key, problem is None, [problem] if problem else [])
+
+    return [(info.filename, results[info.filename]) for info in infos]
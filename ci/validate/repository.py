@@ -0,0 +1,114 @@
+import argparse
+import io
+import json
+import os
+from datetime import datetime
+from .binindex import dumps as dump_binary
+from .search import build_index as build_search_index
+from .util import metrics
+from .util.getsha import getsha256
+from .versions import KICAD_VERSIONS, latest_versions
+
+
+def load_json_file(file_name: str) -> dict:
+    with io.open(file_name, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def update(json, file, artifacts_url):
+    mtime = os.path.getmtime(file)
+    dt = datetime.fromtimestamp(mtime)
+    sha = getsha256(file)
+
+    json["url"] = artifacts_url + "/" + os.path.basename(file)
+    json["sha256"] = sha
+    json["update_timestamp"] = int(mtime)
+    json["update_time_utc"] = dt.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def record_artifact(path: str):
+    metrics.set_gauge("artifact_bytes", os.path.getsize(path),
+                      file=os.path.basename(path))
+
+
+@metrics.run("build-repository")
+def main(args):
+    parser = argparse.ArgumentParser(
+        description="KiCad PCM test repository builder")
+
+    parser.add_argument("metadata", help="Package metadata file", nargs="*")
+    parser.add_argument(
+        "--binary", help="Also write packages.bin, a binary index of "
+        "packages.json for looking packages up without parsing all of it",
+        action="store_true")
+    parser.add_argument(
+        "--latest", help="Also write latest.json, a table of the best "
+        "version of each package per KiCad version and platform",
+        action="store_true")
+    parser.add_argument(
+        "--kicad-versions", help="KiCad major.minor versions for the "
+        "latest.json table", nargs="+", default=KICAD_VERSIONS)
+    parser.add_argument(
+        "--search", help="Also write search.json, an inverted index of "
+        "package names, descriptions and tags", action="store_true")
+    metrics.add_metrics_args(parser)
+
+    args = parser.parse_args(args)
+    metrics.configure(args)
+
+    artifacts_url = os.environ["CI_JOB_URL"] + "/artifacts/raw/artifacts"
+    job_id = os.environ["CI_JOB_ID"]
+
+    packages = []
+
+    with metrics.timer("load_metadata"):
+        for file in args.metadata:
+            packages.append(load_json_file(file))
+    metrics.set_gauge("packages", len(packages))
+
+    with metrics.timer("packages_json"), \
+            io.open("artifacts/packages.json", "w", encoding="utf-8") as f:
+        json.dump({"packages": packages}, f, indent=4)
+    record_artifact("artifacts/packages.json")
+
+    if args.binary:
+        with metrics.timer("packages_bin"), \
+                io.open("artifacts/packages.bin", "wb") as f:
+            f.write(dump_binary({"packages": packages}))
+        record_artifact("artifacts/packages.bin")
+
+    if args.latest:
+        with metrics.timer("latest_json"), \
+                io.open("artifacts/latest.json", "w", encoding="utf-8") as f:
+            json.dump(latest_versions(packages, args.kicad_versions), f,
+                      indent=4)
+        record_artifact("artifacts/latest.json")
+
+    if args.search:
+        with metrics.timer("search_json"), \
+                io.open("artifacts/search.json", "w", encoding="utf-8") as f:
+            json.dump(build_search_index(packages), f, separators=(",", ":"))
+        record_artifact("artifacts/search.json")
+
+    repo = load_json_file("ci/repository.json")
+    repo["name"] = "Test PCM repository for ci job {}".format(job_id)
+    update(repo["packages"], "artifacts/packages.json", artifacts_url)
+
+    if os.path.exists("artifacts/resources.zip"):
+        update(repo["resources"], "artifacts/resources.zip", artifacts_url)
+    else:
+        del repo["resources"]
+
+    with io.open("artifacts/repository.json", "w", encoding="utf-8") as f:
+        json.dump(repo, f, indent=4)
+
+    print(f"Repository should be available at {artifacts_url}/repository.json")
+
+    if args.binary:
+        print(f"Binary package index is at {artifacts_url}/packages.bin")
+
+    if args.latest:
+        print(f"Latest versions table is at {artifacts_url}/latest.json")
+
+    if args.search:
+        print(f"Search index is at {artifacts_url}/search.json")
@@ -0,0 +1,139 @@
+import argparse
+import hashlib
+import io
+import json
+import os
+import zipfile
+from .util.getsha import getsha256
+from .util.ziputil import (
+    RawZipWriter, compress, deterministic_zipinfo, read_raw)
+
+
+ICON_NAME = "icon.png"
+
+
+def icon_entries(paths: list) -> dict:
+    """
+    Map archive names to icon files for every package directory referenced
+    by paths. Both metadata.json and icon.png paths are accepted so the
+    changed metadata and changed icon lists can be passed in as is.
+    """
+    entries = {}
+
+    for path in paths:
+        package_dir = os.path.dirname(path)
+        icon = os.path.join(package_dir, ICON_NAME)
+        if os.path.isfile(icon):
+            name = os.path.basename(package_dir) + "/" + ICON_NAME
+            entries[name] = icon
+
+    return dict(sorted(entries.items()))
+
+
+def manifest_path(archive: str) -> str:
+    # hashes of the icons for the next build to reuse them, clients only
+    # see the archive through repository.json
+    return os.path.splitext(archive)[0] + ".json"
+
+
+def load_manifest(path: str) -> dict:
+    if not os.path.exists(path):
+        return {}
+
+    with io.open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def index_archive(z: zipfile.ZipFile, manifest: dict) -> dict:
+    """
+    Index archive members by sha256 of their content. Hashes are taken from
+    the manifest when it has them, otherwise the member is inflated.
+    """
+    index = {}
+
+    for info in z.infolist():
+        if info.is_dir():
+            continue
+
+        sha = manifest.get(info.filename)
+        if sha is None:
+            sha = hashlib.sha256(z.read(info)).hexdigest()
+
+        index.setdefault(sha, info)
+
+    return index
+
+
+def build_resources(icons: dict, output: str,
+                    previous: str = None) -> tuple:
+    """
+    Write icons to output archive in sorted order with fixed timestamps.
+    Icons whose content is already present in the previous archive are
+    copied over without recompressing.
+
+    Returns (manifest, reused count).
+    """
+    manifest = {}
+    reused = 0
+    prev = None
+    prev_index = {}
+
+    if previous and os.path.exists(previous):
+        prev = io.open(previous, "rb")
+        with zipfile.ZipFile(prev) as z:
+            prev_index = index_archive(
+                z, load_manifest(manifest_path(previous)))
+
+    try:
+        with io.open(output, "wb") as f, RawZipWriter(f) as z:
+            for name, path in icons.items():
+                sha = getsha256(path)
+                manifest[name] = sha
+                zinfo = deterministic_zipinfo(name)
+
+                if sha in prev_index:
+                    info = prev_index[sha]
+                    zinfo.compress_type = info.compress_type
+                    z.write(zinfo, read_raw(prev, info), info.CRC,
+                            info.file_size)
+                    reused += 1
+                else:
+                    with io.open(path, "rb") as icon:
+                        data = icon.read()
+                    raw, crc, zinfo.compress_type = compress(data)
+                    z.write(zinfo, raw, crc, len(data))
+    finally:
+        if prev:
+            prev.close()
+
+    with io.open(manifest_path(output), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=4, sort_keys=True)
+
+    return manifest, reused
+
+
+def main(args):
+    parser = argparse.ArgumentParser(
+        description="KiCad PCM repository resources builder")
+
+    parser.add_argument(
+        "files", help="Package metadata or icon files", nargs="*")
+    parser.add_argument(
+        "--output", help="Resources archive to write",
+        default="artifacts/resources.zip")
+    parser.add_argument(
+        "--previous", help="Previously built resources archive, unchanged "
+        "icons are copied from it without recompressing", default=None)
+
+    args = parser.parse_args(args)
+
+    icons = icon_entries(args.files)
+
+    if not icons:
+        print("No icons to pack")
+        return
+
+    manifest, reused = build_resources(icons, args.output, args.previous)
+
+    print(f"Packed {len(manifest)} icon(s) into {args.output}, "
+          f"{reused} reused from previous archive")
@@ -0,0 +1,93 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+def digest(value) -> str:
+    return hashlib.sha256(
+        json.dumps(value, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def result_key(sha256: str, schema: dict, rules: dict, package_type: str,
+               image_limits: tuple, entry: dict) -> str:
+    """
+    Key of an archive validation result. Everything the archive checks
+    depend on is part of it: the archive itself, schema, allowed file
+    rules, package type, icon limits and the metadata entry the archive
+    is compared against.
+    """
+    return digest([sha256, digest(schema), digest(rules), package_type,
+                   list(image_limits), digest(entry)])
+
+
+class ResultCache:
+    """
+    SQLite store of archive validation results. Findings are the verify()
+    messages the checks produced, empty for archives that passed.
+    """
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self.db:
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                "key TEXT PRIMARY KEY, passed INTEGER, findings TEXT, "
+                "created REAL)")
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS manifests ("
+                "sha256 TEXT PRIMARY KEY, manifest TEXT)")
+
+    def get(self, key: str) -> tuple:
+        """
+        Return (passed, findings) or None if the result is not known.
+        """
+        with self.lock:
+            row = self.db.execute(
+                "SELECT passed, findings FROM results WHERE key = ?",
+                (key,)).fetchone()
+        if row is None:
+            return None
+        return bool(row[0]), json.loads(row[1])
+
+    def put(self, key: str, passed: bool, findings: list):
+        with self.lock, self.db:
+            self.db.execute(
+                "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)",
+                (key, int(passed), json.dumps(findings), time.time()))
+
+    def get_manifest(self, sha256: str) -> dict:
+        """
+        Return the manifest of an archive validated before or None.
+        """
+        with self.lock:
+            row = self.db.execute(
+                "SELECT manifest FROM manifests WHERE sha256 = ?",
+                (sha256,)).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+    def put_manifest(self, manifest: dict):
+        with self.lock, self.db:
+            self.db.execute(
+                "INSERT OR REPLACE INTO manifests VALUES (?, ?)",
+                (manifest["sha256"], json.dumps(manifest)))
+
+    def close(self):
+        self.db.close()
+
+
+_CACHES = {}
+
+
+def open_cache(path: str) -> ResultCache:
+    """
+    Return the cache at path, opened once per process.
+    """
+    path = os.path.abspath(path)
+    if path not in _CACHES:
+        _CACHES[path] = ResultCache(path)
+    return _CACHES[path]
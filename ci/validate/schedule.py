@@ -0,0 +1,202 @@
+import contextlib
+import heapq
+import io
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+from . import shard
+from .util import metrics
+from .util.throttle import LimiterManager, shared_limiter
+
+
+# rough throughput figures used for the time estimate
+DOWNLOAD_RATE = 5 * 1024 * 1024  # bytes per second
+INFLATE_RATE = 50 * 1024 * 1024  # bytes per second
+JOB_OVERHEAD = 0.5  # seconds
+
+MIB = 1024 * 1024
+
+
+@dataclass
+class Job:
+    job: str
+    package: str
+    args: list
+    download_size: int = 0
+    install_size: int = 0
+
+    def seconds(self) -> float:
+        return (JOB_OVERHEAD + self.download_size / DOWNLOAD_RATE +
+                self.install_size / INFLATE_RATE)
+
+
+@dataclass
+class Estimate:
+    jobs: int
+    download_size: int
+    install_size: int
+    # wall time with the given number of parallel workers
+    seconds: float
+    workers: int
+
+    def __str__(self):
+        return (f"{self.jobs} job(s), download {self.download_size / MIB:.1f}"
+                f" MiB, install {self.install_size / MIB:.1f} MiB, about "
+                f"{self.seconds:.0f}s with {self.workers} worker(s)")
+
+
+@dataclass
+class Budget:
+    download_size: int = None
+    install_size: int = None
+    seconds: float = None
+    # "warn" or "refuse"
+    action: str = "refuse"
+
+    def exceeded(self, estimate: Estimate) -> list:
+        problems = []
+        if (self.download_size is not None and
+                estimate.download_size > self.download_size):
+            problems.append(f"download size {estimate.download_size} "
+                            f"exceeds budget of {self.download_size}")
+        if (self.install_size is not None and
+                estimate.install_size > self.install_size):
+            problems.append(f"install size {estimate.install_size} "
+                            f"exceeds budget of {self.install_size}")
+        if self.seconds is not None and estimate.seconds > self.seconds:
+            problems.append(f"estimated time {estimate.seconds:.0f}s "
+                            f"exceeds budget of {self.seconds:.0f}s")
+        return problems
+
+
+def make_jobs(items: list, merge_base: str) -> list:
+    """
+    Group items into validator jobs with their declared sizes and order
+    them largest first. Equal jobs keep plan order.
+    """
+    sizes = {}
+    for item in items:
+        key = (item.kind, item.package)
+        download, install = sizes.get(key, (0, 0))
+        sizes[key] = (download + item.cost - shard.ITEM_COST,
+                      install + item.install_size)
+
+    result = []
+    for job, package, args in shard.jobs(items, merge_base):
+        kind = "icon" if job == "image" else "package"
+        result.append(Job(job, package, args, *sizes[(kind, package)]))
+
+    return sorted(result, key=lambda j: -j.seconds())
+
+
+def estimate(jobs: list, workers: int) -> Estimate:
+    """
+    Estimate total cost of jobs and the wall time of running them largest
+    first on workers, each job going to the first free worker.
+    """
+    loads = [0.0] * max(workers, 1)
+    for job in jobs:
+        heapq.heapreplace(loads, loads[0] + job.seconds())
+
+    return Estimate(
+        len(jobs),
+        sum(j.download_size for j in jobs),
+        sum(j.install_size for j in jobs),
+        max(loads),
+        workers)
+
+
+def run_captured(job: Job) -> tuple:
+    """
+    Run job with its output collected so that output of parallel jobs
+    doesn't interleave. Returns (result, output, metrics snapshot).
+    """
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output), \
+            contextlib.redirect_stderr(output), metrics.collect():
+        result = shard.run_job(job.job, job.package, job.args)
+    return result, output.getvalue(), metrics.snapshot()
+
+
+def init_worker(limiter):
+    from . import package
+    from .util.throttle import ThrottledSession
+
+    # downloads of all workers share host limits
+    package.HTTP = ThrottledSession(limiter)
+
+
+def run_jobs(jobs: list, workers: int = 1, fail_fast: bool = False) -> list:
+    """
+    Run jobs in order, in this process or on a pool of worker processes.
+    With fail_fast jobs that haven't started yet are dropped after the
+    first failure.
+    """
+    results = []
+
+    if workers <= 1:
+        for job in jobs:
+            result = shard.run_job(job.job, job.package, job.args)
+            results.append(result)
+            if fail_fast and not result["passed"]:
+                break
+        return results
+
+    # validators keep global state, so jobs run in separate processes
+    with LimiterManager() as manager, ProcessPoolExecutor(
+            workers, initializer=init_worker,
+            initargs=(shared_limiter(manager),)) as pool:
+        futures = [pool.submit(run_captured, job) for job in jobs]
+        for future in as_completed(futures):
+            if future.cancelled():
+                continue
+            result, output, snapshot = future.result()
+            print(output, end="", flush=True)
+            metrics.merge(snapshot)
+            results.append(result)
+            if fail_fast and not result["passed"]:
+                for f in futures:
+                    f.cancel()
+
+    return results
+
+
+def check_budget(jobs: list, workers: int, budget: Budget) -> bool:
+    """
+    Print the run estimate and return False if the run should not start.
+    """
+    e = estimate(jobs, workers)
+    print(f"Estimated cost: {e}")
+
+    problems = budget.exceeded(e) if budget else []
+    refuse = bool(problems) and budget.action == "refuse"
+    for problem in problems:
+        if refuse:
+            print(f"\033[91mBudget exceeded, refusing to run: "
+                  f"{problem}\033[0m")
+        else:
+            print(f"Budget warning: {problem}")
+
+    return not refuse
+
+
+def add_budget_args(parser):
+    parser.add_argument(
+        "--jobs", help="Number of validations to run in parallel", type=int,
+        default=1)
+    parser.add_argument(
+        "--max-download", help="Byte budget for downloads", type=int,
+        default=None)
+    parser.add_argument(
+        "--max-install", help="Byte budget for decompressed package size",
+        type=int, default=None)
+    parser.add_argument(
+        "--max-time", help="Estimated time budget in seconds", type=float,
+        default=None)
+    parser.add_argument(
+        "--budget-action", help="What to do when the estimate exceeds a "
+        "budget", choices=["warn", "refuse"], default="refuse")
+
+
+def budget_from_args(args) -> Budget:
+    return Budget(args.max_download, args.max_install, args.max_time,
+                  args.budget_action)
@@ -0,0 +1,228 @@
+import argparse
+import collections
+import hashlib
+import io
+import json
+import os
+import time
+import jsonschema
+import requests
+from jsonschema.exceptions import best_match
+from requests.exceptions import RequestException
+
+
+SCHEMA_URL = ("https://gitlab.com/kicad/code/kicad/-/raw/master/"
+              "kicad/pcm/schemas/pcm.v1.schema.json")
+BUNDLED_SCHEMA = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(
+        os.path.abspath(__file__)))),
+    "schema.json")
+CACHE_DIR = os.environ.get(
+    "SCHEMA_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "kicad-pcm-schema"))
+TTL = 24 * 60 * 60
+TIMEOUT = 30
+
+# compiled validators by schema_key(), least recently used first
+_COMPILED = collections.OrderedDict()
+MAX_COMPILED = 8
+
+
+def _key(s: str) -> str:
+    return hashlib.sha256(s.encode("utf-8")).hexdigest()[:32]
+
+
+def _load(path: str) -> dict:
+    with io.open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _save(path: str, data: dict):
+    tmp = path + ".tmp"
+    with io.open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+
+class SchemaStore:
+    """
+    On disk schema cache. Schemas are stored by their $id, every url has
+    a small record pointing at the $id with the ETag and Last-Modified
+    values of the last response. A cached schema is used as is until it is
+    older than ttl seconds, then it is revalidated with a conditional
+    request. In offline mode, or when the network is not reachable and
+    nothing is cached, the schema.json bundled with the repository is used.
+    """
+
+    def __init__(self, cache_dir: str = CACHE_DIR, ttl: int = TTL,
+                 offline: bool = False, bundled: str = BUNDLED_SCHEMA):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.offline = offline
+        self.bundled = bundled
+        # where the last get() took the schema from
+        self.source = None
+
+    def url_record_path(self, url: str) -> str:
+        return os.path.join(self.cache_dir, f"url-{_key(url)}.json")
+
+    def schema_path(self, schema_id: str) -> str:
+        return os.path.join(self.cache_dir, f"schema-{_key(schema_id)}.json")
+
+    def cached(self, url: str) -> tuple:
+        """
+        Return (record, schema) for url, or (None, None) if not cached.
+        """
+        try:
+            record = _load(self.url_record_path(url))
+            return record, _load(self.schema_path(record["id"]))
+        except (OSError, ValueError, KeyError):
+            return None, None
+
+    def store(self, url: str, schema: dict, etag: str, last_modified: str):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        schema_id = schema.get("$id", url)
+        _save(self.schema_path(schema_id), schema)
+        _save(self.url_record_path(url), {
+            "url": url,
+            "id": schema_id,
+            "etag": etag,
+            "last_modified": last_modified,
+            "checked": time.time(),
+        })
+
+    def touch(self, url: str, record: dict):
+        record["checked"] = time.time()
+        _save(self.url_record_path(url), record)
+
+    def load_bundled(self) -> dict:
+        print(f"Using bundled schema {self.bundled}")
+        self.source = "bundled"
+        return _load(self.bundled)
+
+    def get(self, url: str = SCHEMA_URL) -> dict:
+        record, schema = self.cached(url)
+
+        self.source = "cache"
+
+        if self.offline:
+            return schema if schema is not None else self.load_bundled()
+
+        if schema is not None and time.time() - record["checked"] < self.ttl:
+            return schema
+
+        headers = {}
+        if schema is not None:
+            if record.get("etag"):
+                headers["If-None-Match"] = record["etag"]
+            if record.get("last_modified"):
+                headers["If-Modified-Since"] = record["last_modified"]
+
+        try:
+            response = requests.get(url, headers=headers, timeout=TIMEOUT)
+
+            if response.status_code == 304 and schema is not None:
+                self.touch(url, record)
+                return schema
+
+            response.raise_for_status()
+            fetched = response.json()
+            self.source = "network"
+            self.store(url, fetched, response.headers.get("ETag"),
+                       response.headers.get("Last-Modified"))
+            return fetched
+        except (RequestException, ValueError, OSError) as e:
+            if schema is not None:
+                print(f"Failed to revalidate schema {url}, using cached copy"
+                      f"\n{e}")
+                return schema
+            if os.path.exists(self.bundled):
+                print(f"Failed to download schema {url}\n{e}")
+                return self.load_bundled()
+            raise
+
+
+class Schema(dict):
+    """
+    Schema with the key its validator is cached by, see with_key().
+    """
+
+    key = None
+
+
+def schema_key(schema: dict) -> str:
+    content = json.dumps(schema, sort_keys=True)
+    return f"{schema.get('$id', '')}#{_key(content)}"
+
+
+def with_key(schema: dict) -> Schema:
+    """
+    Return schema with its cache key computed, to be done once when the
+    schema is loaded so that get_validator() doesn't serialize it again.
+    """
+    if isinstance(schema, Schema):
+        return schema
+    keyed = Schema(schema)
+    keyed.key = schema_key(schema)
+    return keyed
+
+
+def get_validator(schema: dict):
+    """
+    Return a validator for schema, checking and compiling the schema only
+    the first time it is seen. Raises SchemaError for invalid schemas.
+    """
+    key = schema.key if isinstance(schema, Schema) else schema_key(schema)
+    validator = _COMPILED.get(key)
+
+    if validator is not None:
+        _COMPILED.move_to_end(key)
+        return validator
+
+    cls = jsonschema.validators.validator_for(schema)
+    cls.check_schema(schema)
+    validator = _COMPILED[key] = cls(schema)
+
+    while len(_COMPILED) > MAX_COMPILED:
+        _COMPILED.popitem(last=False)
+
+    return validator
+
+
+def validate(instance, schema: dict):
+    """
+    Same as jsonschema.validate() but with the compiled validator cached.
+    """
+    error = best_match(get_validator(schema).iter_errors(instance))
+    if error is not None:
+        raise error
+
+
+def main(args):
+    parser = argparse.ArgumentParser(
+        description="KiCad PCM schema downloader")
+
+    parser.add_argument(
+        "--url", help="Schema url", default=SCHEMA_URL)
+    parser.add_argument(
+        "--output", help="File to write the schema to", default="schema.json")
+    parser.add_argument(
+        "--cache-dir", help="Schema cache directory", default=CACHE_DIR)
+    parser.add_argument(
+        "--ttl", help="Seconds before a cached schema is revalidated",
+        type=int, default=TTL)
+    parser.add_argument(
+        "--offline", help="Don't use the network, use cached or bundled "
+        "schema", action="store_true")
+
+    args = parser.parse_args(args)
+
+    store = SchemaStore(args.cache_dir, args.ttl, args.offline)
+    schema = store.get(args.url)
+
+    if (store.source != "bundled" or
+            os.path.abspath(args.output) != os.path.abspath(store.bundled)):
+        with io.open(args.output, "w", encoding="utf-8") as f:
+            json.dump(schema, f, indent=4)
+
+    print(f"Schema {schema.get('$id', args.url)} written to {args.output}")
@@ -0,0 +1,138 @@
+import bisect
+import io
+import json
+import re
+
+
+INDEX_VERSION = 1
+TEXT_FIELDS = ["name", "description", "description_full"]
+
+_TERM_RE = re.compile(r"\w+")
+
+
+def normalize(text: str) -> list:
+    return _TERM_RE.findall(text.casefold())
+
+
+def normalize_tag(tag: str) -> str:
+    return tag.strip().casefold()
+
+
+def build_index(packages: list) -> dict:
+    """
+    Build an inverted index of package text fields and tags.
+
+    "packages" lists identifiers, postings refer to packages by position
+    in that list. "terms" maps every normalized term to [package, term
+    frequency] pairs and is written in sorted order. "tags" maps normalized
+    tags to packages.
+    """
+    identifiers = []
+    terms = {}
+    tags = {}
+
+    for doc, package in enumerate(packages):
+        identifiers.append(package["identifier"])
+        frequencies = {}
+
+        for field in TEXT_FIELDS:
+            for term in normalize(package.get(field, "")):
+                frequencies[term] = frequencies.get(term, 0) + 1
+
+        for tag in package.get("tags", []):
+            for term in normalize(tag):
+                frequencies[term] = frequencies.get(term, 0) + 1
+            postings = tags.setdefault(normalize_tag(tag), [])
+            if not postings or postings[-1] != doc:
+                postings.append(doc)
+
+        for term, count in frequencies.items():
+            terms.setdefault(term, []).append([doc, count])
+
+    return {
+        "version": INDEX_VERSION,
+        "packages": identifiers,
+        "terms": dict(sorted(terms.items())),
+        "tags": dict(sorted(tags.items())),
+    }
+
+
+class SearchIndex:
+    """
+    Query side of the search index. Terms are kept sorted so a prefix
+    query is a binary search plus a walk over the matching terms only.
+    """
+
+    def __init__(self, index: dict):
+        if index.get("version") != INDEX_VERSION:
+            raise ValueError(
+                f"Unsupported search index version {index.get('version')}")
+
+        self.packages = index["packages"]
+        self.postings = index["terms"]
+        self.terms = sorted(self.postings)
+        self.tags = index["tags"]
+        self.tag_names = sorted(self.tags)
+
+    def _prefix_scores(self, prefix: str) -> dict:
+        scores = {}
+        start = bisect.bisect_left(self.terms, prefix)
+
+        for i in range(start, len(self.terms)):
+            term = self.terms[i]
+            if not term.startswith(prefix):
+                break
+            for doc, count in self.postings[term]:
+                scores[doc] = scores.get(doc, 0) + count
+
+        return scores
+
+    def _result(self, scores: dict) -> list:
+        docs = sorted(scores, key=lambda d: (-scores[d], self.packages[d]))
+        return [self.packages[d] for d in docs]
+
+    def prefix(self, query: str) -> list:
+        """
+        Return identifiers of packages that have a term starting with every
+        word of the query, best matches first.
+        """
+        words = normalize(query)
+        if not words:
+            return []
+
+        scores = None
+        for word in words:
+            word_scores = self._prefix_scores(word)
+            if scores is None:
+                scores = word_scores
+            else:
+                scores = {d: scores[d] + s for d, s in word_scores.items()
+                          if d in scores}
+            if not scores:
+                return []
+
+        return self._result(scores)
+
+    def tag(self, tag: str) -> list:
+        return [self.packages[d] for d in self.tags.get(normalize_tag(tag), [])]
+
+    def tag_prefix(self, prefix: str) -> list:
+        """
+        Return tags starting with prefix, for completion.
+        """
+        prefix = normalize_tag(prefix)
+        start = bisect.bisect_left(self.tag_names, prefix)
+        result = []
+
+        for i in range(start, len(self.tag_names)):
+            tag = self.tag_names[i]
+            if not tag.startswith(prefix):
+                break
+            result.append(tag)
+
+        return result
+
+
+def load_index(file_name: str) -> SearchIndex:
+    with io.open(file_name, encoding="utf-8") as f:
+        return SearchIndex(json.load(f))
@@ -0,0 +1,177 @@
+import re
+import zipfile
+import zlib
+
+
+CHUNK_SIZE = 64 * 1024
+# expected root tokens by file extension
+ROOTS = {
+    ".kicad_sym": ("kicad_symbol_lib",),
+    ".kicad_mod": ("footprint", "module"),
+}
+# longest whitespace and root token prefix looked at before giving up
+MAX_HEAD = 4096
+
+_ROOT = re.compile(rb"\(\s*([^\s()\"]+)")
+_PARENS = re.compile(rb"[()]")
+_STRING_END = re.compile(rb"[\\\"]")
+_NON_SPACE = re.compile(rb"\S")
+
+
+class SexprError(ValueError):
+    pass
+
+
+class SexprChecker:
+    """
+    Incremental well-formedness check of a KiCad S-expression file: a
+    single root list starting with one of the expected tokens, balanced
+    parentheses, terminated strings and nothing but whitespace after the
+    root list. Feed chunks of the file in order, then call close().
+    """
+
+    def __init__(self, roots: tuple):
+        self.roots = roots
+        self.root = None
+        self.head = b""
+        self.total = 0
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+        self.closed = False
+
+    def feed(self, data: bytes):
+        self.total += len(data)
+        if self.root is None:
+            data = self.read_root(data, False)
+            if data is None:
+                return
+        self.scan(data, self.total - len(data))
+
+    def close(self):
+        if self.root is None:
+            if not self.head:
+                raise SexprError("file is empty")
+            self.scan(self.read_root(b"", True), self.total)
+        if self.in_string:
+            raise SexprError("unterminated string at end of file")
+        if not self.closed:
+            raise SexprError(
+                f"unexpected end of file, {self.depth} list(s) not closed")
+
+    def read_root(self, data: bytes, final: bool) -> bytes:
+        """
+        Collect the file head until the root token is known. Returns the
+        rest of the data to scan, None if more data is needed.
+        """
+        self.head = (self.head + data).lstrip()
+        if not self.head:
+            return None
+
+        if self.head[:1] != b"(":
+            raise SexprError("file does not start with \"(\"")
+
+        m = _ROOT.match(self.head)
+        # the token may continue in the next chunk
+        if (m is None or m.end() == len(self.head)) and not final and \
+                len(self.head) < MAX_HEAD:
+            return None
+        if m is None:
+            raise SexprError("root list has no token")
+
+        token = m.group(1).decode("utf-8", "replace")
+        if token not in self.roots:
+            raise SexprError(f"unexpected root token \"{token}\", expected "
+                             f"{' or '.join(self.roots)}")
+
+        self.root = token
+        self.depth = 1
+        rest = self.head[m.end():]
+        self.head = b""
+        return rest
+
+    def scan(self, data: bytes, base: int):
+        pos = 0
+        end = len(data)
+
+        while pos < end:
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                    pos += 1
+                    continue
+                m = _STRING_END.search(data, pos)
+                if m is None:
+                    return
+                if m.group() == b"\\":
+                    self.escape = True
+                else:
+                    self.in_string = False
+                pos = m.end()
+                continue
+
+            if self.closed:
+                m = _NON_SPACE.search(data, pos)
+                if m:
+                    raise SexprError(
+                        f"unexpected data after the root list at byte "
+                        f"{base + m.start()}")
+                return
+
+            quote = data.find(b"\"", pos)
+            stop = end if quote < 0 else quote
+            closes = data.count(b")", pos, stop)
+            if closes < self.depth:
+                # the root list can't end in this stretch
+                self.depth += data.count(b"(", pos, stop) - closes
+            else:
+                for m in _PARENS.finditer(data, pos, stop):
+                    if m.group() == b"(":
+                        self.depth += 1
+                        continue
+                    self.depth -= 1
+                    if self.depth == 0:
+                        self.closed = True
+                        stop = m.end()
+                        break
+
+            pos = stop
+            if quote >= 0 and pos == quote:
+                if self.closed:
+                    continue
+                self.in_string = True
+                pos += 1
+
+
+def roots_for(name: str) -> tuple:
+    for extension, roots in ROOTS.items():
+        if name.endswith(extension):
+            return roots
+    return None
+
+
+def check_stream(stream, roots: tuple, chunk_size: int = CHUNK_SIZE):
+    """
+    Check a binary stream chunk by chunk, raises SexprError.
+    """
+    checker = SexprChecker(roots)
+    data = stream.read(chunk_size)
+    while data:
+        checker.feed(data)
+        data = stream.read(chunk_size)
+    checker.close()
+
+
+def check_member(z: zipfile.ZipFile, name: str) -> str:
+    """
+    Check an archive member straight from the zip stream. Returns the
+    problem found or None.
+    """
+    try:
+        with z.open(name) as f:
+            check_stream(f, roots_for(name))
+    except SexprError as e:
+        return str(e)
+    except (zipfile.BadZipFile, zlib.error, EOFError, OSError) as e:
+        return f"could not be read: {e}"
+    return None
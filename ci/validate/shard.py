@@ -0,0 +1,348 @@
+import argparse
+import glob
+import heapq
+import io
+import json
+import os
+import time
+from dataclasses import asdict, dataclass
+from .package import load_json_bytes, load_json_file, versions_to_download
+from .plan import Plan, load_plan, make_plan
+from .util import metrics
+from .util.git import GitError, get_object_reader
+from .util.verify import get_failures, get_messages, reset_failures
+
+
+# fixed cost of every item on top of its download size, covers schema and
+# metadata checks of packages that download nothing
+ITEM_COST = 64 * 1024
+# used for versions that don't declare download_size
+DEFAULT_DOWNLOAD_SIZE = 1024 * 1024
+
+
+@dataclass
+class WorkItem:
+    kind: str
+    package: str
+    path: str
+    version: str = None
+    changed: bool = False
+    cost: int = ITEM_COST
+    install_size: int = 0
+
+    def key(self) -> tuple:
+        return (self.kind, self.package, self.version or "")
+
+
+def version_cost(version: dict) -> int:
+    size = version.get("download_size")
+    if not isinstance(size, int) or size < 0:
+        size = DEFAULT_DOWNLOAD_SIZE
+    return ITEM_COST + size
+
+
+def version_install_size(version: dict) -> int:
+    size = version.get("install_size")
+    if not isinstance(size, int) or size < 0:
+        return 0
+    return size
+
+
+def package_items(package: str, path: str, old_rev: str = None) -> list:
+    """
+    Split validation of a package into one item per version that will be
+    downloaded. Packages without downloads, or with metadata that doesn't
+    parse, are a single item.
+    """
+    changed = old_rev is not None
+
+    try:
+        metadata = load_json_file(path)
+        old = None
+        if changed:
+            data = get_object_reader().read(old_rev, path)
+            old = load_json_bytes(data) if data is not None else None
+        versions = versions_to_download(metadata, old)
+    except (OSError, ValueError, AttributeError):
+        versions = []
+
+    versions = [v for v in versions if isinstance(v.get("version"), str)]
+
+    if not versions:
+        return [WorkItem("package", package, path, changed=changed)]
+
+    return [WorkItem("package", package, path, v["version"], changed,
+                     version_cost(v), version_install_size(v))
+            for v in versions]
+
+
+def work_items(plan: Plan, merge_base: str) -> list:
+    items = []
+
+    for change in plan.new_packages:
+        items += package_items(change.package, change.metadata)
+
+    for change in plan.changed_packages:
+        items += package_items(change.package, change.metadata, merge_base)
+
+    for icon in plan.icons:
+        size = os.path.getsize(icon) if os.path.exists(icon) else 0
+        items.append(WorkItem("icon", icon.split("/")[1], icon,
+                              cost=ITEM_COST + size))
+
+    return items
+
+
+def partition(items: list, total: int) -> list:
+    """
+    Split items into total shards of similar cost, largest items first,
+    each to the currently cheapest shard. The result only depends on the
+    items, so every runner computes the same shards.
+    """
+    shards = [[] for _ in range(total)]
+    heap = [(0, i) for i in range(total)]
+
+    for item in sorted(items, key=lambda i: (-i.cost, i.key())):
+        load, index = heapq.heappop(heap)
+        shards[index].append(item)
+        heapq.heappush(heap, (load + item.cost, index))
+
+    for shard in shards:
+        shard.sort(key=WorkItem.key)
+
+    return shards
+
+
+def jobs(items: list, merge_base: str) -> list:
+    """
+    Turn shard items into (job, package, args) validator invocations, with
+    all versions of one package checked in one run.
+    """
+    packages = {}
+    result = []
+
+    for item in items:
+        if item.kind == "icon":
+            result.append(("image", item.package, [item.path]))
+            continue
+
+        if item.package not in packages:
+            args = [item.package, item.path]
+            if item.changed:
+                args += ["--old-rev", merge_base]
+            packages[item.package] = args
+            result.append(("package", item.package, args))
+
+        if item.version is not None:
+            packages[item.package] += ["--only-version", item.version]
+
+    return result
+
+
+def run_job(job: str, package: str, args: list) -> dict:
+    from . import image, package as package_validator
+
+    entry = {"package": package_validator.main, "image": image.main}[job]
+
+    print(f"Validating {job} {package}")
+    reset_failures()
+    start = time.monotonic()
+    exit_code = 0
+    messages = []
+
+    try:
+        entry(args)
+    except SystemExit as e:
+        exit_code = e.code if isinstance(e.code, int) else 1
+    except Exception as e:
+        # one broken job doesn't stop the others
+        print(f"Validation of {job} {package} raised {e!r}")
+        exit_code = 1
+        messages.append(repr(e))
+
+    return {
+        "job": job,
+        "package": package,
+        "args": args,
+        "passed": exit_code == 0 and get_failures() == 0,
+        "exit_code": exit_code,
+        "failures": get_failures(),
+        "messages": get_messages() + messages,
+        "duration": time.monotonic() - start,
+    }
+
+
+def run_shard(plan: Plan, index: int, total: int, merge_base: str,
+              workers: int = 1, budget=None) -> dict:
+    """
+    Validate shard index (1 based) of total and return its report.
+    """
+    from . import schedule
+
+    shards = partition(work_items(plan, merge_base), total)
+    items = shards[index - 1]
+    errors = list(plan.errors)
+
+    for error in errors:
+        print(error)
+
+    print(f"Shard {index}/{total}: {len(items)} item(s), "
+          f"cost {sum(i.cost for i in items)}")
+
+    results = []
+    if not errors:
+        jobs = schedule.make_jobs(items, merge_base)
+        if schedule.check_budget(jobs, workers, budget):
+            results = schedule.run_jobs(jobs, workers)
+        else:
+            errors.append(f"Shard {index} exceeds the validation budget")
+
+    return {
+        "shard": index,
+        "total": total,
+        "items": [asdict(i) for i in items],
+        "errors": errors,
+        "results": results,
+        "passed": not errors and all(r["passed"] for r in results),
+    }
+
+
+def merge_reports(reports: list) -> dict:
+    """
+    Combine partial reports into one, shards that didn't report fail it.
+    """
+    total = max((r["total"] for r in reports), default=0)
+    seen = sorted({r["shard"] for r in reports})
+    missing = [i for i in range(1, total + 1) if i not in seen]
+
+    errors = []
+    results = []
+    for report in sorted(reports, key=lambda r: r["shard"]):
+        errors += [e for e in report["errors"] if e not in errors]
+        results += report["results"]
+
+    consistent = all(r["total"] == total for r in reports)
+
+    return {
+        "total": total,
+        "shards": seen,
+        "missing": missing,
+        "errors": errors,
+        "results": results,
+        "passed": (bool(reports) and consistent and not missing and
+                   all(r["passed"] for r in reports)),
+    }
+
+
+def repository_plan(packages_dir: str) -> Plan:
+    """
+    Plan validating every package in the repository as if it was new.
+    """
+    lines = []
+    for path in sorted(glob.glob(os.path.join(packages_dir, "*", "*"))):
+        name = os.path.basename(path)
+        if name in ("metadata.json", "icon.png"):
+            package = os.path.basename(os.path.dirname(path))
+            lines.append(f"A\tpackages/{package}/{name}")
+    return make_plan(lines)
+
+
+def write_report(path: str, report: dict):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with io.open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=4)
+
+
+def run_main(args):
+    from .schedule import budget_from_args
+
+    if args.all:
+        plan = repository_plan("packages")
+    elif args.diff:
+        plan = load_plan(args.diff)
+    else:
+        raise SystemExit("Either diff file or --all is required")
+
+    if not 1 <= args.index <= args.total:
+        raise SystemExit(f"Shard index {args.index} is not in 1..{args.total}")
+
+    try:
+        report = run_shard(plan, args.index, args.total, args.merge_base,
+                           args.jobs, budget_from_args(args))
+    except GitError as e:
+        raise SystemExit(f"Can't read previous metadata: {e}")
+    write_report(args.report or
+                 f"artifacts/validation-shard-{args.index}.json", report)
+
+    if not report["passed"]:
+        print(f"Shard {args.index}/{args.total} failed")
+        raise SystemExit(1)
+
+
+def merge_main(args):
+    reports = []
+    for path in args.reports:
+        with io.open(path, encoding="utf-8") as f:
+            reports.append(json.load(f))
+
+    merged = merge_reports(reports)
+    if args.output:
+        write_report(args.output, merged)
+
+    for error in merged["errors"]:
+        print(error)
+    for result in merged["results"]:
+        if not result["passed"]:
+            print(f"Validation of {result['job']} {result['package']} failed")
+            for message in result["messages"]:
+                print(f"    {message}")
+    if merged["missing"]:
+        print(f"Missing reports of shard(s) {merged['missing']}")
+
+    print(f"{len(merged['results'])} validation(s) in "
+          f"{len(merged['shards'])}/{merged['total']} shard(s), "
+          f"{'passed' if merged['passed'] else 'failed'}")
+
+    if not merged["passed"]:
+        raise SystemExit(1)
+
+
+@metrics.run("validate-shard")
+def main(args):
+    from .schedule import add_budget_args
+
+    parser = argparse.ArgumentParser(
+        description="KiCad PCM repository sharded validation")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run = subparsers.add_parser("run", help="Validate one shard")
+    run.add_argument(
+        "diff", help="File with \"git diff --name-status\" output", nargs="?")
+    run.add_argument(
+        "--all", help="Validate all packages in the repository",
+        action="store_true")
+    run.add_argument(
+        "--index", help="Shard index starting from 1", type=int,
+        default=int(os.environ.get("CI_NODE_INDEX", 1)))
+    run.add_argument(
+        "--total", help="Number of shards", type=int,
+        default=int(os.environ.get("CI_NODE_TOTAL", 1)))
+    run.add_argument(
+        "--merge-base", help="Revision to read previous metadata from",
+        default=os.environ.get("MERGE_BASE_SHA"))
+    run.add_argument(
+        "--report", help="Partial report to write, "
+        "artifacts/validation-shard-<index>.json by default", default=None)
+    add_budget_args(run)
+    metrics.add_metrics_args(run)
+    run.set_defaults(func=run_main)
+
+    merge = subparsers.add_parser("merge", help="Combine shard reports")
+    merge.add_argument("reports", help="Partial reports", nargs="+")
+    merge.add_argument(
+        "--output", help="Combined report to write", default=None)
+    merge.set_defaults(func=merge_main)
+
+    args = parser.parse_args(args)
+    metrics.configure(args)
+    args.func(args)
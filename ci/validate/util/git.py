@@ -0,0 +1,153 @@
+import atexit
+import os
+import pathlib
+import subprocess
+
+
+# repository roots by directory
+_TOPLEVELS = {}
+
+
+class GitError(Exception):
+    pass
+
+
+def toplevel(cwd: str = None) -> str:
+    """
+    Root of the repository cwd, or the current directory, is in.
+    """
+    cwd = cwd or os.getcwd()
+    if cwd not in _TOPLEVELS:
+        try:
+            root = subprocess.run(
+                ["git", "rev-parse", "--show-toplevel"], cwd=cwd,
+                check=True, capture_output=True, text=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError) as e:
+            raise GitError(f"{cwd} is not in a git repository") from e
+        _TOPLEVELS[cwd] = os.path.realpath(root)
+    return _TOPLEVELS[cwd]
+
+
+class ObjectReader:
+    """
+    Reads blobs through one persistent "git cat-file --batch" process
+    instead of forking git for every file.
+    """
+
+    def __init__(self, cwd: str = None):
+        self.cwd = cwd
+        self.toplevel = toplevel(cwd)
+        self.commits = {}
+        self.proc = subprocess.Popen(
+            ["git", "cat-file", "--batch"], cwd=self.toplevel,
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+
+    def request(self, name: str) -> tuple:
+        """
+        Return (object id, type, content) of an object or None if it is
+        missing.
+        """
+        self.proc.stdin.write(f"{name}\n".encode("utf-8"))
+        self.proc.stdin.flush()
+
+        header = self.proc.stdout.readline()
+        if not header:
+            raise OSError("git cat-file exited unexpectedly")
+
+        fields = header.split()
+        if len(fields) != 3:
+            # "<object> missing" or "<object> ambiguous"
+            return None
+
+        size = int(fields[2])
+        data = self.proc.stdout.read(size)
+        # every object is followed by a newline
+        self.proc.stdout.read(1)
+
+        return fields[0].decode("ascii"), fields[1], data
+
+    def resolve(self, rev: str) -> str:
+        """
+        Return the commit id of rev, GitError if it doesn't name a commit,
+        for example because it was not fetched.
+        """
+        if rev not in self.commits:
+            obj = self.request(f"{rev}^{{commit}}")
+            if obj is None or obj[1] != b"commit":
+                raise GitError(f"Revision {rev} is not a commit in "
+                               f"{self.toplevel}, is it fetched?")
+            self.commits[rev] = obj[0]
+        return self.commits[rev]
+
+    def repo_path(self, path: str) -> str:
+        """
+        Path relative to the repository root. Relative paths are resolved
+        against the cwd of the reader, or the current directory.
+        """
+        path = os.path.join(self.cwd or os.getcwd(), path)
+        # the root is a real path, so resolve links on the way to the file
+        path = os.path.join(os.path.realpath(os.path.dirname(path)),
+                            os.path.basename(path))
+        try:
+            relative = pathlib.PurePath(os.path.relpath(path, self.toplevel))
+        except ValueError:
+            # on another drive
+            relative = None
+        if relative is None or relative.parts[:1] == ("..",):
+            raise GitError(f"{path} is outside of {self.toplevel}")
+        return relative.as_posix()
+
+    def read(self, rev: str, path: str) -> bytes:
+        """
+        Return content of path at rev or None if it doesn't exist there.
+        Raises GitError if rev can't be resolved, so that a missing
+        revision is never mistaken for a missing file.
+        """
+        commit = self.resolve(rev)
+        obj = self.request(f"{commit}:{self.repo_path(path)}")
+
+        if obj is None or obj[1] != b"blob":
+            return None
+
+        return obj[2]
+
+    def close(self):
+        if self.proc.poll() is None:
+            self.proc.stdin.close()
+            self.proc.wait()
+        self.proc.stdout.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# shared readers by repository root
+_READERS = {}
+
+
+def get_object_reader() -> ObjectReader:
+    """
+    Return the shared reader for the current directory's repository.
+    Long lived processes like the daemon run jobs of different checkouts,
+    each gets its own reader.
+    """
+    root = toplevel()
+    reader = _READERS.get(root)
+    if reader is None:
+        reader = _READERS[root] = ObjectReader()
+    return reader
+
+
+def close_readers():
+    """
+    Close shared readers, revisions like branch names are resolved again
+    by the next ones.
+    """
+    while _READERS:
+        _READERS.popitem()[1].close()
+
+
+atexit.register(close_readers)
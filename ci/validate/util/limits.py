@@ -0,0 +1,197 @@
+import contextlib
+import os
+import re
+import sys
+import threading
+import time
+
+try:
+    import resource
+except ImportError:
+    # not available on Windows, the rss limit is not enforced there
+    resource = None
+
+
+RESOURCES = ["time", "download", "inflated", "members"]
+SCOPES = ["run", "version"]
+UNITS = {"": 1, "k": 1024, "m": 1024 ** 2, "g": 1024 ** 3}
+
+# limits applied unless configured otherwise, so that one bad archive
+# can't hold a runner for long
+DEFAULTS = {
+    "version.time": 1800,
+    "version.inflated": 4 * 1024 ** 3,
+    "version.members": 200000,
+}
+
+# {"scope.resource": limit} and peak rss limit in bytes
+LIMITS = dict(DEFAULTS)
+RSS_LIMIT = None
+
+_ACTIVE = []
+
+
+class LimitExceeded(Exception):
+    def __init__(self, scope: str, resource: str, used: float, limit: float):
+        super().__init__(scope, resource, used, limit)
+        self.scope = scope
+        self.resource = resource
+        self.used = used
+        self.limit = limit
+
+    def __str__(self):
+        if self.resource == "time":
+            amount = f"{self.used:.0f}s of {self.limit:.0f}s"
+        else:
+            amount = f"{self.used:.0f} of {self.limit:.0f}"
+        return f"{self.scope} budget exceeded: {self.resource} {amount}"
+
+
+def parse_size(value: str) -> float:
+    m = re.fullmatch(r"\s*([0-9.]+)\s*([kmg]?)i?b?\s*", value.lower())
+    if not m:
+        raise ValueError(f"Invalid limit value \"{value}\"")
+    return float(m.group(1)) * UNITS[m.group(2)]
+
+
+def parse_limits(specs: list) -> tuple:
+    """
+    Parse "scope.resource=value" and "rss=value" specs on top of DEFAULTS.
+    Sizes take k, m and g suffixes, time is in seconds, 0 removes a limit.
+    Returns (limits, rss limit).
+    """
+    limits = dict(DEFAULTS)
+    rss = None
+
+    for spec in specs:
+        name, _, value = spec.partition("=")
+        name = name.strip()
+        amount = parse_size(value)
+        if name == "rss":
+            rss = amount or None
+            continue
+        scope, _, res = name.partition(".")
+        if scope not in SCOPES or res not in RESOURCES:
+            raise ValueError(f"Unknown limit \"{name}\"")
+        limits[name] = amount
+        if not amount:
+            del limits[name]
+
+    return limits, rss
+
+
+def add_limit_args(parser):
+    parser.add_argument(
+        "--limit", help="Resource limit as scope.resource=value, scope is "
+        "run or version and resource one of time (seconds), download, "
+        "inflated (bytes) or members; rss=value limits peak memory. Can be "
+        "given multiple times, also read from VALIDATE_LIMITS separated by "
+        "commas", action="append", default=None)
+
+
+def configure(specs: list):
+    global LIMITS, RSS_LIMIT
+    env = os.environ.get("VALIDATE_LIMITS", "")
+    specs = [s for s in env.split(",") if s.strip()] + list(specs or [])
+    LIMITS, RSS_LIMIT = parse_limits(specs)
+
+
+def peak_rss() -> int:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes everywhere but on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class Tracker:
+    """
+    Resource use of one scope checked against its limits.
+    """
+
+    def __init__(self, scope: str, limits: dict):
+        self.scope = scope
+        self.limits = {res: limits[f"{scope}.{res}"] for res in RESOURCES
+                       if f"{scope}.{res}" in limits}
+        self.used = dict.fromkeys(RESOURCES, 0)
+        self.start = time.monotonic()
+
+    def charge(self, res: str, amount: float):
+        self.used[res] += amount
+        limit = self.limits.get(res)
+        if limit is not None and self.used[res] > limit:
+            raise LimitExceeded(self.scope, res, self.used[res], limit)
+
+    def check(self):
+        self.used["time"] = time.monotonic() - self.start
+        self.charge("time", 0)
+
+    def remaining(self, res: str) -> float:
+        if res not in self.limits:
+            return None
+        if res == "time":
+            self.used["time"] = time.monotonic() - self.start
+        return max(self.limits[res] - self.used[res], 0)
+
+
+@contextlib.contextmanager
+def scope(name: str):
+    """
+    Account resources used inside the block to a new tracker of the named
+    scope, on top of the trackers of enclosing scopes.
+    """
+    tracker = Tracker(name, LIMITS)
+    _ACTIVE.append(tracker)
+    try:
+        yield tracker
+    finally:
+        _ACTIVE.remove(tracker)
+
+
+@contextlib.contextmanager
+def deadline(on_expire):
+    """
+    Call on_expire from a timer thread when the time of the tightest
+    active scope runs out, for blocking calls that don't return often
+    enough to check the limits themselves.
+    """
+    left = remaining("time")
+    timer = None
+    if left is not None:
+        timer = threading.Timer(left, on_expire)
+        timer.daemon = True
+        timer.start()
+    try:
+        yield
+    finally:
+        if timer is not None:
+            timer.cancel()
+
+
+def check():
+    """
+    Raise LimitExceeded when an active scope ran out of time or the
+    process is over the rss limit.
+    """
+    for tracker in _ACTIVE:
+        tracker.check()
+    if RSS_LIMIT and _ACTIVE:
+        rss = peak_rss()
+        if rss is not None and rss > RSS_LIMIT:
+            raise LimitExceeded("process", "rss", rss, RSS_LIMIT)
+
+
+def charge(res: str, amount: float):
+    for tracker in _ACTIVE:
+        tracker.charge(res, amount)
+    check()
+
+
+def remaining(res: str) -> float:
+    """
+    What is left of a resource in the tightest active scope, None if it's
+    not limited.
+    """
+    left = [t.remaining(res) for t in _ACTIVE]
+    left = [v for v in left if v is not None]
+    return min(left) if left else None
@@ -0,0 +1,72 @@
+import heapq
+import os
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+
+# Archives below both limits are checked in process, starting workers
+# would take longer than the checks.
+PARALLEL_MIN_MEMBERS = 256
+PARALLEL_MIN_SIZE = 16 * 1024 * 1024
+
+
+def batches(infos: list, count: int) -> list:
+    """
+    Split archive members into count lists of names with about the same
+    uncompressed size, largest members first.
+    """
+    heap = [(0, i, []) for i in range(count)]
+    for info in sorted(infos, key=lambda i: i.file_size, reverse=True):
+        size, i, names = heapq.heappop(heap)
+        names.append(info.filename)
+        heapq.heappush(heap, (size + info.file_size, i, names))
+    return [names for _, _, names in sorted(heap, key=lambda b: b[1])
+            if names]
+
+
+def check_batch(path: str, names: list, check) -> dict:
+    with zipfile.ZipFile(path, "r") as z:
+        return {name: check(z, name) for name in names}
+
+
+def check_members(z: zipfile.ZipFile, infos: list, check,
+                  jobs: int = None, progress=None) -> list:
+    """
+    Run check(zipfile, name) for the given members of an open archive and
+    return [(name, result)] in the order of infos. Big archives are split
+    into batches for worker processes that open the archive themselves,
+    so check must be a module level function or a picklable object.
+
+    progress({name: result}) is called as members or batches finish, an
+    exception it raises cancels the batches that didn't start yet.
+    """
+    jobs = jobs or os.cpu_count() or 1
+    size = sum(info.file_size for info in infos)
+
+    if (jobs <= 1 or not z.filename or
+            (len(infos) < PARALLEL_MIN_MEMBERS and size < PARALLEL_MIN_SIZE)):
+        results = []
+        for info in infos:
+            result = check(z, info.filename)
+            if progress:
+                progress({info.filename: result})
+            results.append((info.filename, result))
+        return results
+
+    results = {}
+    parts = batches(infos, jobs * 4)
+    with ProcessPoolExecutor(min(jobs, len(parts))) as pool:
+        futures = [pool.submit(check_batch, z.filename, part, check)
+                   for part in parts]
+        try:
+            for future in as_completed(futures):
+                result = future.result()
+                if progress:
+                    progress(result)
+                results.update(result)
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            raise
+
+    return [(info.filename, results[info.filename]) for info in infos]
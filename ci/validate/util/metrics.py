@@ -0,0 +1,234 @@
+import contextlib
+import io
+import json
+import os
+import re
+import time
+
+
+PREFIX = "kicad_pcm_"
+# upper bounds of histogram buckets, there is always an implicit +Inf one
+SECONDS = (0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300, 1800)
+BYTES_PER_SECOND = (1e4, 1e5, 1e6, 1e7, 1e8, 1e9)
+
+# directory runs write <job>.prom and <job>.json to, None to not write
+DIRECTORY = None
+
+_COUNTERS = {}
+_GAUGES = {}
+_HISTOGRAMS = {}
+_DEPTH = 0
+
+
+def _key(name: str, labels: dict) -> tuple:
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def inc(name: str, value: float = 1, **labels):
+    key = _key(name, labels)
+    _COUNTERS[key] = _COUNTERS.get(key, 0) + value
+
+
+def set_gauge(name: str, value: float, **labels):
+    _GAUGES[_key(name, labels)] = value
+
+
+def observe(name: str, value: float, buckets: tuple = SECONDS, **labels):
+    key = _key(name, labels)
+    h = _HISTOGRAMS.get(key)
+    if h is None:
+        h = _HISTOGRAMS[key] = {
+            "buckets": list(buckets), "counts": [0] * (len(buckets) + 1),
+            "sum": 0, "count": 0}
+    i = 0
+    while i < len(h["buckets"]) and value > h["buckets"][i]:
+        i += 1
+    h["counts"][i] += 1
+    h["sum"] += value
+    h["count"] += 1
+
+
+@contextlib.contextmanager
+def timer(phase: str, **labels):
+    """
+    Time a block into the phase_seconds histogram.
+    """
+    start = time.monotonic()
+    try:
+        yield
+    finally:
+        observe("phase_seconds", time.monotonic() - start, phase=phase,
+                **labels)
+
+
+def rule_of(message: str) -> str:
+    """
+    Failure message reduced to the rule it reports: first line without the
+    version prefix, quoted names, urls and numbers.
+    """
+    rule = message.split("\n", 1)[0]
+    rule = re.sub(r"^Version [^:]*: ", "", rule)
+    rule = re.sub(r"\"[^\"]*\"", "\"*\"", rule)
+    rule = re.sub(r"\S+://\S+", "URL", rule)
+    rule = re.sub(r"\d+(\.\d+)*", "N", rule)
+    return rule[:100]
+
+
+def reset():
+    _COUNTERS.clear()
+    _GAUGES.clear()
+    _HISTOGRAMS.clear()
+
+
+def snapshot() -> dict:
+    def items(store):
+        return [{"name": name, "labels": dict(labels), **value}
+                for (name, labels), value in sorted(store.items())]
+
+    return {
+        "counters": items({k: {"value": v} for k, v in _COUNTERS.items()}),
+        "gauges": items({k: {"value": v} for k, v in _GAUGES.items()}),
+        "histograms": items({k: dict(v, counts=list(v["counts"]))
+                             for k, v in _HISTOGRAMS.items()}),
+    }
+
+
+def merge(data: dict):
+    """
+    Add a snapshot() taken in another process.
+    """
+    for c in data["counters"]:
+        inc(c["name"], c["value"], **c["labels"])
+    for g in data["gauges"]:
+        set_gauge(g["name"], g["value"], **g["labels"])
+    for h in data["histograms"]:
+        key = _key(h["name"], h["labels"])
+        mine = _HISTOGRAMS.get(key)
+        if mine is None or mine["buckets"] != h["buckets"]:
+            _HISTOGRAMS[key] = dict(h, counts=list(h["counts"]))
+            continue
+        mine["counts"] = [a + b for a, b in zip(mine["counts"], h["counts"])]
+        mine["sum"] += h["sum"]
+        mine["count"] += h["count"]
+
+
+def _labels(labels: dict, extra: dict = None) -> str:
+    labels = dict(labels, **(extra or {}))
+    if not labels:
+        return ""
+    escaped = [
+        (k, str(v).replace("\\", "\\\\").replace("\"", "\\\"")
+         .replace("\n", "\\n")) for k, v in labels.items()]
+    return "{" + ",".join(f"{k}=\"{v}\"" for k, v in escaped) + "}"
+
+
+def to_prometheus(data: dict, job: str = None) -> str:
+    """
+    Render a snapshot() in the Prometheus text exposition format. Every
+    sample gets a job label, the textfile collector drops series that
+    appear in more than one file.
+    """
+    lines = []
+    typed = set()
+    common = {"job": job} if job else {}
+
+    def declare(name, kind):
+        if name not in typed:
+            typed.add(name)
+            lines.append(f"# TYPE {name} {kind}")
+
+    for kind, store in [("counter", "counters"), ("gauge", "gauges")]:
+        for m in data[store]:
+            name = PREFIX + m["name"]
+            declare(name, kind)
+            labels = dict(common, **m["labels"])
+            lines.append(f"{name}{_labels(labels)} {m['value']}")
+
+    for h in data["histograms"]:
+        name = PREFIX + h["name"]
+        declare(name, "histogram")
+        labels = dict(common, **h["labels"])
+        total = 0
+        for bound, count in zip(h["buckets"], h["counts"]):
+            total += count
+            lines.append(f"{name}_bucket"
+                         f"{_labels(labels, {'le': bound})} {total}")
+        lines.append(f"{name}_bucket{_labels(labels, {'le': '+Inf'})} "
+                     f"{h['count']}")
+        lines.append(f"{name}_sum{_labels(labels)} {h['sum']}")
+        lines.append(f"{name}_count{_labels(labels)} {h['count']}")
+
+    return "\n".join(lines) + "\n"
+
+
+def write(directory: str, job: str):
+    """
+    Write metrics of the run as <job>.prom for a node exporter textfile
+    collector and as <job>.json.
+    """
+    os.makedirs(directory, exist_ok=True)
+    data = snapshot()
+    outputs = {
+        f"{job}.prom": to_prometheus(data, job),
+        f"{job}.json": json.dumps(
+            dict(data, job=job, time=int(time.time())), indent=4),
+    }
+    for name, content in outputs.items():
+        path = os.path.join(directory, name)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with io.open(tmp, "w", encoding="utf-8") as f:
+            f.write(content)
+        os.replace(tmp, path)
+
+
+@contextlib.contextmanager
+def run(job: str):
+    """
+    Collect metrics of a run, also usable as a decorator of main(). Only
+    the outermost run starts from scratch and writes them, runs nested in
+    it add to its metrics.
+    """
+    global _DEPTH, DIRECTORY
+    outermost = _DEPTH == 0
+    if outermost:
+        reset()
+        DIRECTORY = None
+    _DEPTH += 1
+    start = time.monotonic()
+    try:
+        yield
+    finally:
+        _DEPTH -= 1
+        # "job" labels the file the run is written to
+        observe("run_seconds", time.monotonic() - start, run=job)
+        if outermost and DIRECTORY:
+            write(DIRECTORY, job)
+
+
+@contextlib.contextmanager
+def collect():
+    """
+    Collect metrics of runs from scratch without writing them, for worker
+    processes that send snapshot() to their parent.
+    """
+    global _DEPTH
+    reset()
+    _DEPTH += 1
+    try:
+        yield
+    finally:
+        _DEPTH -= 1
+
+
+def add_metrics_args(parser):
+    parser.add_argument(
+        "--metrics", help="Directory to write run metrics to as a "
+        "Prometheus textfile and json",
+        default=os.environ.get("VALIDATE_METRICS"))
+
+
+def configure(args):
+    global DIRECTORY
+    # runs nested in another one keep its directory
+    if getattr(args, "metrics", None):
+        DIRECTORY = args.metrics
@@ -0,0 +1,338 @@
+import collections
+import email.utils
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from multiprocessing.managers import BaseManager
+from urllib.parse import urlsplit
+import requests
+from requests.structures import CaseInsensitiveDict
+
+
+# longest a server can ask us to back off for
+MAX_BACKOFF = 300
+RETRIES = 3
+
+
+@dataclass
+class HostPolicy:
+    # concurrent requests to one host
+    max_connections: int = 4
+    # token bucket, requests per second and burst size
+    rate: float = 4.0
+    burst: int = 8
+
+
+DEFAULT_POLICY = HostPolicy()
+POLICIES = {
+    # release assets redirect to objects.githubusercontent.com, api limits
+    # and secondary rate limits apply to github.com itself
+    "github.com": HostPolicy(max_connections=4, rate=2.0, burst=4),
+}
+
+
+def host_of(url: str) -> str:
+    return urlsplit(url).netloc.lower()
+
+
+def retry_after(value: str, now: float) -> float:
+    """
+    Parse Retry-After header, delta seconds or HTTP date, into seconds.
+    """
+    if value is None:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return email.utils.parsedate_to_datetime(value).timestamp() - now
+    except (TypeError, ValueError):
+        return None
+
+
+class HostState:
+    def __init__(self, policy: HostPolicy, now: float):
+        self.policy = policy
+        self.active = 0
+        self.tokens = float(policy.burst)
+        self.updated = now
+        self.blocked_until = 0.0
+
+    def refill(self, now: float):
+        self.tokens = min(float(self.policy.burst), self.tokens +
+                          (now - self.updated) * self.policy.rate)
+        self.updated = now
+
+    def wait_time(self, now: float) -> float:
+        """
+        Seconds until a request can start, None if all connections are busy.
+        """
+        if self.active >= self.policy.max_connections:
+            return None
+        self.refill(now)
+        wait = max(0.0, self.blocked_until - now)
+        if self.tokens < 1:
+            wait = max(wait, (1 - self.tokens) / self.policy.rate)
+        return wait
+
+
+class HostLimiter:
+    """
+    Per host connection caps and token bucket rate limits, shared by all
+    threads. Hosts that answer with Retry-After or an exhausted
+    X-RateLimit-Remaining are blocked until the time they ask for.
+    """
+
+    def __init__(self, policies: dict = None,
+                 default: HostPolicy = DEFAULT_POLICY,
+                 clock=time.monotonic):
+        self.policies = POLICIES if policies is None else policies
+        self.default = default
+        self.clock = clock
+        self.hosts = {}
+        self.cond = threading.Condition()
+
+    def policy(self, host: str) -> HostPolicy:
+        return self.policies.get(host, self.default)
+
+    def _state(self, host: str) -> HostState:
+        if host not in self.hosts:
+            self.hosts[host] = HostState(self.policy(host), self.clock())
+        return self.hosts[host]
+
+    def wait_time(self, host: str) -> float:
+        with self.cond:
+            return self._state(host).wait_time(self.clock())
+
+    def acquire(self, host: str):
+        with self.cond:
+            while True:
+                state = self._state(host)
+                wait = state.wait_time(self.clock())
+                if wait == 0:
+                    state.active += 1
+                    state.tokens -= 1
+                    return
+                self.cond.wait(wait)
+
+    def release(self, host: str):
+        with self.cond:
+            self._state(host).active -= 1
+            self.cond.notify_all()
+
+    def observe(self, host: str, response) -> float:
+        """
+        Block host as long as response headers ask for. Returns the delay,
+        0 if the response doesn't ask to slow down.
+        """
+        headers = response.headers
+        delay = 0.0
+
+        if response.status_code in (429, 503):
+            delay = retry_after(headers.get("Retry-After"), time.time())
+            if delay is None:
+                delay = 1.0
+
+        if headers.get("X-RateLimit-Remaining") == "0":
+            reset = headers.get("X-RateLimit-Reset", "")
+            if reset.isdigit():
+                delay = max(delay, int(reset) - time.time())
+            elif "Retry-After" in headers:
+                delay = max(delay, retry_after(
+                    headers["Retry-After"], time.time()) or 0)
+            else:
+                delay = max(delay, 60.0)
+
+        delay = min(max(delay, 0.0), MAX_BACKOFF)
+        if delay:
+            with self.cond:
+                state = self._state(host)
+                state.blocked_until = max(
+                    state.blocked_until, self.clock() + delay)
+                self.cond.notify_all()
+
+        return delay
+
+
+_LIMITER = None
+_LIMITER_LOCK = threading.Lock()
+
+
+def get_limiter() -> HostLimiter:
+    global _LIMITER
+    with _LIMITER_LOCK:
+        if _LIMITER is None:
+            _LIMITER = HostLimiter()
+        return _LIMITER
+
+
+@dataclass
+class ResponseInfo:
+    # what HostLimiter.observe() looks at, streamed responses can't be
+    # pickled without reading their body
+    status_code: int
+    headers: CaseInsensitiveDict
+
+
+class LimiterManager(BaseManager):
+    """
+    Runs a HostLimiter in a server process so that worker processes share
+    host limits instead of each getting the full allowance.
+    """
+
+
+LimiterManager.register("HostLimiter", HostLimiter, exposed=[
+    "policy", "wait_time", "acquire", "release", "observe"])
+
+
+class SharedLimiter:
+    """
+    HostLimiter interface to the limiter of a LimiterManager, can be
+    passed to worker processes.
+    """
+
+    def __init__(self, proxy):
+        self.proxy = proxy
+
+    def policy(self, host: str) -> HostPolicy:
+        return self.proxy.policy(host)
+
+    def wait_time(self, host: str) -> float:
+        return self.proxy.wait_time(host)
+
+    def acquire(self, host: str):
+        self.proxy.acquire(host)
+
+    def release(self, host: str):
+        self.proxy.release(host)
+
+    def observe(self, host: str, response) -> float:
+        return self.proxy.observe(host, ResponseInfo(
+            response.status_code, CaseInsensitiveDict(response.headers)))
+
+
+def shared_limiter(manager: LimiterManager) -> SharedLimiter:
+    return SharedLimiter(manager.HostLimiter(POLICIES))
+
+
+def throttled(response) -> bool:
+    return (response.status_code in (429, 503) or
+            (response.status_code == 403 and
+             response.headers.get("X-RateLimit-Remaining") == "0"))
+
+
+class ThrottledSession:
+    """
+    requests.Session look alike that takes a host slot for every request.
+    Streamed responses hold the slot until they are closed. Throttled
+    requests are retried after the delay the server asked for.
+    """
+
+    def __init__(self, limiter: HostLimiter = None,
+                 session: requests.Session = None, retries: int = RETRIES):
+        self.limiter = limiter or get_limiter()
+        self.session = session or requests.Session()
+        self.retries = retries
+
+    def request(self, method: str, url: str, **kwargs):
+        host = host_of(url)
+
+        for attempt in range(self.retries + 1):
+            self.limiter.acquire(host)
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except BaseException:
+                self.limiter.release(host)
+                raise
+
+            self.limiter.observe(host, response)
+
+            if throttled(response) and attempt < self.retries:
+                response.close()
+                self.limiter.release(host)
+                continue
+
+            if kwargs.get("stream"):
+                self._release_on_close(response, host)
+            else:
+                self.limiter.release(host)
+            return response
+
+    def _release_on_close(self, response, host: str):
+        close = response.close
+        released = []
+
+        def release_and_close():
+            if not released:
+                released.append(True)
+                self.limiter.release(host)
+            close()
+
+        response.close = release_and_close
+
+    def get(self, url: str, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def head(self, url: str, **kwargs):
+        return self.request("HEAD", url, **kwargs)
+
+
+def fair_map(fn, items: list, key, workers: int,
+             limiter: HostLimiter = None) -> list:
+    """
+    Like pool.map(fn, items) but items are started round robin across hosts
+    (key(item) gives the host) and only when their host has a free slot, so
+    workers never sit waiting on one throttled host while others are idle.
+    Results are returned in item order.
+    """
+    limiter = limiter or get_limiter()
+    queues = collections.OrderedDict()
+    for i, item in enumerate(items):
+        queues.setdefault(key(item), collections.deque()).append(i)
+
+    results = [None] * len(items)
+    in_flight = {}
+    started = collections.Counter()
+
+    with ThreadPoolExecutor(workers) as pool:
+        while queues or in_flight:
+            soonest = None
+            progress = True
+
+            while progress and len(in_flight) < workers:
+                progress = False
+                soonest = None
+
+                for host in list(queues):
+                    if len(in_flight) >= workers:
+                        break
+                    if started[host] >= limiter.policy(host).max_connections:
+                        continue
+                    wait_for = limiter.wait_time(host)
+                    if wait_for is None:
+                        continue
+                    if wait_for > 0:
+                        soonest = wait_for if soonest is None else \
+                            min(soonest, wait_for)
+                        continue
+
+                    index = queues[host].popleft()
+                    if not queues[host]:
+                        del queues[host]
+                    started[host] += 1
+                    in_flight[pool.submit(fn, items[index])] = (index, host)
+                    progress = True
+
+            if not in_flight:
+                time.sleep(soonest or 0.01)
+                continue
+
+            done, _ = wait(list(in_flight), timeout=soonest,
+                           return_when=FIRST_COMPLETED)
+            for future in done:
+                index, host = in_flight.pop(future)
+                started[host] -= 1
+                results[index] = future.result()
+
+    return results
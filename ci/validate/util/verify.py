@@ -1,12 +1,16 @@
 import sys
+from . import metrics
 
 
 FAILURES = 0
+MESSAGES = []
 
 
 def verify_exit(condition, message):
     if not condition:
         print(f"\033[91m{message}\033[0m")
+        MESSAGES.append(message)
+        metrics.inc("failures_total", rule=metrics.rule_of(message))
         sys.exit(1)
 
 
@@ -14,9 +18,21 @@ def verify(condition, message):
     global FAILURES
     if not condition:
         print(f"\033[91m{message}\033[0m")
+        MESSAGES.append(message)
+        metrics.inc("failures_total", rule=metrics.rule_of(message))
         FAILURES += 1
 
 
 def get_failures():
     global FAILURES
     return FAILURES
+
+
+def get_messages():
+    return list(MESSAGES)
+
+
+def reset_failures():
+    global FAILURES
+    FAILURES = 0
+    MESSAGES.clear()
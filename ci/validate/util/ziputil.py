@@ -0,0 +1,140 @@
+import struct
+import zipfile
+import zlib
+
+
+# All entries get the same timestamp so that rebuilding an archive from
+# the same inputs produces identical bytes.
+FIXED_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+COMPRESS_LEVEL = 9
+
+# Record layouts of the zip format (APPNOTE.TXT 4.3), without zip64
+LOCAL_HEADER = struct.Struct("<4s2B4HL2L2H")
+CENTRAL_HEADER = struct.Struct("<4s4B4HL2L5H2L")
+END_RECORD = struct.Struct("<4s4H2LH")
+LOCAL_SIGNATURE = b"PK\003\004"
+CENTRAL_SIGNATURE = b"PK\001\002"
+END_SIGNATURE = b"PK\005\006"
+# version 2.0 of the format, needed for deflate
+VERSION = 20
+# general purpose flag for utf-8 names
+UTF8_NAMES = 0x800
+ZIP_LIMIT = 0xFFFFFFFF
+MAX_ENTRIES = 0xFFFF
+
+# Indexes of file name and extra field lengths in LOCAL_HEADER
+_FH_FILENAME_LENGTH = 10
+_FH_EXTRA_FIELD_LENGTH = 11
+
+
+def deterministic_zipinfo(name: str) -> zipfile.ZipInfo:
+    zinfo = zipfile.ZipInfo(name, FIXED_DATE_TIME)
+    zinfo.compress_type = zipfile.ZIP_DEFLATED
+    zinfo.create_system = 3
+    zinfo.external_attr = 0o644 << 16
+    return zinfo
+
+
+def compress(data: bytes, level: int = COMPRESS_LEVEL) -> tuple:
+    """
+    Deflate data the way zipfile would and return (raw, crc32, compress
+    type) ready to be passed to RawZipWriter.write(). Data that doesn't
+    get smaller is stored, like zip does.
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+    raw = compressor.compress(data) + compressor.flush()
+    if len(raw) >= len(data):
+        return data, zlib.crc32(data), zipfile.ZIP_STORED
+    return raw, zlib.crc32(data), zipfile.ZIP_DEFLATED
+
+
+def read_raw(f, info: zipfile.ZipInfo) -> bytes:
+    """
+    Return compressed bytes of an archive member without inflating them,
+    f is the archive opened as a binary file.
+    """
+    f.seek(info.header_offset)
+    header = f.read(LOCAL_HEADER.size)
+    if len(header) != LOCAL_HEADER.size:
+        raise zipfile.BadZipFile(f"Truncated file header: {info.filename}")
+
+    fheader = LOCAL_HEADER.unpack(header)
+    if fheader[0] != LOCAL_SIGNATURE:
+        raise zipfile.BadZipFile(f"Bad magic number: {info.filename}")
+
+    f.seek(fheader[_FH_FILENAME_LENGTH] + fheader[_FH_EXTRA_FIELD_LENGTH], 1)
+    raw = f.read(info.compress_size)
+    if len(raw) != info.compress_size:
+        raise zipfile.BadZipFile(f"Truncated file data: {info.filename}")
+
+    return raw
+
+
+def _dos_date_time(date_time: tuple) -> tuple:
+    year, month, day, hour, minute, second = date_time
+    return ((year - 1980) << 9 | month << 5 | day,
+            hour << 11 | minute << 5 | second // 2)
+
+
+class RawZipWriter:
+    """
+    Writes a zip archive of members compressed elsewhere, by compress() or
+    copied with read_raw(). zipfile has no public API to add compressed
+    data, so local headers, the central directory and the end record are
+    written here. Archives that would need zip64 extensions are refused.
+    """
+
+    def __init__(self, f):
+        self.f = f
+        self.offset = 0
+        self.entries = []
+        self.names = set()
+
+    def _write(self, data: bytes):
+        self.f.write(data)
+        self.offset += len(data)
+
+    def write(self, zinfo: zipfile.ZipInfo, raw: bytes, crc: int,
+              file_size: int):
+        if zinfo.filename in self.names:
+            raise ValueError(f"Duplicate name in archive: {zinfo.filename}")
+        if (max(len(raw), file_size, self.offset) >= ZIP_LIMIT or
+                len(self.entries) >= MAX_ENTRIES):
+            raise ValueError("Archive is too large for a zip without zip64 "
+                             "extensions")
+
+        try:
+            name = zinfo.filename.encode("ascii")
+            flags = 0
+        except UnicodeEncodeError:
+            name = zinfo.filename.encode("utf-8")
+            flags = UTF8_NAMES
+
+        date, time = _dos_date_time(zinfo.date_time)
+        entry = (name, flags, zinfo.compress_type, time, date, crc,
+                 len(raw), file_size)
+
+        self.entries.append((zinfo, entry, self.offset))
+        self.names.add(zinfo.filename)
+        self._write(LOCAL_HEADER.pack(
+            LOCAL_SIGNATURE, VERSION, 0, *entry[1:], len(name), 0) + name)
+        self._write(raw)
+
+    def close(self):
+        start = self.offset
+        for zinfo, (name, *fields), offset in self.entries:
+            self._write(CENTRAL_HEADER.pack(
+                CENTRAL_SIGNATURE, VERSION, zinfo.create_system, VERSION, 0,
+                *fields, len(name), 0, 0, 0, zinfo.internal_attr,
+                zinfo.external_attr, offset) + name)
+        count = len(self.entries)
+        self._write(END_RECORD.pack(
+            END_SIGNATURE, 0, 0, count, count, self.offset - start, start, 0))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        # an archive that failed half way is not worth finishing
+        if exc_type is None:
+            self.close()
@@ -0,0 +1,98 @@
+PLATFORMS = ["windows", "macos", "linux"]
+KICAD_VERSIONS = ["6.0", "7.0", "8.0", "9.0"]
+
+
+def parse_version(version: str) -> tuple:
+    """
+    Parse "major[.minor[.patch]]" into a 3 tuple of ints, missing parts
+    are zero so that "6" == "6.0" == "6.0.0".
+    """
+    parts = [int(p) for p in version.split(".")]
+    if not 1 <= len(parts) <= 3:
+        raise ValueError(f"Invalid version: {version}")
+    return tuple(parts + [0] * (3 - len(parts)))
+
+
+def version_key(version: dict) -> tuple:
+    """
+    Sort key of a package version entry, higher epoch always wins.
+    """
+    return (version.get("version_epoch", 0), parse_version(version["version"]))
+
+
+def kicad_series(kicad_version: str) -> tuple:
+    return parse_version(kicad_version)[:2]
+
+
+def version_platforms(version: dict) -> list:
+    # not specified platforms is assumed to be "all platforms"
+    return version.get("platforms", PLATFORMS)
+
+
+def is_compatible(version: dict, series: tuple, platform: str) -> bool:
+    """
+    Check if a package version can be installed on a KiCad major.minor
+    series on the given platform. Bounds are compared on major.minor, so
+    a version requiring 7.0.5 is offered to 7.0 and kicad_version_max 7.0
+    includes all 7.0.x releases.
+    """
+    if version.get("status") == "deprecated":
+        return False
+
+    if platform not in version_platforms(version):
+        return False
+
+    if kicad_series(version["kicad_version"]) > series:
+        return False
+
+    if ("kicad_version_max" in version and
+            kicad_series(version["kicad_version_max"]) < series):
+        return False
+
+    return True
+
+
+def best_version(package: dict, series: tuple, platform: str) -> dict:
+    best = None
+
+    for version in package.get("versions", []):
+        if not is_compatible(version, series, platform):
+            continue
+        if best is None or version_key(version) > version_key(best):
+            best = version
+
+    return best
+
+
+def compatibility_table(package: dict, kicad_versions: list = KICAD_VERSIONS,
+                        platforms: list = PLATFORMS) -> dict:
+    """
+    Return {kicad_version: {platform: version}} with the version string of
+    the best installable version for each combination. Combinations with no
+    compatible version are left out.
+    """
+    table = {}
+
+    for kicad_version in kicad_versions:
+        series = kicad_series(kicad_version)
+        row = {}
+        for platform in platforms:
+            best = best_version(package, series, platform)
+            if best is not None:
+                row[platform] = best["version"]
+        if row:
+            table[kicad_version] = row
+
+    return table
+
+
+def latest_versions(packages: list, kicad_versions: list = KICAD_VERSIONS,
+                    platforms: list = PLATFORMS) -> dict:
+    return {
+        "kicad_versions": list(kicad_versions),
+        "platforms": list(platforms),
+        "packages": {
+            p["identifier"]: compatibility_table(p, kicad_versions, platforms)
+            for p in packages
+        }
+    }
@@ -0,0 +1,53 @@
+import collections
+import threading
+
+
+MAX_LINES = 5000
+
+
+class LogBuffer:
+    """
+    Thread safe in-memory log that collapses carriage return progress
+    updates. Complete lines are queued until taken by the UI, the current
+    incomplete line (the "tail") is kept separately because a later "\\r"
+    replaces it. Lines and tail are lists of (style, text) segments.
+    """
+
+    def __init__(self, max_lines: int = MAX_LINES):
+        self.lock = threading.Lock()
+        self.lines = collections.deque(maxlen=max_lines)
+        self.tail = []
+        self.tail_changed = False
+
+    def _add_to_tail(self, style, text: str):
+        if "\r" in text:
+            text = text[text.rfind("\r") + 1:]
+            self.tail = []
+            self.tail_changed = True
+        if text:
+            self.tail.append((style, text))
+            self.tail_changed = True
+
+    def write(self, style, s: str):
+        with self.lock:
+            *complete, last = s.split("\n")
+            for part in complete:
+                self._add_to_tail(style, part)
+                self.tail.append((style, "\n"))
+                self.lines.append(self.tail)
+                self.tail = []
+                self.tail_changed = True
+            self._add_to_tail(style, last)
+
+    def take(self) -> tuple:
+        """
+        Return (complete lines, tail) and clear the queued lines. Returns
+        None when nothing changed since the last call.
+        """
+        with self.lock:
+            if not self.lines and not self.tail_changed:
+                return None
+            lines = list(self.lines)
+            self.lines.clear()
+            self.tail_changed = False
+            return lines, list(self.tail)
@@ -2,15 +2,27 @@ import io
 import json
 import re
 import sys
+import threading
 import wx
 
+from .logsink import MAX_LINES, LogBuffer
 from .packager_gui_base import PackagerFrameBase
 from . import util
+from .worker import EVT_WORKER_DONE, EVT_WORKER_PROGRESS, Cancelled, Worker
 
 
 class PackagerFrame(PackagerFrameBase):
     def __init__(self, parent):
         PackagerFrameBase.__init__(self, parent)
+        self.stats_worker = None
+        self.stats_progress = None
+        self.validation_worker = None
+        self.validation_output = None
+        self.build_worker = None
+        self.closing = False
+        self.Bind(EVT_WORKER_PROGRESS, self.OnWorkerProgress)
+        self.Bind(EVT_WORKER_DONE, self.OnWorkerDone)
+        self.Bind(wx.EVT_CLOSE, self.OnClose)
 
     def OnMetadataLoaded(self, event):
         filename = self.metadataFilePicker.Path
@@ -47,79 +59,278 @@ class PackagerFrame(PackagerFrameBase):
     def OnKicadValidationClick(self, event):
         filename = self.metadataFilePicker.Path
 
+        if not filename or self.validation_worker:
+            return
+
+        self.validation_worker = Worker(
+            self, lambda worker: util.kicad_validation(filename))
+        self.validation_output = OutputWindow(
+            self, "Validation log", self.validation_worker)
+        sys.stdout = self.validation_output
+        sys.stderr = self.validation_output
+        self.m_button18.Disable()
+        self.validation_worker.start()
+
+    def OnValidationDone(self, error):
+        sys.stdout = sys.__stdout__
+        sys.stderr = sys.__stderr__
+        self.validation_output.stop()
+        self.validation_worker = None
+        self.m_button18.Enable()
+
+        if self.closing or error is None or isinstance(error, Cancelled):
+            return
+
+        if isinstance(error, RuntimeError) and str(error) == "ignore":
+            return
+
+        wx.MessageBox(
+            f"Validation failed:\n\n{error}",
+            "Error",
+            style=wx.ICON_ERROR)
+
+    def OnPackageLoaded(self, event):
+        filename = self.packageFilePicker.Path
+
+        if self.stats_worker:
+            self.stats_worker.cancel()
+
+        self.pkgSha.Value = ""
+        self.pkgSize.Value = ""
+        self.pkgInstallSize.Value = ""
+
         if not filename:
             return
 
-        try:
-            output = OutputWindow(self, "Validation log")
-            sys.stdout = output
-            sys.stderr = output
-            util.kicad_validation(filename)
-        except RuntimeError as e:
-            if str(e) != "ignore":
-                wx.MessageBox(
-                    f"Validation failed:\n\n{e}",
-                    "Error",
-                    style=wx.ICON_ERROR)
-        except Exception as e:
+        self.stats_worker = Worker(
+            self, lambda worker: util.get_package_stats(
+                filename, worker.progress))
+
+        if self.stats_progress is None:
+            self.stats_progress = wx.ProgressDialog(
+                "Package stats", "Reading package file", maximum=1000,
+                parent=self,
+                style=wx.PD_CAN_ABORT | wx.PD_ELAPSED_TIME | wx.PD_SMOOTH)
+
+        self.stats_worker.start()
+
+    def OnStatsDone(self, result, error):
+        self.stats_worker = None
+        if self.stats_progress:
+            self.stats_progress.Destroy()
+            self.stats_progress = None
+
+        if self.closing or isinstance(error, Cancelled):
+            return
+
+        if error is not None:
             wx.MessageBox(
-                f"Validation failed:\n\n{e}",
+                f"Could not read package:\n\n{error}",
                 "Error",
                 style=wx.ICON_ERROR)
+            return
 
-    def OnPackageLoaded(self, event):
-        filename = self.packageFilePicker.Path
-        sha, size, instsize = util.get_package_stats(filename)
+        sha, size, instsize = result
+        self.pkgSha.Value = sha
+        self.pkgSize.Value = str(size)
+        self.pkgInstallSize.Value = str(instsize)
+
+    def OnBuildPackageClick(self, event):
+        if self.build_worker:
+            return
+
+        with wx.DirDialog(self, "Select package source directory",
+                          style=wx.DD_DIR_MUST_EXIST) as dlg:
+            if dlg.ShowModal() != wx.ID_OK:
+                return
+            source = dlg.GetPath()
+
+        with wx.FileDialog(self, "Save package archive",
+                           wildcard="Zip files (*.zip)|*.zip",
+                           style=wx.FD_SAVE | wx.FD_OVERWRITE_PROMPT) as dlg:
+            if dlg.ShowModal() != wx.ID_OK:
+                return
+            output = dlg.GetPath()
+
+        metadata = self.metadataFilePicker.Path or None
+
+        self.build_worker = Worker(
+            self, lambda worker: util.build_package(source, output, metadata))
+        self.buildBtn.Disable()
+        self.build_worker.start()
+
+    def OnBuildDone(self, result, error):
+        self.build_worker = None
+        self.buildBtn.Enable()
+
+        if self.closing:
+            return
+
+        if error is not None:
+            wx.MessageBox(
+                f"Could not build package:\n\n{error}",
+                "Error",
+                style=wx.ICON_ERROR)
+            return
+
+        output, rejected, sha, size, instsize, updated = result
+        self.packageFilePicker.Path = output
         self.pkgSha.Value = sha
         self.pkgSize.Value = str(size)
         self.pkgInstallSize.Value = str(instsize)
 
+        message = f"Package written to {output}"
+        if updated:
+            message += f"\n\nVersion {updated} updated in metadata file"
+        if rejected:
+            message += "\n\nSkipped files not allowed in the package:\n"
+            message += "\n".join(rejected)
+
+        wx.MessageBox(message, "Package built", style=wx.ICON_INFORMATION)
+
+    def OnWorkerProgress(self, event):
+        if not self:
+            return
+        if event.worker is not self.stats_worker or not self.stats_progress:
+            return
+
+        value = event.done * 1000 // event.total if event.total else 0
+        cont, _ = self.stats_progress.Update(min(value, 999))
+        if not cont:
+            self.stats_worker.cancel()
+
+    def OnWorkerDone(self, event):
+        if not self:
+            return
+        if event.worker is self.stats_worker:
+            self.OnStatsDone(event.result, event.error)
+        elif event.worker is self.validation_worker:
+            self.OnValidationDone(event.error)
+        elif event.worker is self.build_worker:
+            self.OnBuildDone(event.result, event.error)
+
+        if self.closing and not self.running_workers():
+            self.Destroy()
+
+    def running_workers(self) -> list:
+        return [w for w in [self.stats_worker, self.validation_worker,
+                            self.build_worker] if w]
+
     def OnCloseClick(self, event):
-        self.Destroy()
+        self.Close()
+
+    def OnClose(self, event):
+        # Running workers still post their done events to this window, so
+        # it is only hidden until the last of them arrives.
+        self.closing = True
+        workers = self.running_workers()
+        for worker in workers:
+            worker.cancel()
+        if workers:
+            self.Hide()
+        else:
+            self.Destroy()
 
 
 class OutputWindow(wx.PyOnDemandOutputWindow):
-    def __init__(self, parent, caption):
+    FLUSH_INTERVAL_MS = 50
+
+    def __init__(self, parent, caption, worker=None):
         super().__init__(caption)
         self.SetParent(parent)
+        self.worker = worker
         self.size = (800, 600)
         self.pos = parent.GetPosition()
         self.escape_regex = re.compile("\033\\[\\d+m")
-        self.red_style = wx.TextAttr(wx.RED)
-        self.green_style = wx.TextAttr(wx.Colour(0, 150, 0))
-        self.default_style = wx.TextAttr(
-            wx.SystemSettings.GetColour(wx.SYS_COLOUR_WINDOWTEXT))
-
-    def remove_last_line(self):
-        txt = self.text.GetValue()  # type: str
-        last_newline = txt.rfind('\n')
-        to_delete = len(txt) - last_newline - 1
-        last_position = self.text.GetLastPosition()
-        self.text.Remove(last_position - to_delete, last_position)
+        self.styles = {
+            "red": wx.TextAttr(wx.RED),
+            "green": wx.TextAttr(wx.Colour(0, 150, 0)),
+            "default": wx.TextAttr(
+                wx.SystemSettings.GetColour(wx.SYS_COLOUR_WINDOWTEXT)),
+        }
+        # Writes only go to the buffer, the text control is updated from
+        # the timer at a fixed rate no matter how often progress changes.
+        self.buffer = LogBuffer()
+        self.tail_start = None
+        self.timer = wx.Timer()
+        self.timer.Bind(wx.EVT_TIMER, self.OnFlushTimer)
+        self.timer.Start(self.FLUSH_INTERVAL_MS)
 
     def write(self, s):
-        if self.frame is None:
-            self.CreateOutputWindow("")
+        # Closing the window cancels the background job, it stops at its
+        # next write.
+        if self.worker and threading.current_thread() is self.worker:
+            self.worker.check_cancelled()
+
         if isinstance(s, bytes):
             s = s.decode("utf-8")
         # remove color vt100 escape sequences
         if s.startswith("\033[91m"):
-            style = self.red_style
+            style = "red"
         elif s.startswith("\033[92m"):
-            style = self.green_style
+            style = "green"
         else:
-            style = self.default_style
+            style = "default"
         s = self.escape_regex.sub("", s)
         s = s.replace("\r\n", "\n")
-        if '\r' in s:
-            s = s[s.rfind('\r') + 1:]
-            self.remove_last_line()
 
-        self.text.SetDefaultStyle(style)
-        self.text.AppendText(s)
-        wx.SafeYield()
+        self.buffer.write(style, s)
+
+    def flush(self):
+        if threading.current_thread() is threading.main_thread():
+            self.flush_to_control()
+
+    def stop(self):
+        self.timer.Stop()
+        self.flush_to_control()
+
+    def OnFlushTimer(self, event):
+        self.flush_to_control()
+
+    def append_segments(self, segments):
+        for style, text in segments:
+            self.text.SetDefaultStyle(self.styles[style])
+            self.text.AppendText(text)
+
+    def flush_to_control(self):
+        if self.frame is None and self.worker and self.worker.cancelled:
+            return
+
+        pending = self.buffer.take()
+        if pending is None:
+            return
+
+        lines, tail = pending
+
+        if self.frame is None:
+            self.CreateOutputWindow("")
+
+        self.text.Freeze()
+        try:
+            if self.tail_start is not None:
+                self.text.Remove(self.tail_start, self.text.GetLastPosition())
+            for line in lines:
+                self.append_segments(line)
+            self.trim_history()
+            self.tail_start = self.text.GetLastPosition()
+            self.append_segments(tail)
+        finally:
+            self.text.Thaw()
+
+    def trim_history(self):
+        lines = self.text.GetNumberOfLines()
+        if lines > MAX_LINES:
+            end = self.text.XYToPosition(0, lines - MAX_LINES)
+            if end > 0:
+                self.text.Remove(0, end)
+
+    def OnCloseWindow(self, event):
+        if self.worker:
+            self.worker.cancel()
+        super().OnCloseWindow(event)
 
     def CreateOutputWindow(self, txt):
+        self.tail_start = None
         self.frame = wx.Frame(
             self.parent, -1, self.title, self.pos, self.size,
             style=wx.DEFAULT_FRAME_STYLE | wx.FRAME_FLOAT_ON_PARENT)
@@ -52,6 +52,9 @@ class PackagerFrameBase ( wx.Frame ):
 
         sbSizer4 = wx.StaticBoxSizer( wx.StaticBox( self.m_panel1, wx.ID_ANY, u"Package stats" ), wx.VERTICAL )
 
+        self.buildBtn = wx.Button( sbSizer4.GetStaticBox(), wx.ID_ANY, u"Build package from directory...", wx.DefaultPosition, wx.DefaultSize, 0 )
+        sbSizer4.Add( self.buildBtn, 0, wx.ALL, 5 )
+
         self.packageFilePicker = wx.FilePickerCtrl( sbSizer4.GetStaticBox(), wx.ID_ANY, wx.EmptyString, u"Select a package file", u"Zip files (*.zip)|*.zip", wx.DefaultPosition, wx.DefaultSize, wx.FLP_FILE_MUST_EXIST|wx.FLP_OPEN|wx.FLP_USE_TEXTCTRL )
         sbSizer4.Add( self.packageFilePicker, 0, wx.ALL|wx.EXPAND, 5 )
 
@@ -130,6 +133,7 @@ class PackagerFrameBase ( wx.Frame ):
         self.metadataFilePicker.Bind( wx.EVT_FILEPICKER_CHANGED, self.OnMetadataLoaded )
         self.m_button17.Bind( wx.EVT_BUTTON, self.OnSchemaValidationClick )
         self.m_button18.Bind( wx.EVT_BUTTON, self.OnKicadValidationClick )
+        self.buildBtn.Bind( wx.EVT_BUTTON, self.OnBuildPackageClick )
         self.packageFilePicker.Bind( wx.EVT_FILEPICKER_CHANGED, self.OnPackageLoaded )
         self.closeBtn.Bind( wx.EVT_BUTTON, self.OnCloseClick )
 
@@ -147,6 +151,9 @@ class PackagerFrameBase ( wx.Frame ):
     def OnKicadValidationClick( self, event ):
         event.Skip()
 
+    def OnBuildPackageClick( self, event ):
+        event.Skip()
+
     def OnPackageLoaded( self, event ):
         event.Skip()
 
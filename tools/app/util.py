@@ -1,45 +1,90 @@
+import hashlib
 import zipfile
 import os
 import json
 import jsonschema
-import requests
 
 
-SCHEMA_URL = "https://gitlab.com/kicad/code/kicad/-/raw/master/kicad/pcm/schemas/pcm.v1.schema.json"
 SCHEMA = None
-
-
-def get_package_stats(filename: str) -> tuple:
-    from validate.util.getsha import getsha256
+OFFLINE = False
+# validation daemon address, validation runs in process if not set
+DAEMON = None
+
+
+def get_package_stats(filename: str, progress=None) -> tuple:
+    """
+    Return sha256, size and install size of a package file. The file is
+    read once, progress(done, total) is called after every chunk.
+    """
+    from validate.util.getsha import READ_SIZE
+    size = os.path.getsize(filename)
+    sha = hashlib.sha256()
+    done = 0
+
+    with open(filename, "rb") as f:
+        data = f.read(READ_SIZE)
+        while data:
+            sha.update(data)
+            done += len(data)
+            if progress:
+                progress(done, size)
+            data = f.read(READ_SIZE)
+
+    # only the central directory is read here
     instsize = 0
-    z = zipfile.ZipFile(filename, "r")
-    for entry in z.infolist():
-        if not entry.is_dir():
-            instsize += entry.file_size
+    with zipfile.ZipFile(filename, "r") as z:
+        for entry in z.infolist():
+            if not entry.is_dir():
+                instsize += entry.file_size
 
-    return getsha256(filename), os.path.getsize(filename), instsize
+    return sha.hexdigest(), size, instsize
 
 
 def get_schema() -> dict:
     global SCHEMA
 
     if SCHEMA is None:
-        response = requests.get(SCHEMA_URL)
-        response.raise_for_status()
-        SCHEMA = response.json()
-        with open("schema.json", "wb") as f:
-            f.write(response.content)
+        from validate import schema
+        store = schema.SchemaStore(offline=OFFLINE)
+        SCHEMA = store.get()
+        if store.source != "bundled":
+            with open("schema.json", "w", encoding="utf-8") as f:
+                json.dump(SCHEMA, f, indent=4)
+        # compile once for the session
+        schema.get_validator(SCHEMA)
 
     return SCHEMA
 
 
+def build_package(source: str, output: str, metadata: str = None) -> tuple:
+    """
+    Build a deterministic package archive from source directory and fill
+    the matching version in metadata file if one is given.
+
+    Returns (output, rejected files, sha, size, install size, updated
+    version or None).
+    """
+    from validate import pack
+
+    package_type, version = pack.package_info(source)
+    files, rejected = pack.collect_files(package_type, source)
+    sha, size, instsize = pack.build_package(files, output)
+    updated = None
+
+    if metadata:
+        pack.update_metadata(metadata, version, sha, size, instsize)
+        updated = version
+
+    return output, rejected, sha, size, instsize, updated
+
+
 def validate_schema(filename: str):
-    from validate import package
+    from validate import package, schema
 
     metadata = package.load_json_file(filename)
 
     try:
-        jsonschema.validate(metadata, get_schema())
+        schema.validate(metadata, get_schema())
     except jsonschema.ValidationError as e:
         raise ValueError(f"Metadata doesn't comply with schema\n{e.message}")
     except jsonschema.SchemaError as e:
@@ -49,6 +94,20 @@ def validate_schema(filename: str):
 def kicad_validation(filename: str) -> tuple:
     get_schema()
 
+    if DAEMON:
+        from validate import daemon, package
+        metadata = package.load_json_file(filename)
+        try:
+            result = daemon.run_remote(
+                DAEMON, "package", [metadata["identifier"], filename])
+        except OSError as e:
+            print(f"Validation daemon at {DAEMON} is not available, "
+                  f"running locally\n{e}")
+        else:
+            if not result["passed"]:
+                raise RuntimeError("ignore")
+            return
+
     # monkey patch verify_exit to not exit but raise an exception instead
     from validate import package
     def verify_raise(condition, message):
@@ -0,0 +1,64 @@
+import threading
+import wx
+import wx.lib.newevent
+
+
+WorkerProgressEvent, EVT_WORKER_PROGRESS = wx.lib.newevent.NewEvent()
+WorkerDoneEvent, EVT_WORKER_DONE = wx.lib.newevent.NewEvent()
+
+
+class Cancelled(BaseException):
+    """
+    Raised in the worker thread once the job is cancelled. It is not an
+    Exception subclass so that broad "except Exception" handlers in the
+    validation code don't swallow it.
+    """
+    pass
+
+
+class Worker(threading.Thread):
+    """
+    Runs job(worker) on a background thread. The job reports progress with
+    worker.progress() which also raises Cancelled after cancel() was called.
+    Progress, the result and any exception are posted to the window as
+    EVT_WORKER_PROGRESS and EVT_WORKER_DONE events so that they are handled
+    on the UI thread.
+    """
+
+    def __init__(self, window: wx.Window, job):
+        super().__init__(daemon=True)
+        self.window = window
+        self.job = job
+        self._cancel = threading.Event()
+
+    def cancel(self):
+        self._cancel.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel.is_set()
+
+    def check_cancelled(self):
+        if self.cancelled:
+            raise Cancelled()
+
+    def progress(self, done: int, total: int):
+        self.check_cancelled()
+        if self.window:
+            wx.PostEvent(self.window, WorkerProgressEvent(
+                worker=self, done=done, total=total))
+
+    def run(self):
+        result = None
+        error = None
+
+        try:
+            result = self.job(self)
+        except BaseException as e:
+            error = e
+
+        # the window waits for this event before it is destroyed, unless it
+        # was destroyed some other way
+        if self.window:
+            wx.PostEvent(self.window, WorkerDoneEvent(
+                worker=self, result=result, error=error))
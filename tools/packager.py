@@ -1,8 +1,20 @@
+import argparse
 import wx
 import sys
 import os
 
-from app import PackagerFrame
+from app import PackagerFrame, util
+
+parser = argparse.ArgumentParser(description="KiCad Packaging Toolkit")
+parser.add_argument(
+    "--offline", help="Don't download the schema, use cached or bundled copy",
+    action="store_true")
+parser.add_argument(
+    "--daemon", help="Run validation through the validation daemon "
+    "listening on this address", default=os.environ.get("VALIDATE_DAEMON"))
+args = parser.parse_args()
+util.OFFLINE = args.offline
+util.DAEMON = args.daemon
 
 current_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 os.chdir(current_dir)